@@ -0,0 +1,80 @@
+"""
+延遲分析 API
+以 Flask Blueprint 提供 JSON 端點，app.py (Dash 的 Flask 伺服器) 與 app1.py 共用
+"""
+
+from datetime import date, timedelta
+from flask import Blueprint, jsonify, request
+import delay_analytics
+from tdx_service import get_train_batch, history_store
+
+analytics_api = Blueprint('analytics_api', __name__, url_prefix='/api/analytics')
+
+
+def _date_range():
+    """由查詢參數 days 取得日期範圍 (預設為今天)"""
+    days = max(request.args.get('days', default=1, type=int), 1)
+    end = date.today()
+    return end - timedelta(days=days - 1), end
+
+
+@analytics_api.route('/summary')
+def summary_api():
+    """API 端點：目前快照的整體延遲統計"""
+    try:
+        return jsonify({
+            'success': True,
+            'summary': delay_analytics.summarize(get_train_batch())
+        })
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
+@analytics_api.route('/groups')
+def groups_api():
+    """API 端點：依列車類型 (by=train_type) 或站名 (by=station) 分組的延遲統計"""
+    by = request.args.get('by', 'train_type')
+    try:
+        return jsonify({
+            'success': True,
+            'by': by,
+            'groups': delay_analytics.group_summary(get_train_batch(), by)
+        })
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
+@analytics_api.route('/history/<kind>/<path:name>')
+def history_api(kind, name):
+    """
+    API 端點：單一車次 (kind=train) 或車站 (kind=station) 的歷史延遲統計與滾動平均
+    
+    查詢參數：days (天數，預設 1)、window (滾動平均窗格，預設 30min)
+    """
+    if history_store is None:
+        return jsonify({'success': False, 'error': '未設定 history_dir，沒有歷史資料'}), 404
+    if kind not in ('train', 'station'):
+        return jsonify({'success': False, 'error': f"不支援的查詢類型: {kind}"}), 400
+
+    start, end = _date_range()
+    window = request.args.get('window', '30min')
+    try:
+        if kind == 'train':
+            df = history_store.train_history(name, start, end)
+        else:
+            df = history_store.station_history(name, start, end)
+
+        rolling = delay_analytics.rolling_delay(df, window)
+        return jsonify({
+            'success': True,
+            'summary': delay_analytics.history_summary(df),
+            'series': {
+                'timestamp': [ts.isoformat() for ts in rolling['timestamp']],
+                'delay': [round(float(v), 2) for v in rolling['delay']],
+                'rolling_mean': [round(float(v), 2) for v in rolling['rolling_mean']],
+            }
+        })
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
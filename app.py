@@ -4,13 +4,17 @@
 """
 
 import dash
-from dash import dcc, html, dash_table, Input, Output, callback
+from dash import dcc, html, dash_table, Input, Output, State, callback, ctx, no_update
 import dash_bootstrap_components as dbc
-import pandas as pd
-import plotly.express as px
 from datetime import datetime
-import traceback
-from tdx_service import get_train_data
+import logging
+from analytics_api import analytics_api
+from chart_builder import CHART_MODES, build_chart_data, build_empty_figure, empty_chart_data, patch_delay_figure
+from delay_analytics import DELAY_BUCKETS, get_bucket, summarize
+from metrics import configure_logging, histogram, metrics_api
+from single_flight import get_single_flight
+from table_store import get_table_columns, get_table_store, patch_page_rows
+from tdx_service import train_data_poller
 
 
 # 初始化 Dash 應用程式
@@ -20,6 +24,24 @@ app = dash.Dash(
     title="台鐵列車即時動態資訊系統"
 )
 
+# 多個瀏覽器同時更新時，同一版本與模式的圖表資料只彙總一次
+chart_flight = get_single_flight('chart_data')
+
+# Dash 底層的 Flask 伺服器 (serve.py 以 gunicorn 啟動時使用)
+server = app.server
+
+# 延遲分析 JSON 端點 (/api/analytics/...)
+server.register_blueprint(analytics_api)
+
+# Prometheus 指標 (/metrics)
+server.register_blueprint(metrics_api)
+
+logger = logging.getLogger(__name__)
+
+# 回呼的產生耗時 (秒)
+RENDER_SECONDS = histogram('render_seconds', '畫面回呼 / API 回應的產生耗時 (秒)', ['view'])
+
+
 # 定義延遲狀態的顏色樣式
 def get_delay_style(delay_time):
     """
@@ -31,30 +53,41 @@ def get_delay_style(delay_time):
     Returns:
         dict: 樣式字典
     """
-    if delay_time == 0:
-        return {
-            'backgroundColor': '#d4edda',
-            'color': '#155724',
-            'fontWeight': 'bold'
-        }
-    elif delay_time <= 5:
-        return {
-            'backgroundColor': '#fff3cd',
-            'color': '#856404',
-            'fontWeight': 'bold'
-        }
-    elif delay_time <= 10:
-        return {
-            'backgroundColor': '#ffe5cc',
-            'color': '#cc5200',
-            'fontWeight': 'bold'
-        }
-    else:
-        return {
-            'backgroundColor': '#f8d7da',
-            'color': '#721c24',
+    bucket = get_bucket(delay_time)
+    return {
+        'backgroundColor': bucket.background,
+        'color': bucket.text_color,
+        'fontWeight': 'bold'
+    }
+
+
+def get_delay_conditional_styles():
+    """
+    依延遲分級產生 DataTable 的條件樣式
+    
+    Returns:
+        list: style_data_conditional 設定
+    """
+    styles = []
+    lower = None
+    for bucket in DELAY_BUCKETS:
+        conditions = []
+        if lower is not None:
+            conditions.append(f'{{延遲時間}} > {lower}')
+        if bucket.upper is not None:
+            conditions.append(f'{{延遲時間}} <= {bucket.upper}')
+        lower = bucket.upper
+        
+        styles.append({
+            'if': {
+                'filter_query': ' && '.join(conditions),
+                'column_id': '延遲時間'
+            },
+            'backgroundColor': bucket.background,
+            'color': bucket.text_color,
             'fontWeight': 'bold'
-        }
+        })
+    return styles
 
 
 # 應用程式布局
@@ -125,10 +158,45 @@ app.layout = dbc.Container([
         ])
     ]),
     
-    # 資料表格區域
+    # 資料表格區域 (伺服器端分頁、排序與篩選)
     dbc.Row([
         dbc.Col([
-            html.Div(id="train-table-container")
+            dash_table.DataTable(
+                id='train-table',
+                columns=get_table_columns(),
+                data=[],
+                style_table={
+                    'overflowX': 'auto',
+                    'border': '1px solid #dee2e6'
+                },
+                style_header={
+                    'backgroundColor': '#0066cc',
+                    'color': 'white',
+                    'fontWeight': 'bold',
+                    'textAlign': 'center',
+                    'padding': '12px'
+                },
+                style_cell={
+                    'textAlign': 'left',
+                    'padding': '10px',
+                    'fontSize': '14px',
+                    'fontFamily': 'Arial, sans-serif'
+                },
+                style_data={
+                    'border': '1px solid #dee2e6'
+                },
+                # 根據延遲時間設定行樣式
+                style_data_conditional=get_delay_conditional_styles(),
+                page_current=0,
+                page_size=20,
+                page_count=1,
+                page_action='custom',
+                sort_action='custom',
+                sort_mode='multi',
+                sort_by=[],
+                filter_action='custom',
+                filter_query=''
+            )
         ])
     ]),
     
@@ -138,7 +206,15 @@ app.layout = dbc.Container([
             dbc.Card([
                 dbc.CardBody([
                     html.H5("列車延遲時間圖表", className="card-title mb-3"),
-                    dcc.Graph(id="delay-bar-chart")
+                    dbc.RadioItems(
+                        id="chart-mode",
+                        options=[{'label': label, 'value': key} for key, label in CHART_MODES.items()],
+                        value='auto',
+                        inline=True,
+                        className="mb-2"
+                    ),
+                    # 圖表只在此建立一次，之後以 Patch 更新長條資料
+                    dcc.Graph(id="delay-bar-chart", figure=build_empty_figure("載入中..."))
                 ])
             ], className="mt-4")
         ])
@@ -152,194 +228,195 @@ app.layout = dbc.Container([
     ),
     
     # 載入時觸發更新
-    dcc.Store(id='trigger-on-load', data=0)
+    dcc.Store(id='trigger-on-load', data=0),
+    
+    # 前一次更新的快照版本與畫面內容 (用於計算部分更新)
+    dcc.Store(id='table-state', data=None),
+    dcc.Store(id='chart-state', data=None)
     
 ], fluid=True, style={'maxWidth': '1400px'})
 
 
+def get_data_time_text():
+    """
+    產生資料時間說明 (TDX 異常時顯示最後一份資料的取得時間)
+    
+    Returns:
+        str: 資料時間說明
+    """
+    status = train_data_poller.get_status()
+    if status['fetched_at'] is None:
+        return "尚無資料"
+    
+    fetched_at = datetime.fromisoformat(status['fetched_at']).strftime('%H:%M:%S')
+    if status['stale']:
+        return f"⚠️ 資料已過時 (取得於 {fetched_at}，{status['age']:.0f} 秒前)"
+    return f"資料時間: {fetched_at} ({status['age']:.0f} 秒前)"
+
+
+def get_changed_train_nos(previous_tag, snapshot):
+    """
+    取得前一版本到目前快照之間有變動的車次
+    
+    Args:
+        previous_tag: 前一次更新時的快照版本標記
+        snapshot: 目前快照
+        
+    Returns:
+        set: 有變動的車次，無法計算差異時回傳 None
+    """
+    if previous_tag is None:
+        return None
+    delta = train_data_poller.get_delta(previous_tag, snapshot)
+    if delta is None:
+        return None
+    return set(delta['changed'])
+
+
 @callback(
-    [Output('train-table-container', 'children'),
-     Output('status-message', 'children'),
-     Output('last-update-time', 'children'),
-     Output('delay-bar-chart', 'figure')],
-    [Input('interval-component', 'n_intervals'),
+    [Output('train-table', 'data'),
+     Output('train-table', 'page_count'),
+     Output('table-state', 'data')],
+    [Input('train-table', 'page_current'),
+     Input('train-table', 'page_size'),
+     Input('train-table', 'sort_by'),
+     Input('train-table', 'filter_query'),
+     Input('interval-component', 'n_intervals'),
      Input('refresh-button', 'n_clicks'),
-     Input('trigger-on-load', 'data')]
+     Input('trigger-on-load', 'data')],
+    [State('table-state', 'data')]
 )
-def update_train_table(n_intervals, n_clicks, trigger):
+@RENDER_SECONDS.labels('update_table_page').time()
+def update_table_page(page_current, page_size, sort_by, filter_query,
+                      n_intervals, n_clicks, trigger, table_state):
     """
-    更新列車資料表格和圖表
+    只回傳目前頁面的表格資料 (伺服器端分頁、排序與篩選)
+    
+    查詢條件不變時，快照未更新則不傳送任何資料，
+    快照更新則只替換頁面上有變動的資料列。
     
     Args:
+        page_current: 目前頁碼
+        page_size: 每頁筆數
+        sort_by: 排序設定
+        filter_query: 篩選條件
         n_intervals: 自動更新計數
         n_clicks: 手動更新點擊次數
         trigger: 載入觸發
+        table_state: 前一次更新的版本、查詢條件與頁面車次
         
     Returns:
-        tuple: (表格組件, 狀態訊息, 更新時間, 圖表)
+        tuple: (該頁資料或 Patch, 總頁數, 新的表格狀態)
     """
     try:
-        # 取得列車資料
-        train_data = get_train_data()
-        
-        if not train_data:
-            empty_fig = px.bar(
-                x=[],
-                y=[],
-                title="目前沒有列車資料",
-                labels={'x': '車次', 'y': '延遲時間 (分鐘)'}
-            )
-            return (
-                html.Div("目前沒有列車資料", className="alert alert-warning"),
-                dbc.Alert("⚠️ 未取得列車資料", color="warning"),
-                f"最後更新: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}",
-                empty_fig
-            )
+        snapshot = train_data_poller.get_snapshot()
+        state = table_state or {}
+        query = [page_current, page_size, sort_by or [], filter_query or '']
         
-        # 建立 DataFrame
-        df = pd.DataFrame(train_data)
+        changed = None
+        if state.get('query') == query:
+            if state.get('version') == snapshot.tag:
+                return no_update, no_update, no_update
+            changed = get_changed_train_nos(state.get('version'), snapshot)
         
-        # 建立資料表格
-        table = dash_table.DataTable(
-            data=df.to_dict('records'),
-            columns=[{'name': col, 'id': col} for col in df.columns],
-            style_table={
-                'overflowX': 'auto',
-                'border': '1px solid #dee2e6'
-            },
-            style_header={
-                'backgroundColor': '#0066cc',
-                'color': 'white',
-                'fontWeight': 'bold',
-                'textAlign': 'center',
-                'padding': '12px'
-            },
-            style_cell={
-                'textAlign': 'left',
-                'padding': '10px',
-                'fontSize': '14px',
-                'fontFamily': 'Arial, sans-serif'
-            },
-            style_data={
-                'border': '1px solid #dee2e6'
-            },
-            style_data_conditional=[
-                # 根據延遲時間設定行樣式
-                {
-                    'if': {
-                        'filter_query': '{延遲時間} = 0',
-                        'column_id': '延遲時間'
-                    },
-                    **get_delay_style(0)
-                },
-                {
-                    'if': {
-                        'filter_query': '{延遲時間} > 0 && {延遲時間} <= 5',
-                        'column_id': '延遲時間'
-                    },
-                    **get_delay_style(3)
-                },
-                {
-                    'if': {
-                        'filter_query': '{延遲時間} > 5 && {延遲時間} <= 10',
-                        'column_id': '延遲時間'
-                    },
-                    **get_delay_style(8)
-                },
-                {
-                    'if': {
-                        'filter_query': '{延遲時間} > 10',
-                        'column_id': '延遲時間'
-                    },
-                    **get_delay_style(15)
-                }
-            ],
-            page_size=20,
-            page_action='native',
-            sort_action='native',
-            filter_action='native'
-        )
+        store = get_table_store(snapshot)
+        rows, page_count, _ = store.query(page_current, page_size, sort_by, filter_query)
+        data = patch_page_rows(rows, state.get('train_nos'), changed, state.get('row_numbers'))
+        return data, page_count, {
+            'version': snapshot.tag,
+            'query': query,
+            'train_nos': [row['車次'] for row in rows],
+            'row_numbers': [row['序號'] for row in rows]
+        }
+    except Exception:
+        logger.exception("表格更新失敗")
+        return [], 1, None
+
+
+@callback(
+    [Output('status-message', 'children'),
+     Output('last-update-time', 'children'),
+     Output('delay-bar-chart', 'figure'),
+     Output('chart-state', 'data')],
+    [Input('interval-component', 'n_intervals'),
+     Input('refresh-button', 'n_clicks'),
+     Input('trigger-on-load', 'data'),
+     Input('chart-mode', 'value')],
+    [State('chart-state', 'data')]
+)
+@RENDER_SECONDS.labels('update_train_table').time()
+def update_train_table(n_intervals, n_clicks, trigger, chart_mode, chart_state):
+    """
+    更新狀態訊息和圖表
+    
+    圖表在版面中只建立一次，這裡只回傳長條資料的 Patch；
+    快照版本與圖表模式都沒有改變時不更新圖表與狀態訊息。
+    按下重新整理或快照過時時，立即以目前的快照回應並在背景重新取得資料。
+    
+    Args:
+        n_intervals: 自動更新計數
+        n_clicks: 手動更新點擊次數
+        trigger: 載入觸發
+        chart_mode: 圖表模式 (列車數量多時 auto 會改用彙總圖表)
+        chart_state: 前一次更新的版本、模式與類別軸內容
         
-        # 建立 Bar Chart
-        # 根據延遲時間設定顏色
-        colors = []
-        for delay in df['延遲時間']:
-            if delay == 0:
-                colors.append('#28a745')  # 綠色 - 準點
-            elif delay <= 5:
-                colors.append('#ffc107')  # 黃色 - 輕微延遲
-            elif delay <= 10:
-                colors.append('#fd7e14')  # 橘色 - 中度延遲
-            else:
-                colors.append('#dc3545')  # 紅色 - 嚴重延遲
+    Returns:
+        tuple: (狀態訊息, 更新時間, 圖表 Patch, 新的圖表狀態)
+    """
+    chart_mode = chart_mode or 'auto'
+    
+    try:
+        snapshot = train_data_poller.get_snapshot()
+        if ctx.triggered_id == 'refresh-button' or train_data_poller.get_status()['stale']:
+            train_data_poller.revalidate()
         
-        # 使用 plotly.express 建立圖表
-        fig = px.bar(
-            df,
-            x='車次',
-            y='延遲時間',
-            text='延遲時間',
-            title='各車次延遲時間統計',
-            labels={'車次': '車次', '延遲時間': '延遲時間 (分鐘)'},
-            hover_data={'車次': True, '列車類型': True, '即將到達': True, '延遲時間': True}
-        )
+        batch = snapshot.batch
+        state = chart_state or {}
+        update_time = get_data_time_text()
         
-        # 更新圖表樣式
-        fig.update_traces(
-            marker_color=colors,
-            textposition='outside'
-        )
+        if state.get('version') == snapshot.tag and state.get('mode') == chart_mode:
+            return no_update, update_time, no_update, no_update
         
-        fig.update_layout(
-            title={
-                'text': '各車次延遲時間統計',
-                'x': 0.5,
-                'xanchor': 'center',
-                'font': {'size': 18, 'color': '#0066cc'}
-            },
-            xaxis={
-                'tickangle': -45,
-                'tickfont': {'size': 10}
-            },
-            yaxis={
-                'gridcolor': '#e0e0e0'
-            },
-            plot_bgcolor='#f8f9fa',
-            paper_bgcolor='white',
-            height=500,
-            margin=dict(t=80, b=100, l=60, r=40)
-        )
+        if not batch:
+            chart_data = empty_chart_data("目前沒有列車資料")
+            status = dbc.Alert("⚠️ 未取得列車資料", color="warning")
+        else:
+            # 依模式彙總後只傳送有變動的長條
+            chart_data = chart_flight.do(
+                (snapshot.tag, chart_mode), build_chart_data, batch, chart_mode
+            )
+            summary = summarize(batch)
+            status = dbc.Alert(
+                f"✅ 成功載入 {len(batch)} 筆列車資料 "
+                f"(準點率 {summary['on_time_ratio']:.1%}，平均延遲 {summary['mean']} 分鐘)",
+                color="success"
+            )
         
-        update_time = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        changed = None
+        if state.get('mode') == chart_mode:
+            changed = get_changed_train_nos(state.get('version'), snapshot)
         
         return (
-            table,
-            dbc.Alert(f"✅ 成功載入 {len(train_data)} 筆列車資料", color="success"),
-            f"最後更新: {update_time}",
-            fig
+            status,
+            update_time,
+            patch_delay_figure(chart_data, state.get('x'), changed),
+            {'version': snapshot.tag, 'mode': chart_mode, 'x': chart_data['x']}
         )
         
     except Exception as e:
         error_msg = str(e)
-        print(f"錯誤: {error_msg}")
-        print(traceback.format_exc())
-        
-        empty_fig = px.bar(
-            x=[],
-            y=[],
-            title="資料載入失敗",
-            labels={'x': '車次', 'y': '延遲時間 (分鐘)'}
-        )
+        logger.exception("圖表更新失敗")
         
         return (
-            html.Div("資料載入失敗", className="alert alert-danger"),
             dbc.Alert(f"❌ 錯誤: {error_msg}", color="danger"),
             f"最後更新: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}",
-            empty_fig
+            patch_delay_figure(empty_chart_data("資料載入失敗")),
+            None
         )
 
 
 if __name__ == '__main__':
+    configure_logging()
     print("=" * 60)
     print("🚂 台鐵列車即時動態資訊系統")
     print("=" * 60)
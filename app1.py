@@ -3,15 +3,291 @@
 使用 Flask + PyEcharts 建立互動式網頁介面
 """
 
-from flask import Flask, render_template_string, jsonify
+from flask import Flask, Response, render_template_string, jsonify, request, stream_with_context
 from pyecharts import options as opts
 from pyecharts.charts import Bar, Page
+import gzip
 import json
-from datetime import datetime
-from tdx_service import get_train_data
+import os
+import threading
+from collections import namedtuple
+from analytics_api import analytics_api
+from cache_backend import MemoryCache
+from config import CONFIG
+from chart_builder import CHART_MODES, build_chart_data
+from delay_analytics import DELAY_BUCKETS
+from json_codec import dumps
+from metrics import configure_logging, histogram, metrics_api
+from single_flight import get_single_flight
+from tdx_service import get_service_status, train_data_poller
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
 
 app = Flask(__name__)
 
+# 延遲分析 JSON 端點 (/api/analytics/...)
+app.register_blueprint(analytics_api)
+
+# Prometheus 指標 (/metrics)
+app.register_blueprint(metrics_api)
+
+# API 回應的產生耗時 (秒)
+RENDER_SECONDS = histogram('render_seconds', '畫面回呼 / API 回應的產生耗時 (秒)', ['view'])
+
+
+class SnapshotBroadcaster:
+    """
+    SSE 推送分派器
+
+    每個新版本只序列化一次 SSE 訊息，所有連線共用同一份位元組內容。
+    """
+
+    def __init__(self, poller, keepalive=15):
+        """
+        Args:
+            poller: 背景資料輪詢器
+            keepalive: 沒有新資料時送出資料時間 (status 事件，兼作保持連線) 的間隔 (秒)
+        """
+        self.poller = poller
+        self.keepalive = keepalive
+
+        self._condition = threading.Condition()
+        # (前一個版本標記, 版本標記, 差異訊息)
+        self._latest = None
+        # (版本標記, 完整資料訊息)
+        self._full_message = None
+
+        poller.add_listener(self._on_snapshot)
+
+    def _on_snapshot(self, snapshot, previous_tag):
+        """輪詢器發布新版本時呼叫：序列化差異訊息並喚醒所有連線"""
+        message = None
+        if previous_tag is not None:
+            delta = self.poller.get_delta(previous_tag, snapshot)
+            if delta is not None:
+                message = self._format_event(snapshot, {
+                    'full': False,
+                    'base_version': previous_tag,
+                    'added': delta['added'],
+                    'removed': delta['removed'],
+                    'changed': delta['changed']
+                })
+
+        with self._condition:
+            self._latest = (previous_tag, snapshot.tag, message)
+            self._condition.notify_all()
+
+    @staticmethod
+    def _format_event(snapshot, payload):
+        """
+        將快照資料序列化為 SSE 訊息
+
+        Args:
+            snapshot: 快照
+            payload: 訊息內容
+
+        Returns:
+            bytes: SSE 訊息
+        """
+        payload['success'] = True
+        payload['version'] = snapshot.tag
+        payload['count'] = len(snapshot.batch)
+        payload['timestamp'] = snapshot.fetched_at.isoformat()
+        header = f"id: {snapshot.tag}\nevent: snapshot\ndata: ".encode('utf-8')
+        return header + dumps(payload) + b"\n\n"
+
+    def get_status_message(self):
+        """
+        取得資料時間的 SSE 訊息 (各連線在送出資料後與保持連線時送出)
+
+        Returns:
+            bytes: SSE 訊息
+        """
+        status = self.poller.get_status()
+        payload = {'age': status.get('age'), 'stale': status.get('stale', False)}
+        return b"event: status\ndata: " + dumps(payload) + b"\n\n"
+
+    def get_full_message(self):
+        """
+        取得最新版本的完整資料訊息 (每個版本只序列化一次)
+
+        Returns:
+            tuple: (版本標記, SSE 訊息)
+        """
+        snapshot = self.poller.get_snapshot()
+        cached = self._full_message
+        if cached is not None and cached[0] == snapshot.tag:
+            return cached
+
+        message = self._format_event(snapshot, {
+            'full': True,
+            'trains': snapshot.batch.to_records()
+        })
+        self._full_message = (snapshot.tag, message)
+        return self._full_message
+
+    def stream(self, since=None):
+        """
+        單一連線的 SSE 產生器
+
+        Args:
+            since: 用戶端目前持有的版本標記 (重新連線時由 Last-Event-ID 帶入)
+
+        Yields:
+            bytes: SSE 訊息
+        """
+        # 先記下目前的通知，之後只處理新的通知 (完整資料的版本可能比通知還新)
+        with self._condition:
+            seen = self._latest
+
+        version, message = self.get_full_message()
+        if since != version:
+            yield message
+        yield self.get_status_message()
+        # 已送出給此連線的版本
+        client_version = version
+
+        while True:
+            with self._condition:
+                self._condition.wait_for(lambda: self._latest is not seen, timeout=self.keepalive)
+                latest = self._latest
+
+            if latest is seen:
+                yield self.get_status_message()
+                continue
+            seen = latest
+
+            previous_tag, version, message = latest
+            if version == client_version:
+                # 連線時送出的完整資料已是此版本
+                continue
+            if message is None or previous_tag != client_version:
+                # 漏接中間版本時改送完整資料
+                version, message = self.get_full_message()
+                if version == client_version:
+                    continue
+            yield message
+            yield self.get_status_message()
+            client_version = version
+
+
+broadcaster = SnapshotBroadcaster(train_data_poller)
+
+# 同時進行中的 SSE 連線上限 (serve.py 依 gthread 執行緒數設定；未設定時不限制)
+_max_streams = os.environ.get('TRA_SSE_MAX_CONNECTIONS')
+stream_slots = threading.BoundedSemaphore(int(_max_streams)) if _max_streams else None
+
+
+# 預先序列化與壓縮的回應內容
+CachedBody = namedtuple('CachedBody', ['etag', 'identity', 'gzip', 'br'])
+
+
+class ResponseCache:
+    """
+    /api/train-data 回應快取
+
+    每個快照版本 (以及每個 since 版本、圖表模式) 只序列化一次 JSON，
+    並預先產生 gzip / brotli 壓縮內容，所有用戶端共用。
+    衍生內容存放於行程內的 LRU 快取，舊版本的內容會依序被淘汰。
+    快取未命中時，同一個鍵同時到達的請求只建立一次內容 (請求合併)。
+    """
+
+    # 小於此大小的內容不壓縮
+    MIN_COMPRESS_SIZE = 1024
+
+    def __init__(self, max_entries=64, ttl=None):
+        """
+        Args:
+            max_entries: 最多保留的回應數
+            ttl: 回應的有效秒數 (None 表示只依 LRU 淘汰)
+        """
+        # (快照版本標記, key) -> CachedBody
+        # 版本標記含輪詢行程的啟動識別，重新啟動後版本號重複也不會取得舊內容
+        self._entries = MemoryCache(max_entries=max_entries, default_ttl=ttl)
+        self._flight = get_single_flight('response_cache')
+
+    def get(self, snapshot, key, build_payload):
+        """
+        取得快取的回應內容，不存在時建立
+
+        Args:
+            snapshot: 快照
+            key: 同一版本內區分回應的鍵 (例如 "s<since>"，完整資料為 None)
+            build_payload: 建立回應內容 dict 的函式
+
+        Returns:
+            CachedBody: 回應內容
+        """
+        cache_key = (snapshot.tag, key)
+        cached = self._entries.get(cache_key)
+        if cached is not None:
+            return cached
+
+        return self._flight.do(cache_key, self._build, snapshot, key, build_payload)
+
+    def _build(self, snapshot, key, build_payload):
+        """序列化並壓縮回應內容後存入快取"""
+        cache_key = (snapshot.tag, key)
+        cached = self._entries.get(cache_key)
+        if cached is not None:
+            # 等待合併期間其他請求已建立完成
+            return cached
+
+        body = dumps(build_payload())
+        compressible = len(body) >= self.MIN_COMPRESS_SIZE
+        etag = f"v{snapshot.tag}" if key is None else f"v{snapshot.tag}-{key}"
+
+        cached = CachedBody(
+            etag=etag,
+            identity=body,
+            gzip=gzip.compress(body, compresslevel=6) if compressible else None,
+            br=brotli.compress(body) if compressible and brotli is not None else None
+        )
+        self._entries.set(cache_key, cached)
+        return cached
+
+
+response_cache = ResponseCache(
+    max_entries=CONFIG.get('response_cache_entries', 64),
+    ttl=CONFIG.get('response_cache_ttl')
+)
+
+
+def make_cached_response(cached):
+    """
+    依 Accept-Encoding 選擇壓縮格式，並處理 If-None-Match 條件式請求
+
+    Args:
+        cached: 快取的回應內容
+
+    Returns:
+        Response: Flask 回應
+    """
+    encoding = None
+    body = cached.identity
+    if cached.br is not None and request.accept_encodings['br']:
+        encoding, body = 'br', cached.br
+    elif cached.gzip is not None and request.accept_encodings['gzip']:
+        encoding, body = 'gzip', cached.gzip
+
+    # 不同壓縮格式的內容不同，ETag 也需區分
+    etag = f"{cached.etag}-{encoding}" if encoding else cached.etag
+
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+    else:
+        response = Response(body, mimetype='application/json')
+        if encoding:
+            response.headers['Content-Encoding'] = encoding
+
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['Vary'] = 'Accept-Encoding'
+    return response
+
 # HTML 模板
 HTML_TEMPLATE = """
 <!DOCTYPE html>
@@ -91,6 +367,14 @@ HTML_TEMPLATE = """
             transform: translateY(0);
         }
         
+        .chart-mode {
+            padding: 8px 12px;
+            border: 1px solid #ced4da;
+            border-radius: 8px;
+            font-size: 14px;
+            margin-bottom: 15px;
+        }
+        
         .status-info {
             display: flex;
             gap: 20px;
@@ -287,9 +571,10 @@ HTML_TEMPLATE = """
         </div>
         
         <div class="controls">
-            <button class="btn" onclick="refreshData()">🔄 重新整理</button>
+            <button class="btn" onclick="refreshData(true)">🔄 重新整理</button>
             <div class="status-info">
                 <div id="statusBadge" class="status-badge status-success">準備就緒</div>
+                <div id="dataAge" class="update-time"></div>
                 <div id="updateTime" class="update-time">等待載入資料...</div>
             </div>
         </div>
@@ -306,6 +591,11 @@ HTML_TEMPLATE = """
         
         <div class="chart-container">
             <h3 style="color: #0066cc; margin-bottom: 20px; font-size: 1.5em;">📈 列車延遲時間圖表</h3>
+            <select id="chartMode" class="chart-mode" onchange="updateChart()">
+                {% for key, label in chart_modes.items() %}
+                <option value="{{ key }}">{{ label }}</option>
+                {% endfor %}
+            </select>
             <div id="barChart"></div>
         </div>
         
@@ -317,41 +607,130 @@ HTML_TEMPLATE = """
     
     <script>
         let autoRefreshInterval;
+        let eventSource = null;
+        let currentVersion = null;
+        let trainMap = new Map();
+        let dataAge = null;
+        let dataStale = false;
+        
+        // 延遲分級由伺服器端 delay_analytics.DELAY_BUCKETS 產生
+        const DELAY_BUCKETS = {{ delay_buckets|tojson }};
+        
+        // 取得延遲所屬的分級 (upper 為 null 表示無上限)
+        function getDelayBucket(delay) {
+            return DELAY_BUCKETS.find(b => b.upper === null || delay <= b.upper);
+        }
         
         // 取得延遲狀態的 CSS 類別
         function getDelayClass(delay) {
-            if (delay === 0) return 'delay-0';
-            if (delay <= 5) return 'delay-light';
-            if (delay <= 10) return 'delay-medium';
-            return 'delay-severe';
+            return getDelayBucket(delay).css_class;
+        }
+        
+        // 套用完整資料或差異，回傳排序後的列車列表
+        function applyData(data) {
+            if (data.full) {
+                trainMap = new Map(data.trains.map(t => [t.車次, t]));
+            } else {
+                data.removed.forEach(no => trainMap.delete(no));
+                Object.entries(data.changed).forEach(([no, fields]) => {
+                    trainMap.set(no, Object.assign({}, trainMap.get(no), fields));
+                });
+                data.added.forEach(t => trainMap.set(t.車次, t));
+            }
+            currentVersion = data.version;
+            
+            return Array.from(trainMap.values()).map((t, i) => {
+                t.序號 = i + 1;
+                return t;
+            });
+        }
+        
+        // 重新繪製圖表、表格與狀態
+        function render(trains) {
+            // 更新圖表 (由伺服器端彙總，列車數量多時不會逐班繪製)
+            updateChart();
+            
+            // 更新表格
+            updateTable(trains);
+            
+            // 更新狀態
+            const statusBadge = document.getElementById('statusBadge');
+            statusBadge.className = 'status-badge status-success';
+            statusBadge.textContent = `✅ ${trains.length} 筆資料`;
+            
+            document.getElementById('updateTime').textContent = 
+                `最後更新: ${new Date().toLocaleString('zh-TW')}`;
+        }
+        
+        // 取得伺服器快照的時間與是否過時 (TDX 異常時仍顯示最後一份資料)
+        // 使用 SSE 時由 status 事件推送，不另外發出請求
+        async function updateServiceStatus() {
+            try {
+                const response = await fetch('/api/status');
+                applyStatus(await response.json());
+            } catch (error) {
+                console.error('狀態錯誤:', error);
+            }
         }
         
-        // 更新資料
-        async function refreshData() {
+        function applyStatus(status) {
+            dataAge = status.age;
+            dataStale = status.stale;
+            renderDataAge();
+        }
+        
+        // 顯示資料時間
+        function renderDataAge() {
+            const element = document.getElementById('dataAge');
+            if (dataAge === null) {
+                element.className = 'status-badge status-error';
+                element.textContent = '尚無資料';
+                return;
+            }
+            const age = Math.round(dataAge);
+            element.className = dataStale ? 'status-badge status-warning' : 'update-time';
+            element.textContent = dataStale
+                ? `⚠️ 資料已過時 (${age} 秒前取得)`
+                : `資料時間: ${age} 秒前`;
+        }
+        
+        // 更新資料 (revalidate 為 true 時要求伺服器在背景重新取得)
+        async function refreshData(revalidate) {
             try {
                 const statusBadge = document.getElementById('statusBadge');
                 statusBadge.className = 'status-badge status-warning';
                 statusBadge.textContent = '載入中...';
                 
-                const response = await fetch('/api/train-data');
+                // 已有資料時只取得差異
+                const params = new URLSearchParams();
+                if (currentVersion !== null) {
+                    params.set('since', currentVersion);
+                }
+                if (revalidate) {
+                    params.set('revalidate', '1');
+                }
+                const response = await fetch(`/api/train-data?${params}`);
                 const data = await response.json();
                 
                 if (data.error) {
                     throw new Error(data.error);
                 }
                 
-                // 更新圖表
-                updateChart(data.trains);
-                
-                // 更新表格
-                updateTable(data.trains);
+                const unchanged = !data.full && data.version === currentVersion;
+                const trains = applyData(data);
                 
-                // 更新狀態
-                statusBadge.className = 'status-badge status-success';
-                statusBadge.textContent = `✅ ${data.trains.length} 筆資料`;
+                // 資料沒有變動時只更新狀態，不重新繪製圖表與表格
+                if (unchanged) {
+                    statusBadge.className = 'status-badge status-success';
+                    statusBadge.textContent = `✅ ${trains.length} 筆資料`;
+                } else {
+                    render(trains);
+                }
                 
-                document.getElementById('updateTime').textContent = 
-                    `最後更新: ${new Date().toLocaleString('zh-TW')}`;
+                // 沒有 SSE 推送時隨資料一併取得資料時間
+                if (!eventSource) {
+                    updateServiceStatus();
+                }
                     
             } catch (error) {
                 console.error('錯誤:', error);
@@ -361,24 +740,60 @@ HTML_TEMPLATE = """
             }
         }
         
-        // 更新 ECharts 圖表
-        function updateChart(trains) {
-            const chart = echarts.init(document.getElementById('barChart'));
+        // 訂閱伺服器推送 (Server-Sent Events)
+        function connectStream() {
+            eventSource = new EventSource('/api/train-stream');
             
-            const trainNos = trains.map(t => t.車次);
-            const delays = trains.map(t => t.延遲時間);
+            eventSource.addEventListener('status', function(event) {
+                applyStatus(JSON.parse(event.data));
+            });
             
-            // 根據延遲時間設定顏色
-            const colors = delays.map(delay => {
-                if (delay === 0) return '#28a745';
-                if (delay <= 5) return '#ffc107';
-                if (delay <= 10) return '#fd7e14';
-                return '#dc3545';
+            eventSource.addEventListener('snapshot', function(event) {
+                const data = JSON.parse(event.data);
+                
+                // 差異的基準版本與本地不符時 (例如漏接推送)，改為重新取得
+                if (!data.full && data.base_version !== currentVersion) {
+                    refreshData();
+                    return;
+                }
+                render(applyData(data));
             });
             
+            eventSource.onerror = function() {
+                if (eventSource.readyState === EventSource.CLOSED) {
+                    // 伺服器拒絕連線 (例如 SSE 連線數已達上限)：改為每 30 秒自動更新
+                    eventSource = null;
+                    startPolling();
+                    return;
+                }
+                // EventSource 會自動重新連線，這裡只更新狀態
+                const statusBadge = document.getElementById('statusBadge');
+                statusBadge.className = 'status-badge status-warning';
+                statusBadge.textContent = '重新連線中...';
+            };
+        }
+        
+        // 更新 ECharts 圖表 (資料來自 /api/chart-data)
+        async function updateChart() {
+            const element = document.getElementById('barChart');
+            const chart = echarts.getInstanceByDom(element) || echarts.init(element);
+            
+            const mode = document.getElementById('chartMode').value;
+            let data;
+            try {
+                const response = await fetch(`/api/chart-data?mode=${mode}`);
+                data = await response.json();
+                if (data.error) {
+                    throw new Error(data.error);
+                }
+            } catch (error) {
+                console.error('圖表錯誤:', error);
+                return;
+            }
+            
             const option = {
                 title: {
-                    text: '各車次延遲時間統計',
+                    text: data.title,
                     left: 'center',
                     textStyle: {
                         color: '#0066cc',
@@ -392,14 +807,7 @@ HTML_TEMPLATE = """
                         type: 'shadow'
                     },
                     formatter: function(params) {
-                        const data = params[0];
-                        const trainInfo = trains[data.dataIndex];
-                        return `
-                            <strong>車次:</strong> ${trainInfo.車次}<br/>
-                            <strong>列車類型:</strong> ${trainInfo.列車類型}<br/>
-                            <strong>即將到達:</strong> ${trainInfo.即將到達}<br/>
-                            <strong>延遲時間:</strong> ${trainInfo.延遲時間} 分鐘
-                        `;
+                        return data.hover[params[0].dataIndex];
                     }
                 },
                 grid: {
@@ -410,13 +818,13 @@ HTML_TEMPLATE = """
                 },
                 xAxis: {
                     type: 'category',
-                    data: trainNos,
+                    data: data.x,
                     axisLabel: {
                         rotate: 45,
                         interval: 0,
                         fontSize: 10
                     },
-                    name: '車次',
+                    name: data.x_title,
                     nameLocation: 'middle',
                     nameGap: 60,
                     nameTextStyle: {
@@ -426,19 +834,19 @@ HTML_TEMPLATE = """
                 },
                 yAxis: {
                     type: 'value',
-                    name: '延遲時間 (分鐘)',
+                    name: data.y_title,
                     nameTextStyle: {
                         fontSize: 14,
                         fontWeight: 'bold'
                     }
                 },
                 series: [{
-                    name: '延遲時間',
+                    name: data.y_title,
                     type: 'bar',
-                    data: delays,
+                    data: data.y,
                     itemStyle: {
                         color: function(params) {
-                            return colors[params.dataIndex];
+                            return data.colors[params.dataIndex];
                         }
                     },
                     label: {
@@ -449,12 +857,8 @@ HTML_TEMPLATE = """
                 }]
             };
             
-            chart.setOption(option);
-            
-            // 響應式調整
-            window.addEventListener('resize', function() {
-                chart.resize();
-            });
+            // 模式切換時類別軸內容不同，整個取代舊設定
+            chart.setOption(option, true);
         }
         
         // 更新表格
@@ -496,19 +900,49 @@ HTML_TEMPLATE = """
             document.getElementById('dataTable').innerHTML = html;
         }
         
+        // 響應式調整
+        window.addEventListener('resize', function() {
+            const chart = echarts.getInstanceByDom(document.getElementById('barChart'));
+            if (chart) {
+                chart.resize();
+            }
+        });
+        
+        // 資料時間每秒遞增，收到伺服器的 status 事件或資料時校正
+        setInterval(function() {
+            if (dataAge !== null) {
+                dataAge += 1;
+                renderDataAge();
+            }
+        }, 1000);
+        
         // 頁面載入時執行
         window.onload = function() {
-            refreshData();
-            
-            // 每 30 秒自動更新
-            autoRefreshInterval = setInterval(refreshData, 30000);
+            if (window.EventSource) {
+                // 由伺服器在資料更新時主動推送
+                connectStream();
+            } else {
+                // 不支援 SSE 的瀏覽器改為每 30 秒自動更新
+                startPolling();
+            }
         };
         
-        // 頁面關閉時清除定時器
+        // 定時輪詢 (第一次取得完整資料後只取得差異)
+        function startPolling() {
+            refreshData();
+            if (!autoRefreshInterval) {
+                autoRefreshInterval = setInterval(refreshData, 30000);
+            }
+        }
+        
+        // 頁面關閉時清除定時器與推送連線
         window.onbeforeunload = function() {
             if (autoRefreshInterval) {
                 clearInterval(autoRefreshInterval);
             }
+            if (eventSource) {
+                eventSource.close();
+            }
         };
     </script>
 </body>
@@ -519,20 +953,87 @@ HTML_TEMPLATE = """
 @app.route('/')
 def index():
     """主頁面"""
-    return render_template_string(HTML_TEMPLATE)
+    return render_template_string(
+        HTML_TEMPLATE,
+        delay_buckets=[bucket._asdict() for bucket in DELAY_BUCKETS],
+        chart_modes=CHART_MODES
+    )
 
 
 @app.route('/api/train-data')
+@RENDER_SECONDS.labels('api_train_data').time()
 def get_train_data_api():
-    """API 端點：取得列車資料"""
+    """
+    API 端點：取得列車資料
+    
+    帶入 since=<版本標記> 時只回傳該版本之後的差異 (added / removed / changed)，
+    若版本已過舊或屬於輪詢行程重新啟動前的版本，則回傳完整資料 (full=true)。
+    
+    快照過時或帶入 revalidate=1 時立即回傳目前的快照，並在背景重新取得資料。
+    """
     try:
-        trains = get_train_data()
+        snapshot = train_data_poller.get_snapshot()
+        if request.args.get('revalidate') or train_data_poller.get_status()['stale']:
+            train_data_poller.revalidate()
+        
+        since = request.args.get('since')
+        delta = None
+        if since is not None:
+            delta = train_data_poller.get_delta(since, snapshot)
+        
+        if delta is not None:
+            cached = response_cache.get(snapshot, f"s{since}", lambda: {
+                'success': True,
+                'full': False,
+                'version': snapshot.tag,
+                'added': delta['added'],
+                'removed': delta['removed'],
+                'changed': delta['changed'],
+                'count': len(snapshot.batch),
+                'timestamp': snapshot.fetched_at.isoformat()
+            })
+        else:
+            cached = response_cache.get(snapshot, None, lambda: {
+                'success': True,
+                'full': True,
+                'version': snapshot.tag,
+                'trains': snapshot.batch.to_records(),
+                'count': len(snapshot.batch),
+                'timestamp': snapshot.fetched_at.isoformat()
+            })
+        
+        return make_cached_response(cached)
+    except Exception as e:
         return jsonify({
-            'success': True,
-            'trains': trains,
-            'count': len(trains),
-            'timestamp': datetime.now().isoformat()
-        })
+            'success': False,
+            'error': str(e)
+        }), 500
+
+
+@app.route('/api/chart-data')
+@RENDER_SECONDS.labels('api_chart_data').time()
+def get_chart_data_api():
+    """
+    API 端點：取得延遲圖表資料
+    
+    mode 可為 auto / per_train / top_delays / by_train_type / histogram，
+    auto 在列車數超過 chart_max_bars 時改為只顯示延遲最嚴重的車次。
+    """
+    mode = request.args.get('mode', 'auto')
+    if mode not in CHART_MODES:
+        return jsonify({
+            'success': False,
+            'error': f"不支援的圖表模式: {mode}"
+        }), 400
+    
+    try:
+        snapshot = train_data_poller.get_snapshot()
+        cached = response_cache.get(snapshot, f"chart-{mode}", lambda: dict(
+            build_chart_data(snapshot.batch, mode),
+            success=True,
+            version=snapshot.tag
+        ))
+        return make_cached_response(cached)
     except Exception as e:
         return jsonify({
             'success': False,
@@ -540,7 +1041,52 @@ def get_train_data_api():
         }), 500
 
 
+@app.route('/api/status')
+def get_status_api():
+    """API 端點：資料時間、是否過時與各上游端點的斷路器狀態"""
+    return jsonify(get_service_status())
+
+
+@app.route('/api/train-stream')
+def train_stream_api():
+    """SSE 端點：資料更新時主動推送完整資料或差異"""
+    since = request.args.get('since') or request.headers.get('Last-Event-ID')
+
+    try:
+        # 確認已有快照可推送，失敗時與 /api/train-data 相同回傳錯誤
+        broadcaster.get_full_message()
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+    # 每個 SSE 連線占用一個執行緒，超過上限時讓瀏覽器改為定時輪詢
+    if stream_slots is not None and not stream_slots.acquire(blocking=False):
+        return jsonify({
+            'success': False,
+            'error': 'SSE 連線數已達上限'
+        }), 503
+
+    def generate():
+        try:
+            yield from broadcaster.stream(since)
+        finally:
+            if stream_slots is not None:
+                stream_slots.release()
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={
+            'Cache-Control': 'no-cache',
+            'X-Accel-Buffering': 'no'
+        }
+    )
+
+
 if __name__ == '__main__':
+    configure_logging()
     print("=" * 60)
     print("🚂 台鐵列車即時動態資訊系統 (PyEcharts 版本)")
     print("=" * 60)
@@ -549,4 +1095,4 @@ if __name__ == '__main__':
     print("按 Ctrl+C 可停止服務")
     print("=" * 60)
     
-    app.run(debug=True, host='127.0.0.1', port=5000)
+    app.run(debug=True, host='127.0.0.1', port=5000, threaded=True)
@@ -0,0 +1,305 @@
+"""
+TDX API 非同步服務模組
+以 asyncio 同時取得多個 TDX 台鐵 API 端點的資料
+"""
+
+import asyncio
+import logging
+from datetime import date
+import aiohttp
+from circuit_breaker import get_breaker
+from config import CONFIG
+from single_flight import AsyncSingleFlight, get_single_flight
+from tdx_service import UNAUTHORIZED_RETRIES, tdx_service
+
+
+logger = logging.getLogger(__name__)
+
+
+# TDX 台鐵 (TRA) API 端點路徑
+TRAIN_LIVE_BOARD_PATH = '/v3/Rail/TRA/TrainLiveBoard'
+STATION_LIVE_BOARD_PATH = '/v3/Rail/TRA/StationLiveBoard/Station/{station_id}'
+STATION_PATH = '/v3/Rail/TRA/Station'
+DAILY_TIMETABLE_PATH = '/v3/Rail/TRA/DailyTrainTimetable/TrainDate/{train_date}'
+
+
+class AsyncTDXService:
+    """
+    TDX API 非同步服務類別
+
+    與 TDXService 共用同一個 Access Token (每次請求前檢查是否即將過期)，
+    並以 Semaphore 限制同時進行中的請求數；同一客戶端的所有端點共用一個斷路器。
+    """
+
+    def __init__(self, token_provider=None, max_concurrency=None, config=None):
+        """
+        Args:
+            token_provider: 提供 Access Token 的 TDXService 實例 (預設使用全域實例)
+            max_concurrency: 同時進行中的請求上限
+            config: 設定 dict，預設為 config.py 的 CONFIG
+        """
+        config = CONFIG if config is None else config
+        self.token_provider = token_provider or tdx_service
+        self.base_url = config.get(
+            'api_base_url',
+            'https://tdx.transportdata.tw/api/basic'
+        ).rstrip('/')
+        self.max_concurrency = max_concurrency or config.get('async_max_concurrency', 8)
+        # total 為單一請求 (含等待連線) 的時間預算
+        self.timeout = aiohttp.ClientTimeout(
+            total=config.get('fetch_budget', 20),
+            sock_connect=config.get('connect_timeout', 5),
+            sock_read=config.get('read_timeout', 30)
+        )
+
+        self._session = None
+        self._semaphore = None
+        self._token_lock = None
+        # 所有端點位於同一個上游，共用一個斷路器 (上游中斷時不必每個路徑各自失敗數次)
+        self.breaker = get_breaker(f"async {self.base_url}")
+        # 同一端點與參數同時被請求時只送出一次 (合併實例為全行程共用，以客戶端區分)
+        self._flight = get_single_flight('async_fetch', AsyncSingleFlight)
+
+    async def __aenter__(self):
+        await self.open()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    async def open(self):
+        """建立 aiohttp Session (須在事件迴圈中呼叫)"""
+        if self._session is None:
+            connector = aiohttp.TCPConnector(limit=self.max_concurrency)
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=self.timeout
+            )
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+            self._token_lock = asyncio.Lock()
+
+    async def close(self):
+        """關閉 aiohttp Session"""
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    async def _get_token(self, rejected=None):
+        """
+        取得共用的 Access Token
+
+        TDXService 的 Token 仍有效 (未到過期前的保留時間) 時直接使用，不切換執行緒；
+        否則同一時間只會有一個協程向 TDXService 取得 Token，其餘協程等待並共用結果。
+
+        Args:
+            rejected: 收到 401 時使用的 Token (捨棄後重新取得)
+
+        Returns:
+            str: Access Token
+        """
+        if rejected is not None:
+            self.token_provider.invalidate_token(rejected)
+
+        token = self.token_provider.get_cached_token()
+        if token is not None:
+            return token
+
+        async with self._token_lock:
+            # 等待鎖的期間其他協程可能已取得新的 Token
+            token = self.token_provider.get_cached_token()
+            if token is not None:
+                return token
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(None, self.token_provider.get_access_token)
+
+    async def fetch(self, path, params=None):
+        """
+        取得單一 API 端點的資料
+
+        同一路徑與參數同時被請求時只送出一次，所有協程共用同一份結果 (請勿修改)。
+
+        Args:
+            path: API 路徑 (例如 /v3/Rail/TRA/Station)
+            params: 額外的查詢參數
+
+        Returns:
+            dict: API 回傳的 JSON 資料
+        """
+        key = (id(self), self.base_url, path, tuple(sorted((params or {}).items())))
+        return await self._flight.do(key, self._fetch_with_breaker, path, params)
+
+    async def _fetch_with_breaker(self, path, params=None):
+        """透過客戶端的斷路器送出請求"""
+        breaker = self.breaker
+        breaker.before_call()
+        try:
+            result = await self._fetch(path, params)
+        except aiohttp.ClientResponseError as e:
+            # 只有 429 / 5xx 視為上游失敗
+            if e.status == 429 or e.status >= 500:
+                breaker.record_failure()
+            else:
+                breaker.record_success()
+            raise
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            breaker.record_failure()
+            raise
+        except BaseException:
+            # 取消、取得 Token 失敗或認證端點的斷路器開啟：沒有此端點的結果，只釋放試探呼叫
+            breaker.release()
+            raise
+        breaker.record_success()
+        return result
+
+    async def _fetch(self, path, params=None):
+        """送出請求，收到 401 時重新取得 Token 並重試一次"""
+        await self.open()
+
+        url = f"{self.base_url}{path}"
+        query = {'$format': 'JSON'}
+        if params:
+            query.update(params)
+
+        async with self._semaphore:
+            token = await self._get_token()
+            async with self._session.get(
+                url,
+                params=query,
+                headers={'Authorization': f'Bearer {token}'}
+            ) as response:
+                if response.status != 401:
+                    response.raise_for_status()
+                    return await response.json()
+
+            # 如果是 401 錯誤，重新取得 Token 並重試一次
+            logger.warning("Token 已失效，重新取得... (%s)", path)
+            UNAUTHORIZED_RETRIES.inc()
+            token = await self._get_token(rejected=token)
+            async with self._session.get(
+                url,
+                params=query,
+                headers={'Authorization': f'Bearer {token}'}
+            ) as response:
+                response.raise_for_status()
+                return await response.json()
+
+    async def get_train_live_board(self):
+        """
+        取得台鐵列車即時動態資料
+
+        Returns:
+            list: 列車動態資料列表
+        """
+        data = await self.fetch(TRAIN_LIVE_BOARD_PATH)
+        return data.get('TrainLiveBoards', [])
+
+    async def get_station_live_board(self, station_id):
+        """
+        取得單一車站的列車到離站資料
+
+        Args:
+            station_id: 車站代碼
+
+        Returns:
+            list: 車站列車動態資料列表
+        """
+        data = await self.fetch(STATION_LIVE_BOARD_PATH.format(station_id=station_id))
+        return data.get('StationLiveBoards', [])
+
+    async def get_stations(self):
+        """
+        取得台鐵車站基本資料
+
+        Returns:
+            list: 車站資料列表
+        """
+        data = await self.fetch(STATION_PATH)
+        return data.get('Stations', [])
+
+    async def get_daily_timetable(self, train_date=None):
+        """
+        取得指定日期的台鐵每日時刻表
+
+        Args:
+            train_date: 日期 (date 或 YYYY-MM-DD 字串)，預設為今天
+
+        Returns:
+            list: 車次時刻表列表
+        """
+        if train_date is None:
+            train_date = date.today()
+        if isinstance(train_date, date):
+            train_date = train_date.isoformat()
+
+        data = await self.fetch(DAILY_TIMETABLE_PATH.format(train_date=train_date))
+        return data.get('TrainTimetables', [])
+
+    async def get_station_live_boards(self, station_ids):
+        """
+        同時取得多個車站的列車到離站資料
+
+        Args:
+            station_ids: 車站代碼列表
+
+        Returns:
+            dict: 車站代碼 -> 車站列車動態資料列表
+        """
+        station_ids = list(station_ids)
+        results = await asyncio.gather(
+            *(self.get_station_live_board(station_id) for station_id in station_ids)
+        )
+        return dict(zip(station_ids, results))
+
+    async def get_composite(self, station_ids=(), include_stations=False,
+                            include_timetable=False, train_date=None):
+        """
+        同時取得組合畫面所需的多個端點資料
+
+        總耗時取決於最慢的單一請求，而非所有請求時間的總和。
+
+        Args:
+            station_ids: 需要車站即時資料的車站代碼列表
+            include_stations: 是否包含車站基本資料
+            include_timetable: 是否包含每日時刻表
+            train_date: 時刻表日期，預設為今天
+
+        Returns:
+            dict: 各端點的資料
+        """
+        tasks = {
+            'train_live_board': self.get_train_live_board(),
+            'station_live_boards': self.get_station_live_boards(station_ids),
+        }
+        if include_stations:
+            tasks['stations'] = self.get_stations()
+        if include_timetable:
+            tasks['daily_timetable'] = self.get_daily_timetable(train_date)
+
+        results = await asyncio.gather(*tasks.values())
+        return dict(zip(tasks.keys(), results))
+
+
+def fetch_composite(station_ids=(), include_stations=False,
+                    include_timetable=False, train_date=None):
+    """
+    同步介面：同時取得多個端點的資料
+
+    Args:
+        station_ids: 需要車站即時資料的車站代碼列表
+        include_stations: 是否包含車站基本資料
+        include_timetable: 是否包含每日時刻表
+        train_date: 時刻表日期，預設為今天
+
+    Returns:
+        dict: 各端點的資料
+    """
+    async def _run():
+        async with AsyncTDXService() as service:
+            return await service.get_composite(
+                station_ids,
+                include_stations=include_stations,
+                include_timetable=include_timetable,
+                train_date=train_date
+            )
+
+    return asyncio.run(_run())
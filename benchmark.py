@@ -0,0 +1,464 @@
+"""
+台鐵列車即時動態資訊系統 - 效能基準測試
+以本機 TDX 替身伺服器 (mock_tdx_server.py) 測量取得、解析、格式化與畫面產生的耗時，
+結果存為 JSON 基準檔，可與先前的基準比較找出效能退化
+
+使用方式:
+    python benchmark.py                                   # 預設列車數 60 / 1000 / 10000
+    python benchmark.py --trains 60 500 2000 10000 --output benchmarks/baseline.json
+    python benchmark.py --compare benchmarks/baseline.json --threshold 0.2
+"""
+
+import argparse
+import contextlib
+import importlib.util
+import io
+import json
+import logging
+import os
+import platform
+import statistics
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import requests
+from mock_tdx_server import MockTDXServer, TRAIN_LIVE_BOARD_PATH
+
+
+# 基準檔格式版本
+BENCHMARK_FORMAT = 'tra-benchmark-1'
+
+DEFAULT_TRAIN_COUNTS = (60, 1000, 10000)
+
+# 比較時使用的統計值
+COMPARE_METRIC = 'p50_ms'
+
+
+def prepare_config(server):
+    """
+    將設定指向替身伺服器 (必須在匯入 tdx_service 之前呼叫)
+
+    沒有 config.py 時使用 config.example.py 的預設值，
+    並停用會寫入檔案或連線至其他服務的選項，讓每次測試的條件相同。
+
+    Args:
+        server: MockTDXServer
+
+    Returns:
+        dict: 測試使用的 CONFIG
+    """
+    try:
+        import config
+    except ImportError:
+        path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'config.example.py')
+        spec = importlib.util.spec_from_file_location('config', path)
+        config = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(config)
+        sys.modules['config'] = config
+
+    config.CONFIG.update(server.client_config(
+        token_cache_path=None,
+        history_dir=None,
+        cache_backend='memory',
+        response_cache_ttl=None,
+        # 由測試程式主動更新快照，背景輪詢不介入
+        poll_interval=3600,
+        stale_after=3600
+    ))
+    os.environ['TRA_SNAPSHOT_ROLE'] = 'standalone'
+    return config.CONFIG
+
+
+def summarize_timings(timings):
+    """
+    計算耗時統計
+
+    Args:
+        timings: 每次執行的耗時 (秒)
+
+    Returns:
+        dict: iterations、mean_ms、p50_ms、p95_ms、min_ms、ops_per_sec
+    """
+    ordered = sorted(timings)
+    p95 = ordered[min(int(len(ordered) * 0.95), len(ordered) - 1)]
+    mean = statistics.fmean(ordered)
+    return {
+        'iterations': len(ordered),
+        'mean_ms': round(mean * 1000, 4),
+        'p50_ms': round(statistics.median(ordered) * 1000, 4),
+        'p95_ms': round(p95 * 1000, 4),
+        'min_ms': round(ordered[0] * 1000, 4),
+        'ops_per_sec': round(1 / mean, 2) if mean else None
+    }
+
+
+def measure(func, min_time=0.5, min_iterations=5, max_iterations=10000):
+    """
+    重複執行函式直到累計時間超過 min_time
+
+    Args:
+        func: 要測量的函式 (不帶參數)
+        min_time: 最少累計秒數
+        min_iterations: 最少執行次數
+        max_iterations: 最多執行次數
+
+    Returns:
+        dict: 耗時統計
+    """
+    # 暖機一次 (建立快取、連線等)
+    func()
+
+    timings = []
+    started = time.perf_counter()
+    while len(timings) < max_iterations:
+        t0 = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - t0)
+        if len(timings) >= min_iterations and time.perf_counter() - started >= min_time:
+            break
+    return summarize_timings(timings)
+
+
+def measure_concurrent(url, clients, total_requests, headers=None):
+    """
+    以多個用戶端同時請求同一個網址
+
+    Args:
+        url: 請求網址
+        clients: 同時連線的用戶端數
+        total_requests: 總請求數
+        headers: 請求標頭
+
+    Returns:
+        dict: 延遲統計 (每個請求) 與整體吞吐量 (requests_per_sec)、錯誤數
+    """
+    local = threading.local()
+
+    def get_session():
+        session = getattr(local, 'session', None)
+        if session is None:
+            session = local.session = requests.Session()
+        return session
+
+    def one_request(_):
+        t0 = time.perf_counter()
+        response = get_session().get(url, headers=headers)
+        response.content
+        return time.perf_counter() - t0, response.status_code
+
+    with ThreadPoolExecutor(max_workers=clients) as executor:
+        # 每個用戶端先建立連線並暖機
+        list(executor.map(one_request, range(clients)))
+        started = time.perf_counter()
+        results = list(executor.map(one_request, range(total_requests)))
+        elapsed = time.perf_counter() - started
+
+    stats = summarize_timings([timing for timing, _ in results])
+    stats['clients'] = clients
+    stats['requests_per_sec'] = round(total_requests / elapsed, 2)
+    stats['errors'] = sum(1 for _, status in results if status >= 400)
+    return stats
+
+
+@contextlib.contextmanager
+def quiet():
+    """暫時隱藏受測程式的控制台輸出"""
+    with contextlib.redirect_stdout(io.StringIO()):
+        yield
+
+
+class BenchmarkSuite:
+    """
+    各項效能基準測試
+
+    每個 bench_* 方法測量一個路徑，並以目前的列車數執行。
+    """
+
+    def __init__(self, server, clients=8, requests_per_count=400, min_time=0.5):
+        """
+        Args:
+            server: MockTDXServer (已啟動)
+            clients: /api/train-data 測試的同時用戶端數
+            requests_per_count: 每個列車數的 /api/train-data 總請求數
+            min_time: 每個測試最少累計秒數
+        """
+        self.server = server
+        self.clients = clients
+        self.requests_per_count = requests_per_count
+        self.min_time = min_time
+
+        # 設定指向替身伺服器後才匯入應用程式模組
+        import app
+        import app1
+        import tdx_service
+
+        self.tdx = tdx_service
+        self.dash_app = app
+        self.echarts_app = app1
+        self.service = tdx_service.tdx_service
+        self._api_server = None
+        self._api_url = None
+
+    def close(self):
+        """停止測試用的 HTTP 伺服器"""
+        if self._api_server is not None:
+            self._api_server.shutdown()
+
+    def set_train_count(self, train_count):
+        """變更替身伺服器的列車數，並更新輪詢器的快照"""
+        self.server.network.resize(train_count)
+        with quiet():
+            self.tdx.train_data_poller.refresh()
+
+    def run(self, train_count):
+        """
+        執行所有測試
+
+        Args:
+            train_count: 列車數
+
+        Returns:
+            dict: 測試名稱 -> 統計
+        """
+        self.set_train_count(train_count)
+        results = {}
+        for name in sorted(dir(self)):
+            if name.startswith('bench_'):
+                with quiet():
+                    results[name[len('bench_'):]] = getattr(self, name)()
+        return results
+
+    def bench_token_cache_hit(self):
+        """TDXService.get_access_token() 使用快取 Token 的耗時"""
+        self.service.get_access_token()
+        return measure(self.service.get_access_token, self.min_time)
+
+    def bench_live_board_fetch(self):
+        """get_train_live_board() 由替身伺服器取得全部分頁 (不使用條件式請求快取)"""
+        def fetch():
+            self.service._page_cache.clear()
+            self.service.get_train_live_board()
+        return measure(fetch, self.min_time, max_iterations=200)
+
+    def bench_live_board_parse(self):
+        """單一完整回應的 JSON 解析耗時 (與 TDXService 相同的解碼器與欄位)"""
+        body = self._live_board_body()
+        return measure(lambda: self.service._live_board_decoder.decode(body), self.min_time)
+
+    def bench_batch_format(self):
+        """TDX 原始資料轉換為 TrainBatch (build_train_batch) 的耗時"""
+        _, trains = self.service._live_board_decoder.decode(self._live_board_body())
+        return measure(lambda: self.tdx.build_train_batch(trains), self.min_time)
+
+    def bench_get_train_data(self):
+        """get_train_data() 轉換為顯示用 dict 列表的耗時"""
+        return measure(self.tdx.get_train_data, self.min_time)
+
+    def bench_dash_chart_callback(self):
+        """Dash update_train_table 回呼 (狀態訊息 + 圖表 Patch) 的完整請求耗時"""
+        client = self.dash_app.server.test_client()
+        body = {
+            'output': '..status-message.children...last-update-time.children'
+                      '...delay-bar-chart.figure...chart-state.data..',
+            'outputs': [
+                {'id': 'status-message', 'property': 'children'},
+                {'id': 'last-update-time', 'property': 'children'},
+                {'id': 'delay-bar-chart', 'property': 'figure'},
+                {'id': 'chart-state', 'property': 'data'},
+            ],
+            'inputs': [
+                {'id': 'interval-component', 'property': 'n_intervals', 'value': 1},
+                {'id': 'refresh-button', 'property': 'n_clicks', 'value': None},
+                {'id': 'trigger-on-load', 'property': 'data', 'value': None},
+                {'id': 'chart-mode', 'property': 'value', 'value': 'auto'},
+            ],
+            'changedPropIds': ['interval-component.n_intervals'],
+            # 沒有前一次的圖表狀態，每次都完整產生圖表資料
+            'state': [{'id': 'chart-state', 'property': 'data', 'value': None}],
+        }
+        return measure(lambda: self._dash_post(client, body), self.min_time)
+
+    def bench_dash_table_callback(self):
+        """Dash update_table_page 回呼 (依延遲時間排序的第一頁) 的完整請求耗時"""
+        client = self.dash_app.server.test_client()
+        body = {
+            'output': '..train-table.data...train-table.page_count...table-state.data..',
+            'outputs': [
+                {'id': 'train-table', 'property': 'data'},
+                {'id': 'train-table', 'property': 'page_count'},
+                {'id': 'table-state', 'property': 'data'},
+            ],
+            'inputs': [
+                {'id': 'train-table', 'property': 'page_current', 'value': 0},
+                {'id': 'train-table', 'property': 'page_size', 'value': 20},
+                {'id': 'train-table', 'property': 'sort_by',
+                 'value': [{'column_id': '延遲時間', 'direction': 'desc'}]},
+                {'id': 'train-table', 'property': 'filter_query', 'value': ''},
+                {'id': 'interval-component', 'property': 'n_intervals', 'value': 1},
+                {'id': 'refresh-button', 'property': 'n_clicks', 'value': None},
+                {'id': 'trigger-on-load', 'property': 'data', 'value': None},
+            ],
+            'changedPropIds': ['train-table.sort_by'],
+            'state': [{'id': 'table-state', 'property': 'data', 'value': None}],
+        }
+        return measure(lambda: self._dash_post(client, body), self.min_time)
+
+    def bench_api_train_data(self):
+        """app1 /api/train-data 在多個用戶端同時請求時的延遲與吞吐量"""
+        url = self._start_api_server()
+        return measure_concurrent(
+            f"{url}/api/train-data",
+            self.clients,
+            self.requests_per_count,
+            headers={'Accept-Encoding': 'gzip'}
+        )
+
+    def _live_board_body(self):
+        """取得替身伺服器的完整列車動態回應"""
+        token = self.service.get_access_token()
+        response = requests.get(
+            f"{self.server.base_url}/api/basic{TRAIN_LIVE_BOARD_PATH}?$format=JSON",
+            headers={'Authorization': f'Bearer {token}'}
+        )
+        response.raise_for_status()
+        return response.content
+
+    @staticmethod
+    def _dash_post(client, body):
+        response = client.post('/_dash-update-component', json=body)
+        if response.status_code != 200:
+            raise RuntimeError(f"Dash 回呼失敗: {response.status_code}")
+        return response.data
+
+    def _start_api_server(self):
+        """以多執行緒的 WSGI 伺服器啟動 app1 (每個列車數共用)"""
+        if self._api_server is None:
+            from werkzeug.serving import make_server
+            # 不輸出每個請求的存取記錄
+            logging.getLogger('werkzeug').setLevel(logging.ERROR)
+            self._api_server = make_server('127.0.0.1', 0, self.echarts_app.app, threaded=True)
+            threading.Thread(target=self._api_server.serve_forever, daemon=True).start()
+            self._api_url = f"http://127.0.0.1:{self._api_server.server_port}"
+        return self._api_url
+
+
+def run_benchmarks(train_counts, clients=8, requests_per_count=400, min_time=0.5, latency=0.0):
+    """
+    依列車數執行所有測試
+
+    Args:
+        train_counts: 列車數列表
+        clients: /api/train-data 測試的同時用戶端數
+        requests_per_count: 每個列車數的 /api/train-data 總請求數
+        min_time: 每個測試最少累計秒數
+        latency: 替身伺服器每個請求的延遲 (秒)
+
+    Returns:
+        dict: 基準檔內容
+    """
+    server = MockTDXServer(port=0, train_count=train_counts[0], update_interval=0, latency=latency)
+    server.start()
+    config = prepare_config(server)
+
+    suite = BenchmarkSuite(server, clients, requests_per_count, min_time)
+    results = {}
+    try:
+        for train_count in train_counts:
+            print(f"▶ 列車數 {train_count}")
+            for name, stats in suite.run(train_count).items():
+                results.setdefault(name, {})[str(train_count)] = stats
+                print(f"  {name:<22} p50 {stats['p50_ms']:>10.3f} ms   p95 {stats['p95_ms']:>10.3f} ms")
+    finally:
+        suite.close()
+        server.shutdown()
+
+    return {
+        'format': BENCHMARK_FORMAT,
+        'created_at': datetime.now().isoformat(timespec='seconds'),
+        'environment': {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count()
+        },
+        'parameters': {
+            'train_counts': list(train_counts),
+            'clients': clients,
+            'requests_per_count': requests_per_count,
+            'mock_latency': latency,
+            'page_size': config.get('page_size', 500),
+            'parallel_pages': config.get('parallel_pages', 1),
+            'json_decoder': suite.service._live_board_decoder.name,
+            'parse_all_fields': config.get('parse_all_fields', False)
+        },
+        'results': results
+    }
+
+
+def compare_results(baseline, current, threshold=0.2):
+    """
+    比較兩份基準檔
+
+    Args:
+        baseline: 先前的基準檔內容
+        current: 本次的基準檔內容
+        threshold: 允許的變慢比例 (0.2 表示 p50 增加超過 20% 視為退化)
+
+    Returns:
+        list: 退化項目 (測試名稱, 列車數, 先前 p50, 本次 p50, 比例)
+    """
+    regressions = []
+    print(f"與基準比較 ({COMPARE_METRIC}，門檻 +{threshold:.0%})")
+    for name, by_count in current['results'].items():
+        for train_count, stats in by_count.items():
+            previous = baseline.get('results', {}).get(name, {}).get(train_count)
+            if not previous or not previous.get(COMPARE_METRIC):
+                continue
+            ratio = stats[COMPARE_METRIC] / previous[COMPARE_METRIC]
+            marker = '✗' if ratio > 1 + threshold else '✓'
+            print(f"  {marker} {name:<22} {train_count:>6} 列車  "
+                  f"{previous[COMPARE_METRIC]:>10.3f} → {stats[COMPARE_METRIC]:>10.3f} ms ({ratio - 1:+.1%})")
+            if ratio > 1 + threshold:
+                regressions.append((name, train_count, previous[COMPARE_METRIC], stats[COMPARE_METRIC], ratio))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='台鐵列車即時動態資訊系統 效能基準測試')
+    parser.add_argument('--trains', type=int, nargs='+', default=list(DEFAULT_TRAIN_COUNTS),
+                        help='列車數 (可指定多個)')
+    parser.add_argument('--clients', type=int, default=8, help='/api/train-data 同時用戶端數')
+    parser.add_argument('--requests', type=int, default=400, help='每個列車數的 /api/train-data 總請求數')
+    parser.add_argument('--min-time', type=float, default=0.5, help='每個測試最少累計秒數')
+    parser.add_argument('--latency', type=float, default=0.0, help='替身伺服器每個請求的延遲 (秒)')
+    parser.add_argument('--output', default='benchmarks/latest.json', help='結果輸出路徑')
+    parser.add_argument('--compare', help='與指定的基準檔比較')
+    parser.add_argument('--threshold', type=float, default=0.2, help='視為退化的變慢比例')
+    args = parser.parse_args()
+
+    current = run_benchmarks(args.trains, args.clients, args.requests, args.min_time, args.latency)
+
+    directory = os.path.dirname(os.path.abspath(args.output))
+    os.makedirs(directory, exist_ok=True)
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(current, f, ensure_ascii=False, indent=2)
+    print(f"✓ 結果已寫入: {args.output}")
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            baseline = json.load(f)
+        if baseline.get('format') != BENCHMARK_FORMAT:
+            print(f"✗ 不支援的基準檔格式: {baseline.get('format')}")
+            return 1
+        regressions = compare_results(baseline, current, args.threshold)
+        if regressions:
+            print(f"✗ {len(regressions)} 項效能退化")
+            return 1
+        print("✓ 沒有效能退化")
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,295 @@
+"""
+快取後端模組
+提供具 TTL 與 LRU 淘汰的行程內快取，以及以 Redis 協定連線的共用快取
+"""
+
+import socket
+import threading
+import time
+from collections import OrderedDict
+from urllib.parse import urlsplit
+from config import CONFIG
+
+
+class MemoryCache:
+    """
+    行程內快取 (LRU + TTL)
+
+    超過 max_entries 時淘汰最久未使用的項目，過期項目在讀取時移除。
+    值可以是任何 Python 物件。
+    """
+
+    # 是否可在多個行程 / 主機之間共用
+    shared = False
+
+    def __init__(self, max_entries=256, default_ttl=None):
+        """
+        Args:
+            max_entries: 最多保留的項目數
+            default_ttl: 預設有效秒數 (None 表示不過期)
+        """
+        self.max_entries = max_entries
+        self.default_ttl = default_ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        """
+        取得快取值
+
+        Args:
+            key: 鍵
+
+        Returns:
+            快取值，不存在或已過期時回傳 None
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            value, expires_at = entry
+            if expires_at is not None and expires_at <= time.monotonic():
+                del self._entries[key]
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value, ttl=None):
+        """
+        設定快取值
+
+        Args:
+            key: 鍵
+            value: 值
+            ttl: 有效秒數 (預設為 default_ttl)
+        """
+        ttl = self.default_ttl if ttl is None else ttl
+        expires_at = time.monotonic() + ttl if ttl is not None else None
+        with self._lock:
+            self._entries[key] = (value, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        """
+        刪除快取值
+
+        Args:
+            key: 鍵
+        """
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        """清除所有快取值"""
+        with self._lock:
+            self._entries.clear()
+
+
+class RedisCache:
+    """
+    以 Redis 協定 (RESP) 連線的共用快取
+
+    只實作 GET / SET / DEL，值必須是 bytes；LRU 淘汰由伺服器的 maxmemory-policy 負責。
+    不需要安裝 redis 套件，也可連線至 fake_redis_server.py 進行本機測試。
+    """
+
+    shared = True
+
+    def __init__(self, host='127.0.0.1', port=6379, db=0, password=None,
+                 prefix='tra:', default_ttl=None, timeout=2):
+        """
+        Args:
+            host: 伺服器主機
+            port: 伺服器埠號
+            db: 資料庫編號
+            password: 密碼 (None 表示不驗證)
+            prefix: 所有鍵的前綴
+            default_ttl: 預設有效秒數 (None 表示不過期)
+            timeout: 連線與讀取逾時 (秒)
+        """
+        self.host = host
+        self.port = port
+        self.db = db
+        self.password = password
+        self.prefix = prefix
+        self.default_ttl = default_ttl
+        self.timeout = timeout
+
+        # 單一連線，以鎖保證請求與回應的順序
+        self._sock = None
+        self._reader = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_url(cls, url, **kwargs):
+        """
+        由 redis://[:password@]host:port/db 建立快取
+
+        Args:
+            url: 連線網址
+
+        Returns:
+            RedisCache: 快取
+        """
+        parts = urlsplit(url)
+        db = parts.path.lstrip('/')
+        return cls(
+            host=parts.hostname or '127.0.0.1',
+            port=parts.port or 6379,
+            db=int(db) if db else 0,
+            password=parts.password,
+            **kwargs
+        )
+
+    def _connect(self):
+        """建立連線並完成驗證與資料庫選擇"""
+        self._sock = socket.create_connection((self.host, self.port), timeout=self.timeout)
+        self._reader = self._sock.makefile('rb')
+        if self.password:
+            self._execute('AUTH', self.password)
+        if self.db:
+            self._execute('SELECT', self.db)
+
+    def close(self):
+        """關閉連線"""
+        with self._lock:
+            self._close()
+
+    def _close(self):
+        if self._sock is not None:
+            try:
+                self._reader.close()
+                self._sock.close()
+            except OSError:
+                pass
+        self._sock = None
+        self._reader = None
+
+    def _execute(self, *args):
+        """送出一個命令並讀取回應 (呼叫端需持有鎖)"""
+        parts = [f"*{len(args)}\r\n".encode()]
+        for arg in args:
+            if not isinstance(arg, bytes):
+                arg = str(arg).encode('utf-8')
+            parts.append(f"${len(arg)}\r\n".encode())
+            parts.append(arg)
+            parts.append(b"\r\n")
+        self._sock.sendall(b''.join(parts))
+        return self._read_reply()
+
+    def _read_reply(self):
+        """解析 RESP 回應"""
+        line = self._reader.readline()
+        if not line:
+            raise ConnectionError("快取伺服器已關閉連線")
+
+        kind, payload = line[:1], line[1:-2]
+        if kind == b'+':
+            return payload.decode()
+        if kind == b'-':
+            raise RuntimeError(f"快取伺服器錯誤: {payload.decode()}")
+        if kind == b':':
+            return int(payload)
+        if kind == b'$':
+            length = int(payload)
+            if length < 0:
+                return None
+            data = self._reader.read(length + 2)
+            return data[:-2]
+        if kind == b'*':
+            count = int(payload)
+            if count < 0:
+                return None
+            return [self._read_reply() for _ in range(count)]
+        raise RuntimeError(f"無法解析的快取伺服器回應: {line!r}")
+
+    def _command(self, *args):
+        """
+        送出命令，連線中斷時重新連線並重試一次
+
+        Returns:
+            命令的回應
+        """
+        with self._lock:
+            for attempt in range(2):
+                try:
+                    if self._sock is None:
+                        self._connect()
+                    return self._execute(*args)
+                except (OSError, ConnectionError):
+                    self._close()
+                    if attempt:
+                        raise
+
+    def get(self, key):
+        """
+        取得快取值
+
+        Args:
+            key: 鍵
+
+        Returns:
+            bytes: 快取值，不存在時回傳 None
+        """
+        return self._command('GET', self.prefix + key)
+
+    def set(self, key, value, ttl=None):
+        """
+        設定快取值
+
+        Args:
+            key: 鍵
+            value: 值 (bytes)
+            ttl: 有效秒數 (預設為 default_ttl)
+        """
+        ttl = self.default_ttl if ttl is None else ttl
+        if ttl is None:
+            self._command('SET', self.prefix + key, value)
+        else:
+            self._command('SET', self.prefix + key, value, 'PX', int(ttl * 1000))
+
+    def delete(self, key):
+        """
+        刪除快取值
+
+        Args:
+            key: 鍵
+        """
+        self._command('DEL', self.prefix + key)
+
+
+def create_cache_backend(name=None):
+    """
+    依設定建立快照快取後端
+
+    Args:
+        name: 'memory' 或 'redis'，預設為 CONFIG['cache_backend']
+
+    Returns:
+        MemoryCache 或 RedisCache: 快取後端
+    """
+    name = name or CONFIG.get('cache_backend', 'memory')
+    if name == 'memory':
+        return MemoryCache(
+            max_entries=CONFIG.get('cache_max_entries', 256),
+            default_ttl=CONFIG.get('cache_ttl')
+        )
+    if name == 'redis':
+        return RedisCache.from_url(
+            CONFIG.get('redis_url', 'redis://127.0.0.1:6379/0'),
+            prefix=CONFIG.get('redis_prefix', 'tra:'),
+            default_ttl=CONFIG.get('cache_ttl')
+        )
+    raise ValueError(f"不支援的快取後端: {name}")
@@ -0,0 +1,261 @@
+"""
+延遲圖表資料模組
+列車數量超過門檻時改以彙總圖表呈現，並以 plotly.graph_objects 建立圖表
+"""
+
+import numpy as np
+import plotly.graph_objects as go
+from dash import Patch
+from config import CONFIG
+from delay_analytics import as_delays, bucket_colors, group_summary
+
+
+# 圖表模式與說明
+CHART_MODES = {
+    'auto': '自動',
+    'per_train': '各車次',
+    'top_delays': '延遲最嚴重車次',
+    'by_train_type': '依列車類型',
+    'histogram': '延遲分布',
+}
+
+# 超過此列車數時，auto 模式改用 top_delays
+MAX_BARS = CONFIG.get('chart_max_bars', 100)
+
+# 延遲分布圖的最大分組數
+MAX_HISTOGRAM_BINS = 30
+
+
+def resolve_chart_mode(batch, mode='auto'):
+    """
+    決定實際使用的圖表模式
+
+    Args:
+        batch: TrainBatch
+        mode: 要求的模式
+
+    Returns:
+        str: 圖表模式
+    """
+    if mode not in CHART_MODES:
+        raise ValueError(f"不支援的圖表模式: {mode}")
+    if mode == 'auto':
+        return 'per_train' if len(batch) <= MAX_BARS else 'top_delays'
+    return mode
+
+
+def build_chart_data(batch, mode='auto'):
+    """
+    建立與繪圖函式庫無關的圖表資料 (Plotly 與 ECharts 共用)
+
+    Args:
+        batch: TrainBatch
+        mode: 圖表模式
+
+    Returns:
+        dict: mode、title、x、y、colors、text、hover、x_title、y_title
+    """
+    mode = resolve_chart_mode(batch, mode)
+    # DelayTime 可能為 None 或非數值 (視為 0)
+    delays = as_delays(batch.delay)
+
+    if mode == 'per_train':
+        return {
+            'mode': mode,
+            'title': '各車次延遲時間統計',
+            'x': list(batch.train_no),
+            'y': delays.tolist(),
+            'colors': bucket_colors(delays),
+            'text': delays.tolist(),
+            'hover': [
+                f"車次: {no}<br>列車類型: {train_type}<br>即將到達: {station}<br>延遲時間: {delay} 分鐘"
+                for no, train_type, station, delay
+                in zip(batch.train_no, batch.train_type, batch.station, delays.tolist())
+            ],
+            'x_title': '車次',
+            'y_title': '延遲時間 (分鐘)',
+        }
+
+    if mode == 'top_delays':
+        # argsort 取延遲最大的 MAX_BARS 筆，再依延遲由大到小排列
+        order = np.argsort(-delays, kind='stable')[:MAX_BARS]
+        top = delays[order]
+        return {
+            'mode': mode,
+            'title': f'延遲最嚴重的 {len(order)} 個車次 (共 {len(batch)} 班)',
+            'x': [batch.train_no[i] for i in order],
+            'y': top.tolist(),
+            'colors': bucket_colors(top),
+            'text': top.tolist(),
+            'hover': [
+                f"車次: {batch.train_no[i]}<br>列車類型: {batch.train_type[i]}<br>"
+                f"即將到達: {batch.station[i]}<br>延遲時間: {delays[i]} 分鐘"
+                for i in order
+            ],
+            'x_title': '車次',
+            'y_title': '延遲時間 (分鐘)',
+        }
+
+    if mode == 'by_train_type':
+        groups = group_summary(batch, 'train_type')
+        means = [group['mean'] for group in groups]
+        return {
+            'mode': mode,
+            'title': '各列車類型平均延遲時間',
+            'x': [group['group'] for group in groups],
+            'y': means,
+            'colors': bucket_colors(np.ceil(means)),
+            'text': means,
+            'hover': [
+                f"列車類型: {group['group']}<br>班次數: {group['count']}<br>"
+                f"平均延遲: {group['mean']} 分鐘<br>最大延遲: {group['max']} 分鐘"
+                for group in groups
+            ],
+            'x_title': '列車類型',
+            'y_title': '平均延遲時間 (分鐘)',
+        }
+
+    # histogram: 依延遲分鐘數分組計算班次數
+    if len(delays):
+        low, high = int(min(delays.min(), 0)), int(delays.max())
+        width = max(int(np.ceil((high - low + 1) / MAX_HISTOGRAM_BINS)), 1)
+        edges = np.arange(low, high + width + 1, width)
+    else:
+        width, edges = 1, np.array([0, 1])
+    counts, _ = np.histogram(delays, bins=edges)
+    lowers = edges[:-1]
+    labels = [
+        f"{lower}" if width == 1 else f"{lower}-{lower + width - 1}"
+        for lower in lowers
+    ]
+    return {
+        'mode': mode,
+        'title': f'延遲時間分布 (共 {len(batch)} 班)',
+        'x': labels,
+        'y': counts.tolist(),
+        'colors': bucket_colors(lowers),
+        'text': counts.tolist(),
+        'hover': [f"延遲 {label} 分鐘<br>班次數: {count}" for label, count in zip(labels, counts.tolist())],
+        'x_title': '延遲時間 (分鐘)',
+        'y_title': '班次數',
+    }
+
+
+def build_delay_figure(chart_data):
+    """
+    以 plotly.graph_objects 建立延遲長條圖
+
+    Args:
+        chart_data: build_chart_data() 的結果
+
+    Returns:
+        go.Figure: 圖表
+    """
+    fig = go.Figure(go.Bar(
+        x=chart_data['x'],
+        y=chart_data['y'],
+        text=chart_data['text'],
+        textposition='outside',
+        marker_color=chart_data['colors'],
+        hovertext=chart_data['hover'],
+        hoverinfo='text'
+    ))
+    fig.update_layout(
+        title={
+            'text': chart_data['title'],
+            'x': 0.5,
+            'xanchor': 'center',
+            'font': {'size': 18, 'color': '#0066cc'}
+        },
+        xaxis={
+            'title': chart_data['x_title'],
+            'type': 'category',
+            'tickangle': -45,
+            'tickfont': {'size': 10}
+        },
+        yaxis={
+            'title': chart_data['y_title'],
+            'gridcolor': '#e0e0e0'
+        },
+        plot_bgcolor='#f8f9fa',
+        paper_bgcolor='white',
+        height=500,
+        margin=dict(t=80, b=100, l=60, r=40)
+    )
+    return fig
+
+
+def empty_chart_data(title):
+    """
+    建立沒有資料時的圖表資料
+
+    Args:
+        title: 圖表標題
+
+    Returns:
+        dict: 與 build_chart_data() 相同格式的空白資料
+    """
+    return {
+        'mode': None,
+        'title': title,
+        'x': [],
+        'y': [],
+        'colors': [],
+        'text': [],
+        'hover': [],
+        'x_title': '車次',
+        'y_title': '延遲時間 (分鐘)',
+    }
+
+
+def build_empty_figure(title):
+    """
+    建立沒有資料時的空白圖表
+
+    Args:
+        title: 圖表標題
+
+    Returns:
+        go.Figure: 圖表
+    """
+    return build_delay_figure(empty_chart_data(title))
+
+
+def patch_delay_figure(chart_data, previous_x=None, changed_train_nos=None):
+    """
+    建立只更新長條資料的 Dash Patch，不重新傳送整個圖表
+
+    類別軸 (x) 與前一次相同且已知變動的車次時，只更新這些車次的長條與標題
+    (標題含班次數，可能隨資料改變)；否則取代整條數列的資料與標題，版面設定維持不變。
+
+    Args:
+        chart_data: build_chart_data() 的結果
+        previous_x: 前一次圖表的類別軸內容
+        changed_train_nos: 前一版本之後有變動的車次集合
+
+    Returns:
+        Patch: 圖表的部分更新
+    """
+    patched = Patch()
+    trace = patched['data'][0]
+
+    if (changed_train_nos is not None and previous_x == chart_data['x']
+            and chart_data['mode'] in ('per_train', 'top_delays')):
+        for i, train_no in enumerate(chart_data['x']):
+            if train_no in changed_train_nos:
+                trace['y'][i] = chart_data['y'][i]
+                trace['text'][i] = chart_data['text'][i]
+                trace['marker']['color'][i] = chart_data['colors'][i]
+                trace['hovertext'][i] = chart_data['hover'][i]
+        patched['layout']['title']['text'] = chart_data['title']
+        return patched
+
+    trace['x'] = chart_data['x']
+    trace['y'] = chart_data['y']
+    trace['text'] = chart_data['text']
+    trace['marker']['color'] = chart_data['colors']
+    trace['hovertext'] = chart_data['hover']
+    patched['layout']['title']['text'] = chart_data['title']
+    patched['layout']['xaxis']['title']['text'] = chart_data['x_title']
+    patched['layout']['yaxis']['title']['text'] = chart_data['y_title']
+    return patched
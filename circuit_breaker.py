@@ -0,0 +1,201 @@
+"""
+斷路器模組
+上游端點連續失敗時暫停呼叫，並以指數退避決定下一次嘗試的時間
+"""
+
+import logging
+import threading
+import time
+from config import CONFIG
+
+
+logger = logging.getLogger(__name__)
+
+
+class CircuitOpenError(RuntimeError):
+    """斷路器開啟中，呼叫未送出即失敗"""
+
+    def __init__(self, name, retry_after):
+        """
+        Args:
+            name: 端點名稱
+            retry_after: 距離下一次嘗試的秒數
+        """
+        super().__init__(f"{name} 暫停呼叫中，{retry_after:.0f} 秒後重試")
+        self.name = name
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """
+    單一端點的斷路器
+
+    - closed: 正常呼叫，連續失敗達 failure_threshold 次時開啟
+    - open: 立即失敗，退避時間到了之後轉為 half_open
+    - half_open: 只放行一次試探呼叫，成功則關閉，失敗則以加倍的退避時間再次開啟；
+      試探呼叫沒有結果 (被取消或在送出前失敗) 時以 release() 釋放，
+      超過 probe_timeout 仍沒有結果時也會再放行一次試探呼叫
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, name, failure_threshold=3, base_backoff=5, max_backoff=300, probe_timeout=60):
+        """
+        Args:
+            name: 端點名稱
+            failure_threshold: 開啟前允許的連續失敗次數
+            base_backoff: 第一次開啟的退避秒數
+            max_backoff: 退避秒數上限
+            probe_timeout: 試探呼叫最多等待結果的秒數，超過時再放行一次試探呼叫
+        """
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.probe_timeout = probe_timeout
+
+        self.state = self.CLOSED
+        self.failures = 0
+        self.open_count = 0
+        self.retry_at = None
+        self._probe_started = None
+        self._lock = threading.Lock()
+
+    def before_call(self):
+        """
+        呼叫前檢查是否可以送出請求
+
+        Raises:
+            CircuitOpenError: 斷路器開啟中 (或已有試探呼叫進行中)
+        """
+        with self._lock:
+            if self.state == self.CLOSED:
+                return
+
+            now = time.monotonic()
+            if self.state == self.OPEN and now >= self.retry_at:
+                # 退避時間已到，放行這一次試探呼叫
+                self.state = self.HALF_OPEN
+                self._probe_started = now
+                return
+
+            if self.state == self.HALF_OPEN:
+                probe_deadline = self._probe_started + self.probe_timeout
+                if now >= probe_deadline:
+                    # 上一次試探呼叫遲遲沒有結果，放行新的試探呼叫
+                    logger.warning("%s 試探呼叫逾時，重新試探", self.name)
+                    self._probe_started = now
+                    return
+                raise CircuitOpenError(self.name, probe_deadline - now)
+
+            raise CircuitOpenError(self.name, max(self.retry_at - now, 0))
+
+    def record_success(self):
+        """記錄成功的呼叫"""
+        with self._lock:
+            self.state = self.CLOSED
+            self.failures = 0
+            self.open_count = 0
+            self.retry_at = None
+
+    def release(self):
+        """
+        釋放沒有結果的呼叫 (被取消，或在送出請求前就失敗)
+
+        不計入成功或失敗；試探呼叫被釋放時回到 open，下一次呼叫可立即再試探。
+        """
+        with self._lock:
+            if self.state == self.HALF_OPEN:
+                self.state = self.OPEN
+
+    def record_failure(self):
+        """記錄失敗的呼叫"""
+        with self._lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                self.open_count += 1
+                backoff = min(self.base_backoff * 2 ** (self.open_count - 1), self.max_backoff)
+                self.state = self.OPEN
+                self.retry_at = time.monotonic() + backoff
+                logger.warning("%s 連續失敗 %d 次，暫停呼叫 %.0f 秒", self.name, self.failures, backoff)
+
+    def call(self, func, *args, **kwargs):
+        """
+        透過斷路器呼叫函式
+
+        Args:
+            func: 要呼叫的函式
+
+        Returns:
+            函式的回傳值
+        """
+        self.before_call()
+        try:
+            result = func(*args, **kwargs)
+        except Exception:
+            self.record_failure()
+            raise
+        except BaseException:
+            self.release()
+            raise
+        self.record_success()
+        return result
+
+    def get_status(self):
+        """
+        取得斷路器狀態
+
+        Returns:
+            dict: state、failures、retry_after (秒)
+        """
+        with self._lock:
+            retry_after = None
+            if self.state == self.OPEN:
+                retry_after = round(max(self.retry_at - time.monotonic(), 0), 1)
+            return {
+                'state': self.state,
+                'failures': self.failures,
+                'retry_after': retry_after
+            }
+
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+
+def get_breaker(name):
+    """
+    取得端點的斷路器 (同一名稱共用同一個實例)
+
+    Args:
+        name: 端點名稱
+
+    Returns:
+        CircuitBreaker: 斷路器
+    """
+    with _breakers_lock:
+        breaker = _breakers.get(name)
+        if breaker is None:
+            breaker = CircuitBreaker(
+                name,
+                failure_threshold=CONFIG.get('breaker_failure_threshold', 3),
+                base_backoff=CONFIG.get('breaker_base_backoff', 5),
+                max_backoff=CONFIG.get('breaker_max_backoff', 300),
+                probe_timeout=CONFIG.get('breaker_probe_timeout', 60)
+            )
+            _breakers[name] = breaker
+        return breaker
+
+
+def get_breaker_status():
+    """
+    取得所有端點的斷路器狀態
+
+    Returns:
+        dict: 端點名稱 -> 狀態
+    """
+    with _breakers_lock:
+        breakers = list(_breakers.values())
+    return {breaker.name: breaker.get_status() for breaker in breakers}
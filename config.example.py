@@ -7,5 +7,84 @@ CONFIG = {
     'client_id': '您的_CLIENT_ID',
     'client_secret': '您的_CLIENT_SECRET',
     'auth_url': 'https://tdx.transportdata.tw/auth/realms/TDXConnect/protocol/openid-connect/token',
-    'api_url': 'https://tdx.transportdata.tw/api/basic/v3/Rail/TRA/TrainLiveBoard?$top=60&$format=JSON'
+    'api_url': 'https://tdx.transportdata.tw/api/basic/v3/Rail/TRA/TrainLiveBoard?$format=JSON',
+
+    # 背景輪詢週期 (秒)，所有頁面共用同一份快照
+    'poll_interval': 30,
+
+    # 保留多少個快照版本，供 /api/train-data?since=<版本號> 計算差異
+    'delta_history_size': 20,
+
+    # Token 過期前多少秒在背景主動更新 (須大於 5 分鐘的快取提前量；有效期較短的 Token 改為有效期的一半)
+    'token_renew_ahead': 600,
+
+    # 跨行程共用的 Token 檔案快取路徑 (None 表示只快取在記憶體)
+    # 多個工作行程或重新啟動時可共用同一個有效的 Token
+    'token_cache_path': None,  # 例如 '.cache/tdx_token.json'
+
+    # 歷史資料目錄 (None 表示不保存)，每個新版本的快照會依日期分區附加保存
+    'history_dir': None,  # 例如 'history'
+
+    # 多行程部署 (serve.py) 設定
+    'shared_snapshot_path': '.cache/train_snapshot.bin',  # 輪詢行程寫入、工作行程讀取的共用快照檔
+    'shared_snapshot_interval': 1,  # 工作行程檢查共用快照的週期 (秒)
+    'server_workers': 4,            # 工作行程數
+    'server_threads': 32,           # 每個工作行程的執行緒數 (gthread，每個 SSE 連線占用一個)
+    'sse_reserved_threads': 8,      # gthread 保留給一般請求的執行緒數，SSE 連線上限為 server_threads 減去此值
+    'server_worker_class': 'gthread',  # 'gthread' 或 'gevent' (需安裝 gevent，SSE 不占用執行緒)
+    'server_worker_connections': 1000, # gevent 每個工作行程的連線上限
+    'publisher_metrics_bind': None, # 輪詢行程提供 /metrics 的位址 (例如 '127.0.0.1:9100')，None 表示不提供
+    'metrics_dir': None,          # 多行程指標目錄 (serve.py 未設定時使用暫存目錄)，各行程寫入後由 /metrics 彙總
+    'metrics_flush_interval': 5,  # 各行程寫入指標檔的間隔秒數
+
+    # 快照快取後端: 'memory' (只在本行程) 或 'redis' (多台主機共用同一個輪詢主機的快照)
+    'cache_backend': 'memory',
+    'redis_url': 'redis://127.0.0.1:6379/0',  # cache_backend='redis' 時使用
+    'redis_prefix': 'tra:',       # 共用快取中所有鍵的前綴
+    'cache_max_entries': 256,     # 行程內快取最多保留的項目數 (LRU 淘汰)
+    'cache_ttl': None,            # 快取項目的預設有效秒數 (None 表示不過期)
+    'snapshot_cache_ttl': 600,    # 共用快取中快照的有效秒數
+    'response_cache_entries': 64, # app1.py 回應快取最多保留的回應數
+    'response_cache_ttl': None,   # app1.py 回應快取的有效秒數
+
+    # TDX 異常時的行為
+    'stale_after': 90,            # 快照超過多少秒標示為過時 (預設為 poll_interval 的 3 倍)
+    'snapshot_wait_timeout': 5,   # 還沒有快照時請求最多等待的秒數
+    'fetch_budget': 20,           # 一次輪詢取得所有分頁的時間預算 (秒，包含重試與退避的等待)
+    'breaker_failure_threshold': 3,  # 連續失敗幾次後暫停呼叫該端點
+    'breaker_base_backoff': 5,    # 第一次暫停的秒數 (之後每次加倍)
+    'breaker_max_backoff': 300,   # 暫停秒數上限
+    'breaker_probe_timeout': 60,  # 試探呼叫超過此秒數沒有結果時再放行一次試探
+
+    # 分頁設定 (以 $top / $skip 取得全部列車，api_url 中的 $top 會被覆寫)
+    'page_size': 500,         # 每頁筆數
+    'parallel_pages': 1,      # 同時預先取得的頁數 (1 表示依序取得)
+    'max_pages': 100,         # 分頁數上限 (避免無限迴圈)
+
+    # HTTP 連線池與逾時設定
+    'pool_size': 10,          # 每個主機保留的 Keep-Alive 連線數
+    'connect_timeout': 5,     # 連線逾時 (秒)
+    'read_timeout': 30,       # 讀取逾時 (秒)
+    'max_retries': 3,         # 連線錯誤或 429/5xx 時的最大重試次數
+    'retry_backoff': 0.5,     # 重試間隔的指數退避係數 (秒)
+
+    # 延遲圖表: 列車數超過此值時，自動模式只顯示延遲最嚴重的車次
+    'chart_max_bars': 100,
+
+    # JSON 編碼器: 'auto' (優先使用已安裝的 orjson / ujson)、'orjson'、'ujson'、'json'
+    'json_encoder': 'auto',
+    # JSON 解碼器: 'auto' (優先使用已安裝的 msgspec / orjson / ujson)、'msgspec'、'orjson'、'ujson'、'json'
+    'json_decoder': 'auto',
+    # 是否保留 TDX 回應的所有欄位 (False 時 msgspec 只解碼畫面使用的欄位，降低解析耗時與記憶體)
+    'parse_all_fields': False,
+
+    # 車站與車種名稱的語言: 'zh-tw' (中文) 或 'en' (英文)
+    'name_language': 'zh-tw',
+
+    # 記錄等級: 'DEBUG' (含每頁請求)、'INFO'、'WARNING'、'ERROR'
+    'log_level': 'INFO',
+
+    # 非同步客戶端 (async_tdx_service.py) 設定
+    'api_base_url': 'https://tdx.transportdata.tw/api/basic',
+    'async_max_concurrency': 8  # 同時進行中的請求上限
 }
@@ -0,0 +1,202 @@
+"""
+列車延遲分析模組
+以 NumPy / pandas 向量化計算延遲分級、百分位數與分組統計
+"""
+
+from collections import namedtuple
+import numpy as np
+import pandas as pd
+
+
+# 延遲分級定義 (upper 為該級距的延遲分鐘上限，None 表示無上限)
+DelayBucket = namedtuple(
+    'DelayBucket',
+    ['key', 'label', 'upper', 'color', 'background', 'text_color', 'css_class']
+)
+
+DELAY_BUCKETS = (
+    DelayBucket('on_time', '準點', 0, '#28a745', '#d4edda', '#155724', 'delay-0'),
+    DelayBucket('light', '輕微延遲', 5, '#ffc107', '#fff3cd', '#856404', 'delay-light'),
+    DelayBucket('medium', '中度延遲', 10, '#fd7e14', '#ffe5cc', '#cc5200', 'delay-medium'),
+    DelayBucket('severe', '嚴重延遲', None, '#dc3545', '#f8d7da', '#721c24', 'delay-severe'),
+)
+
+# 各級距的上限 (不含最後一級)
+_BUCKET_BOUNDS = np.array([bucket.upper for bucket in DELAY_BUCKETS[:-1]])
+_BUCKET_COLORS = np.array([bucket.color for bucket in DELAY_BUCKETS], dtype=object)
+
+PERCENTILES = (50, 90, 95, 99)
+
+
+def as_delays(delays):
+    """
+    將延遲資料轉換為整數陣列 (None 或非數值視為 0)
+
+    Args:
+        delays: 延遲分鐘數 (序列或陣列)
+
+    Returns:
+        np.ndarray: int64 陣列
+    """
+    try:
+        return np.asarray(delays, dtype=np.int64)
+    except (TypeError, ValueError):
+        series = pd.to_numeric(pd.Series(list(delays), dtype=object), errors='coerce')
+        return series.fillna(0).to_numpy(dtype=np.int64)
+
+
+def bucket_indices(delays):
+    """
+    計算每筆延遲所屬的級距索引
+
+    Args:
+        delays: 延遲分鐘數 (序列或陣列)
+
+    Returns:
+        np.ndarray: DELAY_BUCKETS 的索引
+    """
+    return np.searchsorted(_BUCKET_BOUNDS, as_delays(delays), side='left')
+
+
+def bucket_colors(delays):
+    """
+    計算每筆延遲對應的顏色
+
+    Args:
+        delays: 延遲分鐘數 (序列或陣列)
+
+    Returns:
+        list: 顏色字串列表
+    """
+    return _BUCKET_COLORS[bucket_indices(delays)].tolist()
+
+
+def get_bucket(delay):
+    """
+    取得單筆延遲所屬的級距
+
+    Args:
+        delay: 延遲分鐘數
+
+    Returns:
+        DelayBucket: 延遲級距
+    """
+    return DELAY_BUCKETS[int(bucket_indices([delay])[0])]
+
+
+def _describe(delays):
+    """計算一組延遲資料的統計值"""
+    count = len(delays)
+    if count == 0:
+        return {
+            'count': 0,
+            'mean': None,
+            'max': None,
+            'on_time_ratio': None,
+            'percentiles': {},
+            'buckets': {bucket.key: 0 for bucket in DELAY_BUCKETS},
+        }
+
+    counts = np.bincount(bucket_indices(delays), minlength=len(DELAY_BUCKETS))
+    values = np.percentile(delays, PERCENTILES)
+    return {
+        'count': int(count),
+        'mean': round(float(delays.mean()), 2),
+        'max': int(delays.max()),
+        'on_time_ratio': round(float(counts[0]) / count, 4),
+        'percentiles': {f"p{p}": float(v) for p, v in zip(PERCENTILES, values)},
+        'buckets': {bucket.key: int(n) for bucket, n in zip(DELAY_BUCKETS, counts)},
+    }
+
+
+def summarize(batch):
+    """
+    計算目前快照的整體延遲統計
+
+    Args:
+        batch: TrainBatch
+
+    Returns:
+        dict: count、mean、max、on_time_ratio、percentiles、buckets
+    """
+    return _describe(as_delays(batch.delay))
+
+
+def group_summary(batch, by='train_type'):
+    """
+    依列車類型或站名分組計算延遲統計
+
+    Args:
+        batch: TrainBatch
+        by: 'train_type' 或 'station'
+
+    Returns:
+        list: 各組的統計 (依平均延遲由大到小排序)
+    """
+    if by not in ('train_type', 'station'):
+        raise ValueError(f"不支援的分組欄位: {by}")
+
+    df = pd.DataFrame({
+        'group': batch.column(by),
+        'delay': as_delays(batch.delay),
+    })
+    if df.empty:
+        return []
+
+    df['on_time'] = df['delay'] <= 0
+    grouped = df.groupby('group', sort=False).agg(
+        count=('delay', 'size'),
+        mean=('delay', 'mean'),
+        median=('delay', 'median'),
+        max=('delay', 'max'),
+        on_time_ratio=('on_time', 'mean'),
+    ).sort_values('mean', ascending=False)
+
+    return [
+        {
+            'group': group,
+            'count': int(row['count']),
+            'mean': round(float(row['mean']), 2),
+            'median': float(row['median']),
+            'max': int(row['max']),
+            'on_time_ratio': round(float(row['on_time_ratio']), 4),
+        }
+        for group, row in grouped.iterrows()
+    ]
+
+
+def history_summary(history_df):
+    """
+    計算歷史資料 (HistoryStore 查詢結果) 的延遲統計
+
+    Args:
+        history_df: 含 delay 欄位的 DataFrame
+
+    Returns:
+        dict: 與 summarize() 相同格式的統計
+    """
+    return _describe(as_delays(history_df['delay']))
+
+
+def rolling_delay(history_df, window='30min'):
+    """
+    計算歷史資料的時間滾動平均延遲
+
+    Args:
+        history_df: 含 timestamp、delay 欄位的 DataFrame
+        window: pandas 時間窗格 (例如 '30min'、'1h')
+
+    Returns:
+        pd.DataFrame: timestamp、delay (該時間點平均)、rolling_mean 欄位
+    """
+    if history_df.empty:
+        return pd.DataFrame({'timestamp': [], 'delay': [], 'rolling_mean': []})
+
+    # 同一快照時間可能有多筆 (車站查詢)，先取平均
+    series = history_df.groupby('timestamp')['delay'].mean().sort_index()
+    rolling = series.rolling(window).mean()
+    return pd.DataFrame({
+        'timestamp': series.index,
+        'delay': series.to_numpy(),
+        'rolling_mean': rolling.to_numpy(),
+    })
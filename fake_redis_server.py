@@ -0,0 +1,146 @@
+"""
+本機 Redis 協定替身伺服器
+實作 RedisCache 需要的少數命令，供沒有 Redis 的環境測試多主機共用快照
+
+使用方式:
+    python fake_redis_server.py --port 6379
+"""
+
+import argparse
+import socketserver
+import threading
+from cache_backend import MemoryCache
+
+
+class _RedisHandler(socketserver.StreamRequestHandler):
+    """單一連線的命令處理"""
+
+    def handle(self):
+        while True:
+            try:
+                args = self._read_command()
+            except (ConnectionError, ValueError):
+                return
+            if args is None:
+                return
+            self.wfile.write(self.server.execute(args))
+
+    def _read_command(self):
+        """讀取一個 RESP 陣列命令"""
+        line = self.rfile.readline()
+        if not line:
+            return None
+        if not line.startswith(b'*'):
+            # inline 命令 (例如 telnet 輸入的 PING)
+            return line.strip().split()
+
+        args = []
+        for _ in range(int(line[1:-2])):
+            header = self.rfile.readline()
+            if not header.startswith(b'$'):
+                raise ValueError("格式錯誤")
+            length = int(header[1:-2])
+            args.append(self.rfile.read(length + 2)[:-2])
+        return args
+
+
+class FakeRedisServer(socketserver.ThreadingTCPServer):
+    """
+    Redis 替身伺服器 (GET / SET / DEL / PING / SELECT / AUTH / DBSIZE / FLUSHDB)
+
+    資料存放於 MemoryCache，SET 的 EX / PX 對應到 TTL，超過 max_entries 時以 LRU 淘汰。
+    """
+
+    allow_reuse_address = True
+    daemon_threads = True
+
+    def __init__(self, host='127.0.0.1', port=6379, max_entries=1024):
+        """
+        Args:
+            host: 監聽位址
+            port: 監聽埠號 (0 表示自動選擇)
+            max_entries: 最多保留的鍵數
+        """
+        super().__init__((host, port), _RedisHandler)
+        self.store = MemoryCache(max_entries=max_entries)
+
+    @property
+    def port(self):
+        return self.server_address[1]
+
+    def start(self):
+        """
+        在背景執行緒中啟動伺服器
+
+        Returns:
+            threading.Thread: 伺服器執行緒
+        """
+        thread = threading.Thread(target=self.serve_forever, name='fake-redis', daemon=True)
+        thread.start()
+        return thread
+
+    def execute(self, args):
+        """
+        執行命令並回傳 RESP 編碼的回應
+
+        Args:
+            args: 命令與參數 (bytes 列表)
+
+        Returns:
+            bytes: 回應
+        """
+        if not args:
+            return b'-ERR empty command\r\n'
+
+        command = args[0].upper()
+        if command == b'PING':
+            return b'+PONG\r\n'
+        if command in (b'SELECT', b'AUTH'):
+            return b'+OK\r\n'
+        if command == b'GET' and len(args) == 2:
+            value = self.store.get(args[1])
+            if value is None:
+                return b'$-1\r\n'
+            return b'$%d\r\n%s\r\n' % (len(value), value)
+        if command == b'SET' and len(args) in (3, 5):
+            ttl = None
+            if len(args) == 5:
+                unit = args[3].upper()
+                if unit not in (b'EX', b'PX'):
+                    return b'-ERR syntax error\r\n'
+                ttl = int(args[4]) / (1 if unit == b'EX' else 1000)
+            self.store.set(args[1], args[2], ttl)
+            return b'+OK\r\n'
+        if command == b'DEL' and len(args) >= 2:
+            deleted = 0
+            for key in args[1:]:
+                if self.store.get(key) is not None:
+                    self.store.delete(key)
+                    deleted += 1
+            return b':%d\r\n' % deleted
+        if command == b'DBSIZE':
+            return b':%d\r\n' % len(self.store)
+        if command == b'FLUSHDB':
+            self.store.clear()
+            return b'+OK\r\n'
+        return b'-ERR unknown command or wrong number of arguments\r\n'
+
+
+def main():
+    parser = argparse.ArgumentParser(description='本機 Redis 協定替身伺服器')
+    parser.add_argument('--host', default='127.0.0.1', help='監聽位址')
+    parser.add_argument('--port', type=int, default=6379, help='監聽埠號')
+    parser.add_argument('--max-entries', type=int, default=1024, help='最多保留的鍵數')
+    args = parser.parse_args()
+
+    server = FakeRedisServer(args.host, args.port, args.max_entries)
+    print(f"✓ Redis 替身伺服器已啟動: redis://{args.host}:{server.port}/0")
+    print("按 Ctrl+C 可停止服務")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,444 @@
+"""
+列車延遲歷史資料模組
+以每日分區、只附加 (append-only) 的欄位檔案保存每次輪詢的快照
+"""
+
+import os
+import threading
+from datetime import date, timedelta, timezone
+import numpy as np
+import pandas as pd
+
+
+# 欄位檔案名稱與資料型別
+COLUMN_DTYPES = {
+    'timestamp': np.int64,   # 快照時間 (本地時間換算的秒數)
+    'train': np.int32,       # 車次代碼
+    'train_type': np.int32,  # 列車類型代碼
+    'station': np.int32,     # 站名代碼
+    'delay': np.int16,       # 延遲分鐘數
+}
+
+# 字典檔 (代碼 -> 名稱，一行一個名稱)
+DICTIONARIES = ('train', 'train_type', 'station')
+
+INDEX_FILE = 'index.npz'
+
+# 已完整寫入所有欄位的列數 (每次附加後整體替換)
+ROWS_FILE = 'rows.txt'
+
+
+class DayPartition:
+    """
+    單日分區
+
+    每個欄位是一個原始二進位檔，讀取時以 np.memmap 對應，不需整個載入記憶體；
+    車次與站名的索引 (排序後的列位置) 會在資料列數改變時重新建立。
+    其他行程 (輪詢行程) 附加的字典內容會在字典檔變大時讀入。
+    所有欄位寫入後才更新列數檔，讀取端只讀到列數檔記錄的列；
+    寫入端開啟分區時會把各欄位截斷為列數檔的列數，修復附加途中中斷留下的多餘資料。
+    """
+
+    def __init__(self, directory, day, writer=False):
+        """
+        Args:
+            directory: 分區目錄
+            day: 分區日期
+            writer: 是否為寫入端 (開啟時修復欄位長度)
+        """
+        self.directory = directory
+        self.day = day
+        self.writer = False
+        if writer:
+            self.open_writer()
+        self._names = {name: [] for name in DICTIONARIES}
+        self._codes = {name: {} for name in DICTIONARIES}
+        # 已讀入的字典檔位元組數
+        self._dictionary_sizes = {name: 0 for name in DICTIONARIES}
+        self._reload_dictionaries()
+        self._index = None
+
+    def _column_path(self, name):
+        return os.path.join(self.directory, f"{name}.bin")
+
+    def _rows_path(self):
+        return os.path.join(self.directory, ROWS_FILE)
+
+    def _column_lengths(self):
+        """各欄位檔目前的列數 (檔案不存在時為 0)"""
+        lengths = {}
+        for name, dtype in COLUMN_DTYPES.items():
+            try:
+                size = os.path.getsize(self._column_path(name))
+            except FileNotFoundError:
+                size = 0
+            lengths[name] = size // np.dtype(dtype).itemsize
+        return lengths
+
+    def _write_rows(self, rows):
+        """以整體替換的方式記錄已完整寫入的列數"""
+        path = self._rows_path()
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            f.write(str(rows))
+        os.replace(tmp_path, path)
+
+    def open_writer(self):
+        """成為寫入端：修復欄位長度 (只在第一次呼叫時執行)"""
+        if not self.writer:
+            self.repair()
+            self.writer = True
+
+    def repair(self):
+        """
+        將各欄位截斷為已完整寫入的列數
+
+        沒有列數檔 (舊版分區) 時以最短的欄位為準，並補寫列數檔。
+
+        Returns:
+            int: 修復後的列數
+        """
+        lengths = self._column_lengths()
+        rows = min(lengths.values())
+        committed = self._read_rows()
+        if committed is not None:
+            rows = min(rows, committed)
+        for name, length in lengths.items():
+            if length > rows:
+                os.truncate(self._column_path(name), rows * np.dtype(COLUMN_DTYPES[name]).itemsize)
+        if committed != rows:
+            self._write_rows(rows)
+        return rows
+
+    def _read_rows(self):
+        """讀取列數檔，不存在時回傳 None"""
+        try:
+            with open(self._rows_path()) as f:
+                return int(f.read())
+        except FileNotFoundError:
+            return None
+
+    def _dictionary_path(self, name):
+        return os.path.join(self.directory, f"{name}.txt")
+
+    def _reload_dictionaries(self):
+        """讀入字典檔在上次讀取之後附加的名稱 (只讀取完整的行)"""
+        for name in DICTIONARIES:
+            path = self._dictionary_path(name)
+            loaded = self._dictionary_sizes[name]
+            try:
+                if os.path.getsize(path) <= loaded:
+                    continue
+                with open(path, 'rb') as f:
+                    f.seek(loaded)
+                    data = f.read()
+            except FileNotFoundError:
+                continue
+
+            end = data.rfind(b'\n') + 1
+            if not end:
+                continue
+            names = self._names[name]
+            codes = self._codes[name]
+            for line in data[:end].decode('utf-8').split('\n')[:-1]:
+                value = line.rstrip('\r')
+                codes.setdefault(value, len(names))
+                names.append(value)
+            self._dictionary_sizes[name] = loaded + end
+
+    def _encode(self, name, values):
+        """
+        將名稱轉換為代碼，新的名稱附加到字典檔
+
+        Args:
+            name: 字典名稱
+            values: 名稱列表
+
+        Returns:
+            np.ndarray: 代碼陣列
+        """
+        codes = self._codes[name]
+        names = self._names[name]
+        new_names = []
+        result = np.empty(len(values), dtype=COLUMN_DTYPES[name])
+        for i, value in enumerate(values):
+            value = str(value).replace('\n', ' ')
+            code = codes.get(value)
+            if code is None:
+                code = len(names)
+                codes[value] = code
+                names.append(value)
+                new_names.append(value)
+            result[i] = code
+
+        if new_names:
+            # 字典必須先於欄位資料寫入，讀取端才不會遇到未知代碼
+            with open(self._dictionary_path(name), 'ab') as f:
+                f.write(''.join(f"{value}\n" for value in new_names).encode('utf-8'))
+                self._dictionary_sizes[name] = f.tell()
+        return result
+
+    def append(self, batch, timestamp):
+        """
+        附加一批列車資料
+
+        Args:
+            batch: TrainBatch
+            timestamp: 快照時間 (本地時間換算的秒數)
+        """
+        count = len(batch)
+        columns = {
+            'timestamp': np.full(count, timestamp, dtype=COLUMN_DTYPES['timestamp']),
+            'train': self._encode('train', batch.train_no),
+            'train_type': self._encode('train_type', batch.train_type),
+            'station': self._encode('station', batch.station),
+            'delay': np.asarray(
+                [delay if isinstance(delay, int) else 0 for delay in batch.delay],
+                dtype=COLUMN_DTYPES['delay']
+            ),
+        }
+        rows = len(self)
+        try:
+            for name, values in columns.items():
+                with open(self._column_path(name), 'ab') as f:
+                    f.write(values.tobytes())
+        except OSError:
+            # 部分欄位已寫入：截斷回附加前的列數，下一次附加時各欄位長度仍一致
+            self.repair()
+            raise
+        self._write_rows(rows + count)
+
+    def __len__(self):
+        rows = self._read_rows()
+        if rows is None:
+            # 舊版分區沒有列數檔，以最短的欄位為準
+            return min(self._column_lengths().values())
+        return rows
+
+    def column(self, name, rows=None):
+        """
+        以 memmap 讀取欄位
+
+        Args:
+            name: 欄位名稱
+            rows: 總列數 (預設為目前的列數)
+
+        Returns:
+            np.ndarray: 欄位資料 (唯讀)
+        """
+        rows = len(self) if rows is None else rows
+        if rows == 0:
+            return np.empty(0, dtype=COLUMN_DTYPES[name])
+        return np.memmap(self._column_path(name), dtype=COLUMN_DTYPES[name], mode='r', shape=(rows,))
+
+    def names(self, name):
+        """取得字典的名稱列表"""
+        self._reload_dictionaries()
+        return list(self._names[name])
+
+    def code(self, name, value):
+        """
+        取得名稱對應的代碼
+
+        Returns:
+            int: 代碼，不存在時回傳 None
+        """
+        self._reload_dictionaries()
+        return self._codes[name].get(value)
+
+    def index(self):
+        """
+        取得車次與站名索引，資料列數改變時重新建立
+
+        Returns:
+            dict: rows (建立時的列數)，以及 train / station 的 (排序後列位置, 各代碼起點)
+        """
+        rows = len(self)
+        if self._index is not None and self._index['rows'] == rows:
+            return self._index
+        # 字典先於欄位寫入，讀取列數之後再讀入字典，才能涵蓋這些列的所有代碼
+        self._reload_dictionaries()
+
+        index = self._load_index(rows)
+        if index is None:
+            index = {'rows': rows}
+            for name in ('train', 'station'):
+                codes = self.column(name, rows)
+                order = np.argsort(codes, kind='stable').astype(np.int64)
+                offsets = np.searchsorted(codes[order], np.arange(len(self._names[name]) + 1))
+                index[name] = (order, offsets)
+            if self.day < date.today():
+                # 過去的分區不會再寫入，索引存檔後可直接重用
+                self._save_index(index)
+
+        self._index = index
+        return index
+
+    def _load_index(self, rows):
+        path = os.path.join(self.directory, INDEX_FILE)
+        try:
+            with np.load(path) as data:
+                if int(data['rows']) != rows:
+                    return None
+                return {
+                    'rows': rows,
+                    'train': (data['train_order'], data['train_offsets']),
+                    'station': (data['station_order'], data['station_offsets']),
+                }
+        except (OSError, KeyError, ValueError):
+            return None
+
+    def _save_index(self, index):
+        path = os.path.join(self.directory, INDEX_FILE)
+        tmp_path = path + '.tmp.npz'
+        np.savez(
+            tmp_path,
+            rows=np.int64(index['rows']),
+            train_order=index['train'][0],
+            train_offsets=index['train'][1],
+            station_order=index['station'][0],
+            station_offsets=index['station'][1],
+        )
+        os.replace(tmp_path, path)
+
+    def lookup(self, name, value):
+        """
+        以索引找出符合車次或站名的列位置
+
+        Args:
+            name: 'train' 或 'station'
+            value: 車次或站名
+
+        Returns:
+            np.ndarray: 依時間排序的列位置
+        """
+        code = self.code(name, value)
+        if code is None:
+            return np.empty(0, dtype=np.int64)
+
+        index = self.index()
+        order, offsets = index[name]
+        if code + 1 >= len(offsets):
+            return np.empty(0, dtype=np.int64)
+        return order[offsets[code]:offsets[code + 1]]
+
+
+class HistoryStore:
+    """
+    列車延遲歷史資料庫
+
+    目錄結構：<root>/<YYYY-MM-DD>/<欄位>.bin，以及各字典檔與索引檔。
+    """
+
+    def __init__(self, root):
+        """
+        Args:
+            root: 資料根目錄
+        """
+        self.root = os.path.abspath(root)
+        os.makedirs(self.root, exist_ok=True)
+        self._partitions = {}
+        self._lock = threading.Lock()
+
+    def _partition(self, day, create=False):
+        """取得單日分區，不存在時回傳 None (create=True 時建立)"""
+        key = day.isoformat()
+        partition = self._partitions.get(key)
+        if partition is not None:
+            if create:
+                # 先前只供查詢而開啟的分區，第一次寫入前修復欄位長度
+                partition.open_writer()
+            return partition
+
+        directory = os.path.join(self.root, key)
+        if not os.path.isdir(directory):
+            if not create:
+                return None
+            os.makedirs(directory, exist_ok=True)
+
+        # 本行程會寫入的分區 (create=True) 開啟時修復欄位長度
+        partition = DayPartition(directory, day, writer=create)
+        self._partitions[key] = partition
+        return partition
+
+    def append(self, batch, fetched_at):
+        """
+        附加一次快照
+
+        Args:
+            batch: TrainBatch
+            fetched_at: 快照時間 (datetime)
+        """
+        if not len(batch):
+            return
+        with self._lock:
+            partition = self._partition(fetched_at.date(), create=True)
+            # 以本地時間的時刻換算秒數，讀回時不需處理時區
+            partition.append(batch, int(fetched_at.replace(tzinfo=timezone.utc).timestamp()))
+
+    def on_snapshot(self, snapshot, previous_tag):
+        """供 TrainDataPoller.add_listener 使用的通知函式"""
+        self.append(snapshot.batch, snapshot.fetched_at)
+
+    def _days(self, start, end):
+        """列出日期範圍內的每一天 (含頭尾)"""
+        end = end or date.today()
+        start = start or end
+        day = start
+        while day <= end:
+            yield day
+            day += timedelta(days=1)
+
+    def _query(self, name, value, start, end, columns):
+        frames = []
+        for day in self._days(start, end):
+            with self._lock:
+                partition = self._partition(day)
+                if partition is None:
+                    continue
+                rows = partition.lookup(name, value)
+                if not len(rows):
+                    continue
+                frame = {}
+                for column in columns:
+                    data = np.asarray(partition.column(column, partition.index()['rows'])[rows])
+                    if column in DICTIONARIES:
+                        names = np.asarray(partition.names(column), dtype=object)
+                        data = names[data]
+                    frame[column] = data
+            frames.append(pd.DataFrame(frame))
+
+        if not frames:
+            return pd.DataFrame({column: [] for column in columns})
+
+        df = pd.concat(frames, ignore_index=True)
+        df['timestamp'] = pd.to_datetime(df['timestamp'], unit='s')
+        return df
+
+    def train_history(self, train_no, start=None, end=None):
+        """
+        查詢單一車次的延遲軌跡
+
+        Args:
+            train_no: 車次
+            start: 起始日期 (預設與 end 相同)
+            end: 結束日期 (預設為今天)
+
+        Returns:
+            pd.DataFrame: timestamp、station、train_type、delay 欄位
+        """
+        return self._query('train', train_no, start, end, ('timestamp', 'station', 'train_type', 'delay'))
+
+    def station_history(self, station, start=None, end=None):
+        """
+        查詢單一車站的延遲紀錄
+
+        Args:
+            station: 站名
+            start: 起始日期 (預設與 end 相同)
+            end: 結束日期 (預設為今天)
+
+        Returns:
+            pd.DataFrame: timestamp、train、train_type、delay 欄位
+        """
+        return self._query('station', station, start, end, ('timestamp', 'train', 'train_type', 'delay'))
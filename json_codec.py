@@ -0,0 +1,217 @@
+"""
+JSON 編碼 / 解碼模組
+依設定選用 orjson / ujson / 標準 json，統一輸出 UTF-8 位元組；
+解析 TDX 回應時可只保留需要的欄位 (安裝 msgspec 時依欄位定義解碼)
+"""
+
+import json
+import re
+from typing import Any, List, TypedDict
+from config import CONFIG
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import ujson
+except ImportError:
+    ujson = None
+
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+
+
+def _dumps_orjson(obj):
+    return orjson.dumps(obj)
+
+
+def _dumps_ujson(obj):
+    return ujson.dumps(obj, ensure_ascii=False).encode('utf-8')
+
+
+def _dumps_json(obj):
+    return json.dumps(obj, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+def get_encoder(name=None):
+    """
+    取得 JSON 編碼函式
+
+    Args:
+        name: 'orjson'、'ujson'、'json' 或 'auto' (依序選用已安裝的最快編碼器)，
+              預設為 CONFIG['json_encoder']
+
+    Returns:
+        callable: 將物件編碼為 UTF-8 位元組的函式
+    """
+    name = name or CONFIG.get('json_encoder', 'auto')
+
+    if name == 'auto':
+        if orjson is not None:
+            return _dumps_orjson
+        if ujson is not None:
+            return _dumps_ujson
+        return _dumps_json
+
+    if name == 'orjson':
+        if orjson is None:
+            raise ImportError("未安裝 orjson，請執行 pip install orjson")
+        return _dumps_orjson
+    if name == 'ujson':
+        if ujson is None:
+            raise ImportError("未安裝 ujson，請執行 pip install ujson")
+        return _dumps_ujson
+    if name == 'json':
+        return _dumps_json
+
+    raise ValueError(f"不支援的 JSON 編碼器: {name}")
+
+
+# 依設定選用的編碼函式
+dumps = get_encoder()
+
+
+def get_decoder(name=None):
+    """
+    取得 JSON 解碼函式
+
+    Args:
+        name: 'orjson'、'msgspec'、'ujson'、'json' 或 'auto' (依序選用已安裝的最快解碼器)，
+              預設為 CONFIG['json_decoder']
+
+    Returns:
+        callable: 將 UTF-8 位元組或字串解碼為物件的函式
+    """
+    name = _resolve_decoder(name or CONFIG.get('json_decoder', 'auto'))
+    if name == 'orjson':
+        return orjson.loads
+    if name == 'msgspec':
+        return msgspec.json.decode
+    if name == 'ujson':
+        return ujson.loads
+    return json.loads
+
+
+def _resolve_decoder(name, prefer_typed=False):
+    """
+    將解碼器名稱轉換為已安裝的實作
+
+    Args:
+        name: 解碼器名稱
+        prefer_typed: 'auto' 時是否優先使用 msgspec (有欄位定義時較快)
+
+    Returns:
+        str: 'orjson'、'msgspec'、'ujson' 或 'json'
+    """
+    modules = {'orjson': orjson, 'msgspec': msgspec, 'ujson': ujson}
+
+    if name == 'auto':
+        order = ('msgspec', 'orjson', 'ujson') if prefer_typed else ('orjson', 'msgspec', 'ujson')
+        for candidate in order:
+            if modules[candidate] is not None:
+                return candidate
+        return 'json'
+
+    if name in modules:
+        if modules[name] is None:
+            raise ImportError(f"未安裝 {name}，請執行 pip install {name}")
+        return name
+    if name == 'json':
+        return name
+
+    raise ValueError(f"不支援的 JSON 解碼器: {name}")
+
+
+# 依設定選用的解碼函式
+loads = get_decoder()
+
+
+# 回應開頭的 UpdateTime (只在列表欄位之前搜尋，避免誤取列表元素中的 UpdateTime)
+_UPDATE_TIME = re.compile(rb'"UpdateTime"\s*:\s*"([^"\\]*)"')
+
+# 列車即時動態中實際使用的欄位 (使用 msgspec 時其餘欄位在解析時略過)
+LIVE_BOARD_FIELDS = (
+    'TrainNo', 'TrainTypeID', 'TrainTypeName',
+    'StationID', 'StationName', 'DelayTime', 'UpdateTime'
+)
+
+
+class ListResponseDecoder:
+    """
+    TDX 列表回應解碼器 (例如 {"UpdateTime": ..., "TrainLiveBoards": [...]})
+
+    安裝 msgspec 時 ('auto' 優先使用) 依 fields 定義解碼，未定義的欄位在解析時直接略過，
+    不建立 Python 物件，解析耗時與記憶體都較低；其他解碼器完整解碼 (解碼後再精簡反而增加耗時)，
+    因此呼叫端只能依賴 fields 中的欄位。
+    """
+
+    def __init__(self, list_key, fields=None, name=None):
+        """
+        Args:
+            list_key: 列表欄位名稱
+            fields: 列表元素需要的欄位 (None 表示保留全部欄位)
+            name: 'msgspec'、'orjson'、'ujson'、'json' 或 'auto'，預設為 CONFIG['json_decoder']
+        """
+        self.list_key = list_key
+        self._list_key_token = f'"{list_key}"'.encode('utf-8')
+        self.fields = tuple(fields) if fields is not None else None
+        self.name = _resolve_decoder(
+            name or CONFIG.get('json_decoder', 'auto'),
+            prefer_typed=self.fields is not None
+        )
+
+        if self.name == 'msgspec':
+            item_type = Any
+            if self.fields is not None:
+                item_type = TypedDict('Item', {field: Any for field in self.fields}, total=False)
+            page_type = TypedDict('Page', {'UpdateTime': Any, list_key: List[item_type]}, total=False)
+            self._decode = self._typed_decoder(page_type)
+        else:
+            self._loads = get_decoder(self.name)
+            self._decode = self._decode_full
+
+    def _typed_decoder(self, page_type):
+        decoder = msgspec.json.Decoder(page_type)
+
+        def decode(body):
+            data = decoder.decode(body)
+            return data.get('UpdateTime'), data.get(self.list_key) or []
+        return decode
+
+    def _decode_full(self, body):
+        data = self._loads(body)
+        return data.get('UpdateTime'), data.get(self.list_key) or []
+
+    def peek_update_time(self, body, limit=1024):
+        """
+        只掃描回應開頭取得 UpdateTime，不解析整份回應
+
+        Args:
+            body: 回應內容 (UTF-8 位元組)
+            limit: 最多掃描的位元組數
+
+        Returns:
+            str: UpdateTime，列表之前沒有 UpdateTime 時為 None
+        """
+        head = bytes(body[:limit])
+        end = head.find(self._list_key_token)
+        if end < 0:
+            return None
+        match = _UPDATE_TIME.search(head, 0, end)
+        return match.group(1).decode('utf-8') if match else None
+
+    def decode(self, body):
+        """
+        解碼回應內容
+
+        Args:
+            body: 回應內容 (UTF-8 位元組或字串)
+
+        Returns:
+            tuple: (UpdateTime, 列表元素)
+        """
+        return self._decode(body)
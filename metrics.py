@@ -0,0 +1,610 @@
+"""
+監控指標模組
+提供 Counter / Gauge / Histogram 與 Prometheus 文字格式輸出 (/metrics)，以及記錄等級設定
+
+多行程模式 (serve.py 以 gunicorn 啟動時) 各行程定期把指標寫入共用目錄的 <pid>-<啟動時間>.json，
+任一行程的 /metrics 彙總所有行程的檔案。
+"""
+
+import atexit
+import bisect
+import functools
+import glob
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from flask import Blueprint, Response
+from config import CONFIG
+
+
+# Prometheus 文字格式的 Content-Type
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# 預設的耗時分桶 (秒)
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+logger = logging.getLogger(__name__)
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+class _Metric:
+    """指標的共用部分 (名稱、說明、標籤)"""
+
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        """
+        Args:
+            name: 指標名稱
+            documentation: 說明
+            labelnames: 標籤名稱
+        """
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children = {}
+        self._lock = threading.Lock()
+
+    def labels(self, *values, **kwargs):
+        """
+        取得指定標籤值的子指標
+
+        Returns:
+            同類型的子指標
+        """
+        if kwargs:
+            values = tuple(kwargs[name] for name in self.labelnames)
+        if len(values) != len(self.labelnames):
+            raise ValueError(f"{self.name} 需要標籤: {', '.join(self.labelnames)}")
+
+        values = tuple(str(value) for value in values)
+        with self._lock:
+            child = self._children.get(values)
+            if child is None:
+                child = self._new_child()
+                self._children[values] = child
+            return child
+
+    def _default(self):
+        """沒有標籤的指標直接使用唯一的子指標"""
+        if self.labelnames:
+            raise ValueError(f"{self.name} 需要先以 labels() 指定標籤")
+        return self.labels()
+
+    def _items(self):
+        with self._lock:
+            return list(self._children.items())
+
+    def render(self):
+        """
+        輸出 Prometheus 文字格式
+
+        Returns:
+            list: 文字行
+        """
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for values, child in self._items():
+            lines.extend(self._render_child(values, child))
+        return lines
+
+    def dump(self):
+        """
+        取得目前的數值 (寫入多行程目錄用)
+
+        Returns:
+            dict: kind、documentation、labelnames、samples ([標籤值, 數值] 列表)
+        """
+        return {
+            'kind': self.kind,
+            'documentation': self.documentation,
+            'labelnames': list(self.labelnames),
+            'samples': [[list(values), self._dump_child(child)] for values, child in self._items()],
+        }
+
+    def _dump_child(self, child):
+        return child.value
+
+
+class _Value:
+    """單一數值 (Counter / Gauge 的子指標)"""
+
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+    def dec(self, amount=1):
+        with self._lock:
+            self.value -= amount
+
+    def set(self, value):
+        self.value = float(value)
+
+
+class Counter(_Metric):
+    """只會增加的計數"""
+
+    kind = 'counter'
+
+    def _new_child(self):
+        return _Value()
+
+    def inc(self, amount=1):
+        """
+        增加計數
+
+        Args:
+            amount: 增加量
+        """
+        self._default().inc(amount)
+
+    def _render_child(self, values, child):
+        return [f"{self.name}{_format_labels(self.labelnames, values)} {_format_value(child.value)}"]
+
+
+class Gauge(_Metric):
+    """
+    可增可減的數值
+
+    也可傳入 func，在輸出時才呼叫取得目前的值 (例如快照的資料時間)。
+    """
+
+    kind = 'gauge'
+
+    def __init__(self, name, documentation, labelnames=(), func=None):
+        """
+        Args:
+            name: 指標名稱
+            documentation: 說明
+            labelnames: 標籤名稱
+            func: 輸出時呼叫的函式，回傳數值 (沒有標籤時) 或 {標籤值 tuple: 數值} (有標籤時)
+        """
+        super().__init__(name, documentation, labelnames)
+        self.func = func
+
+    def _new_child(self):
+        return _Value()
+
+    def set(self, value):
+        """
+        設定數值
+
+        Args:
+            value: 數值
+        """
+        self._default().set(value)
+
+    def inc(self, amount=1):
+        self._default().inc(amount)
+
+    def dec(self, amount=1):
+        self._default().dec(amount)
+
+    def _items(self):
+        if self.func is None:
+            return super()._items()
+
+        try:
+            value = self.func()
+        except Exception:
+            logger.exception("無法取得指標 %s", self.name)
+            return []
+        if value is None:
+            return []
+        if not self.labelnames:
+            child = _Value()
+            child.set(value)
+            return [((), child)]
+
+        items = []
+        for values, child_value in value.items():
+            child = _Value()
+            child.set(child_value)
+            items.append((tuple(str(v) for v in values), child))
+        return items
+
+    def _render_child(self, values, child):
+        return [f"{self.name}{_format_labels(self.labelnames, values)} {_format_value(child.value)}"]
+
+
+class _HistogramValue:
+    """單一直方圖 (各分桶的累計數、總和與次數)"""
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            if index < len(self.counts):
+                self.counts[index] += 1
+            self.sum += value
+            self.count += 1
+
+    def time(self):
+        return _Timer(self.observe)
+
+
+class _Timer:
+    """以 with 陳述式記錄區塊的耗時，也可作為函式的裝飾器"""
+
+    def __init__(self, observe):
+        self._observe = observe
+        self._started = None
+
+    def __enter__(self):
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._observe(time.perf_counter() - self._started)
+
+    def __call__(self, func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            # 每次呼叫使用新的計時器，可同時在多個執行緒中執行
+            with _Timer(self._observe):
+                return func(*args, **kwargs)
+        return wrapper
+
+
+class Histogram(_Metric):
+    """耗時等數值的分布"""
+
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        """
+        Args:
+            name: 指標名稱
+            documentation: 說明
+            labelnames: 標籤名稱
+            buckets: 分桶上限 (遞增)
+        """
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def _new_child(self):
+        return _HistogramValue(self.buckets)
+
+    def observe(self, value):
+        """
+        記錄一個數值
+
+        Args:
+            value: 數值 (耗時以秒為單位)
+        """
+        self._default().observe(value)
+
+    def time(self):
+        """
+        記錄區塊的耗時
+
+        Returns:
+            context manager: with histogram.time(): ... (也可作為 @histogram.time() 裝飾器)
+        """
+        return self._default().time()
+
+    def _render_child(self, values, child):
+        with child._lock:
+            counts = list(child.counts)
+            total, count = child.sum, child.count
+
+        lines = []
+        cumulative = 0
+        for bound, bucket_count in zip(self.buckets, counts):
+            cumulative += bucket_count
+            labels = _format_labels(self.labelnames, values, [('le', _format_value(float(bound)))])
+            lines.append(f"{self.name}_bucket{labels} {cumulative}")
+        labels = _format_labels(self.labelnames, values, [('le', '+Inf')])
+        lines.append(f"{self.name}_bucket{labels} {count}")
+        lines.append(f"{self.name}_sum{_format_labels(self.labelnames, values)} {_format_value(total)}")
+        lines.append(f"{self.name}_count{_format_labels(self.labelnames, values)} {count}")
+        return lines
+
+    def dump(self):
+        data = super().dump()
+        data['buckets'] = list(self.buckets)
+        return data
+
+    def _dump_child(self, child):
+        with child._lock:
+            return {'counts': list(child.counts), 'sum': child.sum, 'count': child.count}
+
+    def merge(self, values, sample):
+        """
+        累加其他行程的直方圖
+
+        Args:
+            values: 標籤值
+            sample: dump() 的數值 (counts、sum、count)
+        """
+        child = self.labels(*values)
+        with child._lock:
+            for i, bucket_count in enumerate(sample['counts'][:len(child.counts)]):
+                child.counts[i] += bucket_count
+            child.sum += sample['sum']
+            child.count += sample['count']
+
+
+class MetricsRegistry:
+    """指標登錄表 (同一名稱只建立一次)"""
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _register(self, cls, name, *args, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = cls(name, *args, **kwargs)
+                self._metrics[name] = metric
+            elif not isinstance(metric, cls):
+                raise ValueError(f"指標 {name} 已登錄為 {metric.kind}")
+            return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        """建立或取得 Counter"""
+        return self._register(Counter, name, documentation, labelnames)
+
+    def gauge(self, name, documentation, labelnames=(), func=None):
+        """建立或取得 Gauge"""
+        return self._register(Gauge, name, documentation, labelnames, func)
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        """建立或取得 Histogram"""
+        return self._register(Histogram, name, documentation, labelnames, buckets)
+
+    def render(self):
+        """
+        輸出所有指標的 Prometheus 文字格式
+
+        Returns:
+            str: 指標內容
+        """
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+    def dump(self):
+        """
+        取得所有指標目前的數值
+
+        Returns:
+            dict: 指標名稱 -> Metric.dump() 的內容
+        """
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return {metric.name: metric.dump() for metric in metrics}
+
+
+# 全域登錄表
+registry = MetricsRegistry()
+counter = registry.counter
+gauge = registry.gauge
+histogram = registry.histogram
+
+
+def metrics_dir():
+    """
+    取得多行程指標目錄
+
+    serve.py 會在建立工作行程前設定 TRA_METRICS_DIR，因此每次呼叫時才讀取。
+
+    Returns:
+        str: 目錄路徑，None 表示單一行程模式
+    """
+    return os.environ.get('TRA_METRICS_DIR') or CONFIG.get('metrics_dir')
+
+
+def reset_metrics_dir(directory):
+    """
+    建立多行程指標目錄並刪除上次執行留下的檔案 (啟動時由主行程呼叫)
+
+    Args:
+        directory: 目錄路徑
+    """
+    os.makedirs(directory, exist_ok=True)
+    for path in glob.glob(os.path.join(directory, '*.json')) + glob.glob(os.path.join(directory, '.tmp-*')):
+        os.remove(path)
+
+
+# 本行程的指標檔名 (pid 與啟動時間；fork 後的子行程會重新產生)
+_process_file = {'pid': None, 'name': None}
+
+
+def _process_file_name():
+    pid = os.getpid()
+    if _process_file['pid'] != pid:
+        # 加上啟動時間，新行程沿用已結束行程的 pid 時不會覆寫其計數
+        _process_file['name'] = f"{pid}-{time.time_ns() // 1_000_000}.json"
+        _process_file['pid'] = pid
+    return _process_file['name']
+
+
+def write_process_metrics(directory=None):
+    """
+    將本行程的指標寫入多行程目錄 (<pid>-<啟動時間>.json)
+
+    背景執行緒與 /metrics 可能同時寫入，每次寫入各自的暫存檔後再整體替換。
+
+    Args:
+        directory: 目錄路徑，預設為 metrics_dir()
+    """
+    directory = directory or metrics_dir()
+    path = os.path.join(directory, _process_file_name())
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.tmp-')
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(registry.dump(), f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def _process_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def collect_process_metrics(directory=None):
+    """
+    彙總多行程目錄中所有行程的指標
+
+    Counter 與 Histogram 加總所有行程 (包含已結束的行程，總數不會因工作行程重啟而減少)；
+    Gauge 只保留仍在執行的行程，並加上 pid 標籤區分。
+
+    Args:
+        directory: 目錄路徑，預設為 metrics_dir()
+
+    Returns:
+        MetricsRegistry: 彙總後的登錄表
+    """
+    directory = directory or metrics_dir()
+    merged = MetricsRegistry()
+    for path in sorted(glob.glob(os.path.join(directory, '*.json'))):
+        pid = os.path.basename(path).split('-', 1)[0]
+        try:
+            with open(path, encoding='utf-8') as f:
+                metrics = json.load(f)
+        except (OSError, ValueError):
+            # 檔案在讀取途中被刪除或內容不完整時略過
+            continue
+        alive = pid.isdigit() and _process_alive(int(pid))
+
+        for name, data in metrics.items():
+            labelnames = data['labelnames']
+            try:
+                if data['kind'] == 'counter':
+                    metric = merged.counter(name, data['documentation'], labelnames)
+                    for values, value in data['samples']:
+                        metric.labels(*values).inc(value)
+                elif data['kind'] == 'histogram':
+                    metric = merged.histogram(name, data['documentation'], labelnames, data['buckets'])
+                    for values, sample in data['samples']:
+                        metric.merge(values, sample)
+                elif data['kind'] == 'gauge' and alive:
+                    metric = merged.gauge(name, data['documentation'], labelnames + ['pid'])
+                    for values, value in data['samples']:
+                        metric.labels(*values, pid).set(value)
+            except ValueError:
+                logger.warning("略過無法合併的指標 %s (%s)", name, path)
+    return merged
+
+
+# 已啟動寫入執行緒的行程
+_writer = {'pid': None}
+
+
+def start_process_writer(interval=None):
+    """
+    在背景執行緒定期寫入本行程的指標 (只在設定多行程目錄時啟動，每個行程一次)
+
+    Args:
+        interval: 寫入間隔秒數，預設為 CONFIG['metrics_flush_interval'] (5 秒)
+    """
+    directory = metrics_dir()
+    if not directory or _writer['pid'] == os.getpid():
+        return
+    _writer['pid'] = os.getpid()
+    interval = interval or CONFIG.get('metrics_flush_interval', 5)
+
+    def run():
+        while True:
+            time.sleep(interval)
+            try:
+                write_process_metrics(directory)
+            except OSError:
+                logger.exception("無法寫入指標檔")
+
+    threading.Thread(target=run, name='metrics-writer', daemon=True).start()
+    # 行程結束前再寫入一次，最後一段時間的計數不會遺失
+    atexit.register(_write_at_exit, directory)
+
+
+def _write_at_exit(directory):
+    if _writer['pid'] != os.getpid():
+        return
+    try:
+        write_process_metrics(directory)
+    except OSError:
+        pass
+
+
+start_process_writer()
+if hasattr(os, 'register_at_fork'):
+    # gunicorn 以 fork 建立工作行程，背景執行緒不會被複製，需在子行程重新啟動
+    os.register_at_fork(after_in_child=start_process_writer)
+
+
+# /metrics 端點 (兩個版本共用)
+metrics_api = Blueprint('metrics_api', __name__)
+
+
+@metrics_api.route('/metrics')
+def metrics_endpoint():
+    """Prometheus 指標 (多行程模式時彙總所有行程)"""
+    directory = metrics_dir()
+    if directory:
+        try:
+            write_process_metrics(directory)
+        except OSError:
+            # 寫入失敗時仍輸出其他行程與本行程上次寫入的數值
+            logger.exception("無法寫入指標檔")
+        body = collect_process_metrics(directory).render()
+    else:
+        body = registry.render()
+    return Response(body, mimetype=None, content_type=CONTENT_TYPE)
+
+
+def configure_logging(level=None):
+    """
+    設定記錄格式與等級 (應用程式啟動時呼叫一次)
+
+    Args:
+        level: 記錄等級名稱，預設為 CONFIG['log_level'] (INFO)
+    """
+    level = (level or CONFIG.get('log_level', 'INFO')).upper()
+    logging.basicConfig(
+        level=level,
+        format='%(asctime)s %(levelname)s [%(name)s] %(message)s'
+    )
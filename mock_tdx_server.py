@@ -0,0 +1,722 @@
+"""
+本機 TDX 替身伺服器
+提供 OAuth Token 端點與台鐵 (TRA) API 端點，回放錄製的回應或產生模擬資料，
+可設定延遲、錯誤率與列車數量，供沒有 TDX 憑證或網路的環境開發與壓力測試
+
+使用方式:
+    python mock_tdx_server.py serve --port 8090 --trains 1000 --latency 0.2 --error-rate 0.05
+    python mock_tdx_server.py serve --port 8090 --replay replays/tra.json
+    python mock_tdx_server.py record --output replays/tra.json --frames 10 --interval 30
+"""
+
+import argparse
+import json
+import os
+import random
+import re
+import secrets
+import threading
+import time
+from datetime import date, datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlencode, urlsplit
+
+
+AUTH_PATH = '/auth/realms/TDXConnect/protocol/openid-connect/token'
+API_PREFIX = '/api/basic'
+
+TRAIN_LIVE_BOARD_PATH = '/v3/Rail/TRA/TrainLiveBoard'
+STATION_PATH = '/v3/Rail/TRA/Station'
+STATION_LIVE_BOARD_PATTERN = re.compile(r'^/v3/Rail/TRA/StationLiveBoard/Station/(\w+)$')
+DAILY_TIMETABLE_PATTERN = re.compile(r'^/v3/Rail/TRA/DailyTrainTimetable/TrainDate/([\d-]+)$')
+
+# 回放檔格式版本
+REPLAY_FORMAT = 'tdx-replay-1'
+
+# 回應中列表所在的欄位 (分頁時只切割這個欄位)
+LIST_KEYS = ('TrainLiveBoards', 'StationLiveBoards', 'Stations', 'TrainTimetables')
+
+TAIPEI = timezone(timedelta(hours=8))
+
+# 模擬資料使用的車種與車站 (車站代碼, 中文名稱, 英文名稱)
+TRAIN_TYPES = (
+    ('1131', '區間車', 'Local Train'),
+    ('1132', '區間快', 'Fast Local Train'),
+    ('1100', '自強', 'Tze-Chiang Limited Express'),
+    ('1107', '普悠瑪', 'Puyuma Express'),
+    ('1108', '太魯閣', 'Taroko Express'),
+    ('1110', '莒光', 'Chu-Kuang Express'),
+)
+STATIONS = (
+    ('0900', '基隆', 'Keelung'),
+    ('0990', '松山', 'Songshan'),
+    ('1000', '臺北', 'Taipei'),
+    ('1020', '板橋', 'Banqiao'),
+    ('1080', '桃園', 'Taoyuan'),
+    ('1100', '中壢', 'Zhongli'),
+    ('1210', '新竹', 'Hsinchu'),
+    ('3160', '苗栗', 'Miaoli'),
+    ('3300', '臺中', 'Taichung'),
+    ('3360', '彰化', 'Changhua'),
+    ('4080', '嘉義', 'Chiayi'),
+    ('4220', '臺南', 'Tainan'),
+    ('4400', '高雄', 'Kaohsiung'),
+    ('5000', '屏東', 'Pingtung'),
+    ('6000', '臺東', 'Taitung'),
+    ('7000', '花蓮', 'Hualien'),
+    ('7190', '宜蘭', 'Yilan'),
+)
+
+
+def _now_text():
+    """TDX 格式的現在時間 (ISO 8601，含 +08:00 時區)"""
+    return datetime.now(TAIPEI).replace(microsecond=0).isoformat()
+
+
+class SyntheticNetwork:
+    """
+    模擬的台鐵路網資料
+
+    每經過 update_interval 秒產生新一代的資料 (延遲時間與所在車站改變)，
+    同一代的資料只產生一次，所有分頁共用。
+    """
+
+    def __init__(self, train_count=300, update_interval=30, seed=0):
+        """
+        Args:
+            train_count: 列車數量
+            update_interval: 資料更新週期 (秒)
+            seed: 亂數種子 (相同種子產生相同資料)
+        """
+        self.train_count = train_count
+        self.update_interval = update_interval
+        self.seed = seed
+        self._started = time.monotonic()
+        self._generation = None
+        self._boards = None
+        self._update_time = None
+        self._lock = threading.Lock()
+
+    def resize(self, train_count):
+        """
+        變更列車數量 (下一個請求產生新的資料)
+
+        Args:
+            train_count: 列車數量
+        """
+        with self._lock:
+            self.train_count = train_count
+            self._generation = None
+
+    def generation(self):
+        """目前的資料世代"""
+        if not self.update_interval:
+            return 0
+        return int((time.monotonic() - self._started) / self.update_interval)
+
+    def train_live_boards(self):
+        """
+        取得目前世代的列車即時動態
+
+        Returns:
+            tuple: (世代, UpdateTime, 列車動態列表)
+        """
+        generation = self.generation()
+        with self._lock:
+            if generation != self._generation:
+                self._boards = self._build_boards(generation)
+                self._update_time = _now_text()
+                self._generation = generation
+            return self._generation, self._update_time, self._boards
+
+    def _build_boards(self, generation):
+        rng = random.Random(self.seed * 1000003 + generation)
+        update_time = _now_text()
+        boards = []
+        for i in range(self.train_count):
+            type_id, type_zh, type_en = TRAIN_TYPES[i % len(TRAIN_TYPES)]
+            station_id, station_zh, station_en = STATIONS[(i + generation) % len(STATIONS)]
+            # 大部分列車準點，少數延遲較久
+            delay = 0 if rng.random() < 0.6 else int(rng.expovariate(1 / 6))
+            boards.append({
+                'TrainNo': str(100 + i),
+                'TrainTypeID': type_id,
+                'TrainTypeCode': type_id[-1],
+                'TrainTypeName': {'Zh_tw': type_zh, 'En': type_en},
+                'StationID': station_id,
+                'StationName': {'Zh_tw': station_zh, 'En': station_en},
+                'TrainStationStatus': rng.randint(0, 2),
+                'DelayTime': delay,
+                'UpdateTime': update_time
+            })
+        return boards
+
+    def stations(self):
+        """車站基本資料"""
+        return [
+            {
+                'StationUID': f'TRA-{station_id}',
+                'StationID': station_id,
+                'StationName': {'Zh_tw': zh, 'En': en},
+                'StationAddress': '',
+                'StationPhone': '',
+                'StationClass': '1'
+            }
+            for station_id, zh, en in STATIONS
+        ]
+
+    def station_live_boards(self, station_id):
+        """單一車站的列車到離站資料 (目前停靠該站的列車)"""
+        _, update_time, boards = self.train_live_boards()
+        return [
+            {
+                'StationID': station_id,
+                'TrainNo': board['TrainNo'],
+                'TrainTypeName': board['TrainTypeName'],
+                'DelayTime': board['DelayTime'],
+                'UpdateTime': update_time
+            }
+            for board in boards
+            if board['StationID'] == station_id
+        ]
+
+    def daily_timetable(self, train_date):
+        """每日時刻表 (每班列車只列出起訖站)"""
+        timetables = []
+        for i in range(self.train_count):
+            _, type_zh, type_en = TRAIN_TYPES[i % len(TRAIN_TYPES)]
+            origin = STATIONS[i % len(STATIONS)]
+            destination = STATIONS[(i + 5) % len(STATIONS)]
+            departure = (6 * 60 + i * 7) % (24 * 60)
+            timetables.append({
+                'TrainDate': train_date,
+                'TrainInfo': {
+                    'TrainNo': str(100 + i),
+                    'TrainTypeName': {'Zh_tw': type_zh, 'En': type_en}
+                },
+                'StopTimes': [
+                    {'StationID': origin[0], 'DepartureTime': f'{departure // 60:02d}:{departure % 60:02d}'},
+                    {'StationID': destination[0], 'ArrivalTime': f'{(departure // 60 + 2) % 24:02d}:{departure % 60:02d}'}
+                ]
+            })
+        return timetables
+
+
+class ReplayStore:
+    """
+    錄製回應的回放
+
+    回放檔為 JSON：{"format": "tdx-replay-1", "responses": {API 路徑: [第 1 筆回應, 第 2 筆回應, ...]}}，
+    每個路徑的回應依 update_interval 輪流回放，最後一筆之後從頭開始。
+    """
+
+    def __init__(self, path, update_interval=30):
+        """
+        Args:
+            path: 回放檔路徑
+            update_interval: 每筆回應回放的秒數
+        """
+        with open(path, encoding='utf-8') as f:
+            data = json.load(f)
+        if data.get('format') != REPLAY_FORMAT:
+            raise ValueError(f"不支援的回放檔格式: {data.get('format')}")
+
+        self.path = path
+        self.responses = data['responses']
+        self.update_interval = update_interval
+        self._started = time.monotonic()
+
+    def __contains__(self, api_path):
+        return api_path in self.responses
+
+    def frame(self, api_path):
+        """
+        取得目前應回放的回應
+
+        Args:
+            api_path: API 路徑 (不含 /api/basic 前綴)
+
+        Returns:
+            tuple: (回應序號, 回應內容)
+        """
+        frames = self.responses[api_path]
+        index = 0
+        if self.update_interval and len(frames) > 1:
+            index = int((time.monotonic() - self._started) / self.update_interval) % len(frames)
+        return index, frames[index]
+
+
+class _TDXHandler(BaseHTTPRequestHandler):
+    """單一請求的處理 (實際邏輯在 MockTDXServer)"""
+
+    protocol_version = 'HTTP/1.1'
+    # 標頭與內容分開寫出，不關閉 Nagle 演算法會與延遲 ACK 互相等待約 40 ms
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        body = self.rfile.read(length) if length else b''
+        self._reply(*self.server.handle_token(self.path, body))
+
+    def do_GET(self):
+        self._reply(*self.server.handle_api(self.path, self.headers))
+
+    def _reply(self, status, payload, headers=None):
+        if payload is None:
+            body = b''
+        elif isinstance(payload, bytes):
+            body = payload
+        else:
+            body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        if body:
+            self.wfile.write(body)
+
+
+class MockTDXServer(ThreadingHTTPServer):
+    """
+    TDX 替身伺服器
+
+    - POST /auth/realms/TDXConnect/protocol/openid-connect/token: client_credentials 認證
+    - GET /api/basic/v3/Rail/TRA/...: 需帶入有效的 Bearer Token，支援 $top / $skip 分頁與 ETag (304)
+    - GET /_mock/stats: 請求與錯誤統計
+
+    有回放檔時優先回放錄製的回應，其餘端點使用 SyntheticNetwork 產生的模擬資料。
+    """
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    # 保留的已編碼回應數 (超過時全部清除，舊版本的分頁不會再被請求)
+    MAX_CACHED_BODIES = 256
+
+    def __init__(self, host='127.0.0.1', port=8090, train_count=300, update_interval=30,
+                 latency=0.0, jitter=0.0, error_rate=0.0, error_statuses=(503,),
+                 token_ttl=86400, replay=None, seed=0, verbose=False):
+        """
+        Args:
+            host: 監聽位址
+            port: 監聽埠號 (0 表示自動選擇)
+            train_count: 模擬的列車數量
+            update_interval: 資料更新週期 (秒，0 表示資料不變)
+            latency: 每個請求的固定延遲 (秒)
+            jitter: 額外的隨機延遲上限 (秒)
+            error_rate: 回傳錯誤的機率 (0 ~ 1)
+            error_statuses: 錯誤時隨機選用的狀態碼 (例如 429、500、503)
+            token_ttl: Token 有效秒數 (expires_in)
+            replay: 回放檔路徑 (None 表示只使用模擬資料)
+            seed: 亂數種子
+            verbose: 是否輸出每個請求的記錄
+        """
+        super().__init__((host, port), _TDXHandler)
+        self.network = SyntheticNetwork(train_count, update_interval, seed)
+        self.replay = ReplayStore(replay, update_interval) if replay else None
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.error_statuses = tuple(error_statuses)
+        self.token_ttl = token_ttl
+        self.verbose = verbose
+
+        self._rng = random.Random(seed)
+        self._tokens = {}
+        self._forced_errors = []
+        self._lock = threading.Lock()
+        # (路徑, 版本, $skip, $top) -> 已編碼的回應，同一分頁只序列化一次
+        self._bodies = {}
+        self.stats = {
+            'token_requests': 0,
+            'api_requests': 0,
+            'not_modified': 0,
+            'unauthorized': 0,
+            'injected_errors': 0
+        }
+
+    @property
+    def port(self):
+        return self.server_address[1]
+
+    @property
+    def base_url(self):
+        host = self.server_address[0]
+        return f"http://{host}:{self.port}"
+
+    def client_config(self, **overrides):
+        """
+        取得連線至本伺服器的設定 (可傳入 TDXService / AsyncTDXService 或寫入 config.py)
+
+        Returns:
+            dict: client_id、client_secret、auth_url、api_url、api_base_url 與其他覆寫的設定
+        """
+        config = {
+            'client_id': 'mock-client',
+            'client_secret': 'mock-secret',
+            'auth_url': f"{self.base_url}{AUTH_PATH}",
+            'api_url': f"{self.base_url}{API_PREFIX}{TRAIN_LIVE_BOARD_PATH}?$format=JSON",
+            'api_base_url': f"{self.base_url}{API_PREFIX}",
+        }
+        config.update(overrides)
+        return config
+
+    def start(self):
+        """
+        在背景執行緒中啟動伺服器
+
+        Returns:
+            threading.Thread: 伺服器執行緒
+        """
+        thread = threading.Thread(target=self.serve_forever, name='mock-tdx', daemon=True)
+        thread.start()
+        return thread
+
+    def fail_next(self, count=1, status=503):
+        """
+        讓接下來的 count 個 API 請求回傳指定的錯誤 (不受 error_rate 影響)
+
+        Args:
+            count: 請求數
+            status: 狀態碼
+        """
+        with self._lock:
+            self._forced_errors.extend([status] * count)
+
+    def revoke_tokens(self):
+        """撤銷所有已發出的 Token (下一個 API 請求會收到 401)"""
+        with self._lock:
+            self._tokens.clear()
+
+    def get_stats(self):
+        """
+        取得請求統計
+
+        Returns:
+            dict: 各類請求數與目前有效的 Token 數
+        """
+        with self._lock:
+            stats = dict(self.stats)
+            stats['active_tokens'] = len(self._tokens)
+        return stats
+
+    def _count(self, key):
+        with self._lock:
+            self.stats[key] += 1
+
+    def _simulate_network(self):
+        """
+        模擬延遲與隨機錯誤
+
+        Returns:
+            int: 要回傳的錯誤狀態碼，None 表示正常處理
+        """
+        delay = self.latency + (self._rng.uniform(0, self.jitter) if self.jitter else 0)
+        if delay > 0:
+            time.sleep(delay)
+
+        with self._lock:
+            if self._forced_errors:
+                status = self._forced_errors.pop(0)
+            elif self.error_rate and self._rng.random() < self.error_rate:
+                status = self._rng.choice(self.error_statuses)
+            else:
+                return None
+            self.stats['injected_errors'] += 1
+            return status
+
+    @staticmethod
+    def _error(status):
+        headers = {'Retry-After': '1'} if status == 429 else None
+        return status, {'message': f'模擬錯誤 ({status})'}, headers
+
+    def handle_token(self, path, body):
+        """
+        處理認證請求
+
+        Returns:
+            tuple: (狀態碼, 回應內容, 標頭)
+        """
+        if urlsplit(path).path != AUTH_PATH:
+            return 404, {'message': 'Not Found'}, None
+
+        self._count('token_requests')
+        status = self._simulate_network()
+        if status is not None:
+            return self._error(status)
+
+        form = {key: values[0] for key, values in parse_qs(body.decode('utf-8')).items()}
+        if form.get('grant_type') != 'client_credentials' or not form.get('client_id') or not form.get('client_secret'):
+            return 401, {'error': 'invalid_client'}, None
+
+        token = secrets.token_urlsafe(24)
+        with self._lock:
+            self._tokens[token] = time.monotonic() + self.token_ttl
+        return 200, {
+            'access_token': token,
+            'expires_in': self.token_ttl,
+            'token_type': 'Bearer'
+        }, None
+
+    def _is_authorized(self, headers):
+        authorization = headers.get('Authorization') or ''
+        if not authorization.startswith('Bearer '):
+            return False
+        with self._lock:
+            expires_at = self._tokens.get(authorization[len('Bearer '):])
+        return expires_at is not None and expires_at > time.monotonic()
+
+    def handle_api(self, raw_path, headers):
+        """
+        處理 API 請求
+
+        Returns:
+            tuple: (狀態碼, 回應內容, 標頭)
+        """
+        parts = urlsplit(raw_path)
+        if parts.path == '/_mock/stats':
+            return 200, self.get_stats(), None
+        if not parts.path.startswith(API_PREFIX):
+            return 404, {'message': 'Not Found'}, None
+
+        self._count('api_requests')
+        status = self._simulate_network()
+        if status is not None:
+            return self._error(status)
+
+        if not self._is_authorized(headers):
+            self._count('unauthorized')
+            return 401, {'message': 'Unauthorized'}, None
+
+        api_path = parts.path[len(API_PREFIX):]
+        version, payload = self._resolve(api_path)
+        if payload is None:
+            return 404, {'message': f'找不到端點: {api_path}'}, None
+
+        query = {key: values[0] for key, values in parse_qs(parts.query).items()}
+        top = int(query['$top']) if '$top' in query else None
+        skip = int(query.get('$skip', 0))
+
+        etag = f'"{version}-{skip}-{top}"'
+        if headers.get('If-None-Match') == etag:
+            self._count('not_modified')
+            return 304, None, {'ETag': etag}
+
+        body_key = (api_path, version, skip, top)
+        body = self._bodies.get(body_key)
+        if body is None:
+            body = json.dumps(self._paginate(payload, skip, top), ensure_ascii=False).encode('utf-8')
+            with self._lock:
+                if len(self._bodies) >= self.MAX_CACHED_BODIES:
+                    self._bodies.clear()
+                self._bodies[body_key] = body
+        return 200, body, {'ETag': etag}
+
+    def _resolve(self, api_path):
+        """
+        取得端點的完整回應內容
+
+        Returns:
+            tuple: (版本標記, 回應內容)，找不到端點時回應內容為 None
+        """
+        if self.replay is not None and api_path in self.replay:
+            index, payload = self.replay.frame(api_path)
+            return f"r{index}", payload
+
+        network = self.network
+        if api_path == TRAIN_LIVE_BOARD_PATH:
+            generation, update_time, boards = network.train_live_boards()
+            return f"g{generation}-n{network.train_count}", {
+                'UpdateTime': update_time,
+                'UpdateInterval': network.update_interval,
+                'SrcUpdateTime': update_time,
+                'TrainLiveBoards': boards
+            }
+        if api_path == STATION_PATH:
+            return 's', {'UpdateTime': _now_text(), 'Stations': network.stations()}
+
+        match = STATION_LIVE_BOARD_PATTERN.match(api_path)
+        if match:
+            generation, update_time, _ = network.train_live_boards()
+            return f"g{generation}-n{network.train_count}", {
+                'UpdateTime': update_time,
+                'StationLiveBoards': network.station_live_boards(match.group(1))
+            }
+
+        match = DAILY_TIMETABLE_PATTERN.match(api_path)
+        if match:
+            return 't', {
+                'UpdateTime': _now_text(),
+                'TrainTimetables': network.daily_timetable(match.group(1))
+            }
+        return None, None
+
+    @staticmethod
+    def _paginate(payload, skip, top):
+        """依 $skip / $top 切割回應中的列表欄位"""
+        if top is None and not skip:
+            return payload
+        paged = dict(payload)
+        for key in LIST_KEYS:
+            if isinstance(paged.get(key), list):
+                end = None if top is None else skip + top
+                paged[key] = paged[key][skip:end]
+        return paged
+
+
+def record_responses(output, paths=(TRAIN_LIVE_BOARD_PATH,), frames=1, interval=30,
+                     page_size=1000, service=None, base_url=None):
+    """
+    錄製 TDX 的實際回應並寫入回放檔 (會發出網路請求，需要有效的 API 憑證)
+
+    每個路徑的所有分頁合併為一筆回應，共錄製 frames 次、每次間隔 interval 秒。
+
+    Args:
+        output: 回放檔路徑
+        paths: 要錄製的 API 路徑 (不含 /api/basic 前綴)
+        frames: 錄製次數
+        interval: 每次錄製的間隔 (秒)
+        page_size: 每頁筆數
+        service: TDXService 實例 (預設使用 config.py 的設定)
+        base_url: API 基礎網址 (預設為 CONFIG['api_base_url'])
+
+    Returns:
+        dict: 回放檔內容
+    """
+    # 只有錄製時才需要 config.py 的憑證
+    from config import CONFIG
+    from tdx_service import TDXService
+
+    service = service or TDXService()
+    base_url = (base_url or CONFIG.get('api_base_url', 'https://tdx.transportdata.tw/api/basic')).rstrip('/')
+    responses = {path: [] for path in paths}
+
+    for frame in range(frames):
+        if frame:
+            time.sleep(interval)
+        for path in paths:
+            payload = _fetch_all_pages(service, f"{base_url}{path}", page_size)
+            responses[path].append(payload)
+            count = sum(len(payload[key]) for key in LIST_KEYS if isinstance(payload.get(key), list))
+            print(f"✓ 已錄製 {path} 第 {frame + 1}/{frames} 筆 ({count} 筆資料)")
+
+    data = {
+        'format': REPLAY_FORMAT,
+        'recorded_at': _now_text(),
+        'responses': responses
+    }
+    directory = os.path.dirname(os.path.abspath(output))
+    os.makedirs(directory, exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False)
+    print(f"✓ 回放檔已寫入: {output}")
+    return data
+
+
+def _fetch_all_pages(service, url, page_size):
+    """以 $top / $skip 取得全部分頁，並合併回應中的列表欄位"""
+    merged = None
+    skip = 0
+    while True:
+        query = urlencode({'$format': 'JSON', '$top': page_size, '$skip': skip}, safe='$')
+        token = service.get_access_token()
+        response = service.session.get(
+            f"{url}?{query}",
+            headers={'Authorization': f'Bearer {token}'},
+            timeout=service.timeout
+        )
+        response.raise_for_status()
+        payload = response.json()
+
+        lists = [key for key in LIST_KEYS if isinstance(payload.get(key), list)]
+        page_items = max((len(payload[key]) for key in lists), default=0)
+        if merged is None:
+            merged = payload
+        else:
+            for key in lists:
+                merged[key].extend(payload[key])
+
+        if page_items < page_size:
+            return merged
+        skip += page_size
+
+
+def main():
+    parser = argparse.ArgumentParser(description='本機 TDX 替身伺服器')
+    subparsers = parser.add_subparsers(dest='command')
+
+    serve = subparsers.add_parser('serve', help='啟動替身伺服器')
+    serve.add_argument('--host', default='127.0.0.1', help='監聽位址')
+    serve.add_argument('--port', type=int, default=8090, help='監聽埠號')
+    serve.add_argument('--trains', type=int, default=300, help='模擬的列車數量')
+    serve.add_argument('--update-interval', type=float, default=30, help='資料更新週期 (秒)')
+    serve.add_argument('--latency', type=float, default=0.0, help='每個請求的固定延遲 (秒)')
+    serve.add_argument('--jitter', type=float, default=0.0, help='額外的隨機延遲上限 (秒)')
+    serve.add_argument('--error-rate', type=float, default=0.0, help='回傳錯誤的機率 (0 ~ 1)')
+    serve.add_argument('--error-status', type=int, action='append',
+                       help='錯誤時使用的狀態碼 (可重複指定，預設 503)')
+    serve.add_argument('--token-ttl', type=int, default=86400, help='Token 有效秒數')
+    serve.add_argument('--replay', help='回放檔路徑')
+    serve.add_argument('--seed', type=int, default=0, help='亂數種子')
+    serve.add_argument('--verbose', action='store_true', help='輸出每個請求的記錄')
+
+    record = subparsers.add_parser('record', help='錄製 TDX 的實際回應 (需要 config.py 的 API 憑證)')
+    record.add_argument('--output', required=True, help='回放檔路徑')
+    record.add_argument('--path', action='append', help='要錄製的 API 路徑 (可重複指定，預設為 TrainLiveBoard)')
+    record.add_argument('--station', action='append', help='同時錄製指定車站的 StationLiveBoard')
+    record.add_argument('--timetable', action='store_true', help='同時錄製今天的每日時刻表')
+    record.add_argument('--frames', type=int, default=1, help='錄製次數')
+    record.add_argument('--interval', type=float, default=30, help='每次錄製的間隔 (秒)')
+    record.add_argument('--page-size', type=int, default=1000, help='每頁筆數')
+
+    args = parser.parse_args()
+
+    if args.command == 'record':
+        paths = list(args.path or [TRAIN_LIVE_BOARD_PATH])
+        paths += [f'/v3/Rail/TRA/StationLiveBoard/Station/{station}' for station in args.station or []]
+        if args.timetable:
+            paths.append(f'/v3/Rail/TRA/DailyTrainTimetable/TrainDate/{date.today().isoformat()}')
+        record_responses(args.output, paths, args.frames, args.interval, args.page_size)
+        return 0
+
+    if args.command != 'serve':
+        parser.print_help()
+        return 1
+
+    server = MockTDXServer(
+        host=args.host,
+        port=args.port,
+        train_count=args.trains,
+        update_interval=args.update_interval,
+        latency=args.latency,
+        jitter=args.jitter,
+        error_rate=args.error_rate,
+        error_statuses=args.error_status or (503,),
+        token_ttl=args.token_ttl,
+        replay=args.replay,
+        seed=args.seed,
+        verbose=args.verbose
+    )
+    config = server.client_config()
+    print(f"✓ TDX 替身伺服器已啟動: {server.base_url}")
+    if args.replay:
+        print(f"回放檔: {args.replay}")
+    print("在 config.py 使用以下設定即可連線至替身伺服器:")
+    for key, value in config.items():
+        print(f"    '{key}': '{value}',")
+    print("按 Ctrl+C 可停止服務")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,131 @@
+"""
+多語名稱正規化模組
+將 TDX 的名稱欄位 (字串或 {'Zh_tw': ..., 'En': ...} 字典) 轉換為單一語言的字串，
+並以車站代碼 / 車種代碼記住解析結果，每次輪詢不必重新判斷與建立字串
+"""
+
+import sys
+
+
+# 支援的輸出語言與 TDX 名稱字典中對應的鍵 (依序嘗試)
+LANGUAGES = {
+    'zh-tw': ('Zh_tw', 'zh-tw', 'Zh_TW'),
+    'en': ('En', 'en'),
+}
+
+# 沒有名稱時的顯示值
+MISSING = 'N/A'
+
+
+def resolve_names(value):
+    """
+    解析名稱欄位的所有語言
+
+    Args:
+        value: TDX 名稱欄位 (字串、字典或 None)
+
+    Returns:
+        dict: 語言 -> 名稱 (共用同一個字串物件)；缺少的語言以其他語言代替，都沒有時為 'N/A'
+    """
+    if isinstance(value, dict):
+        names = {}
+        for language, keys in LANGUAGES.items():
+            for key in keys:
+                name = value.get(key)
+                if name:
+                    names[language] = sys.intern(str(name))
+                    break
+    elif value:
+        # 只有字串時 (TDX 的中文名稱) 所有語言共用同一個名稱
+        name = sys.intern(str(value))
+        names = {language: name for language in LANGUAGES}
+    else:
+        names = {}
+
+    fallback = next(iter(names.values()), MISSING)
+    return {language: names.get(language, fallback) for language in LANGUAGES}
+
+
+class NameResolver:
+    """
+    車站與車種名稱的正規化與快取
+
+    以代碼為鍵保存已解析的名稱 (intern 後的字串)，同一車站或車種在之後的輪詢中
+    只需一次字典查詢，不會重新判斷型別或建立新的字串。
+    大量資料的迴圈可直接查詢 station_names / train_type_names，查不到時再呼叫 station() / train_type()。
+    """
+
+    def __init__(self, language='zh-tw'):
+        """
+        Args:
+            language: 輸出語言，'zh-tw' 或 'en'
+        """
+        language = language.lower()
+        if language not in LANGUAGES:
+            raise ValueError(f"不支援的名稱語言: {language} (可用: {', '.join(LANGUAGES)})")
+        self.language = language
+        # 代碼 -> 所有語言的名稱
+        self._stations = {}
+        self._train_types = {}
+        # 代碼 -> 輸出語言的名稱
+        self.station_names = {}
+        self.train_type_names = {}
+
+    def station(self, station_id, name):
+        """
+        取得車站名稱
+
+        Args:
+            station_id: 車站代碼 (None 時不快取)
+            name: TDX 的 StationName 欄位
+
+        Returns:
+            str: 輸出語言的車站名稱
+        """
+        names = self._stations.get(station_id)
+        if names is None:
+            names = self._remember(self._stations, self.station_names, station_id, name)
+        return names[self.language]
+
+    def train_type(self, train_type_id, name):
+        """
+        取得車種名稱
+
+        Args:
+            train_type_id: 車種代碼 (None 時不快取)
+            name: TDX 的 TrainTypeName 欄位
+
+        Returns:
+            str: 輸出語言的車種名稱
+        """
+        names = self._train_types.get(train_type_id)
+        if names is None:
+            names = self._remember(self._train_types, self.train_type_names, train_type_id, name)
+        return names[self.language]
+
+    def _remember(self, table, resolved, key, value):
+        names = resolve_names(value)
+        # 沒有代碼或沒有名稱時不快取，下次仍以實際的欄位解析
+        if key is not None and names['zh-tw'] != MISSING:
+            table[key] = names
+            resolved[key] = names[self.language]
+        return names
+
+    def clear(self):
+        """清除所有已解析的名稱 (例如 TDX 更改站名時)"""
+        self._stations.clear()
+        self._train_types.clear()
+        self.station_names.clear()
+        self.train_type_names.clear()
+
+    def get_stats(self):
+        """
+        取得快取的項目數
+
+        Returns:
+            dict: stations (車站數)、train_types (車種數)
+        """
+        return {
+            'stations': len(self._stations),
+            'train_types': len(self._train_types)
+        }
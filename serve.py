@@ -0,0 +1,191 @@
+"""
+台鐵列車即時動態資訊系統 - 正式環境啟動程式
+以 gunicorn 啟動多個工作行程，並由單一輪詢行程向 TDX 取得資料、寫入共用快照檔
+
+使用方式:
+    python serve.py echarts --bind 0.0.0.0:5000 --workers 4
+    python serve.py dash --bind 0.0.0.0:8050 --workers 4
+    python serve.py echarts --no-publisher   # 其他主機負責輪詢 (需設定 cache_backend='redis')
+"""
+
+import argparse
+import importlib
+import multiprocessing
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+from config import CONFIG
+from metrics import configure_logging, reset_metrics_dir
+
+try:
+    from gunicorn.app.base import BaseApplication
+except ImportError:
+    BaseApplication = None
+
+try:
+    import gevent
+except ImportError:
+    gevent = None
+
+
+# 可啟動的應用程式: 名稱 -> (模組, WSGI 物件, 預設位址)
+APPS = {
+    'echarts': ('app1', 'app', '127.0.0.1:5000'),
+    'dash': ('app', 'server', '127.0.0.1:8050'),
+}
+
+
+def run_publisher():
+    """
+    輪詢行程主程式：唯一向 TDX 取得資料的行程，每個新版本寫入共用快照檔
+    """
+    # 必須在匯入 tdx_service 之前設定角色
+    os.environ['TRA_SNAPSHOT_ROLE'] = 'publisher'
+    from tdx_service import SHARED_SNAPSHOT_PATH, train_data_poller
+
+    print(f"✓ 輪詢行程已啟動 (PID {os.getpid()})，共用快照: {SHARED_SNAPSHOT_PATH}")
+    start_publisher_metrics(CONFIG.get('publisher_metrics_bind'))
+    train_data_poller.start()
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        train_data_poller.stop()
+
+
+def start_publisher_metrics(bind):
+    """
+    在背景執行緒提供輪詢行程的 /metrics (只包含輪詢行程的指標；工作行程的 /metrics 已彙總所有行程)
+
+    Args:
+        bind: 監聽位址 (例如 127.0.0.1:9100)，None 表示不啟動
+    """
+    if not bind:
+        return
+    from flask import Flask
+    from werkzeug.serving import make_server
+    from metrics import metrics_api
+
+    app = Flask(__name__)
+    app.register_blueprint(metrics_api)
+    host, _, port = bind.rpartition(':')
+    server = make_server(host or '127.0.0.1', int(port), app, threaded=True)
+    threading.Thread(target=server.serve_forever, name='publisher-metrics', daemon=True).start()
+    print(f"✓ 輪詢行程指標: http://{bind}/metrics")
+
+
+if BaseApplication is not None:
+    class ProductionServer(BaseApplication):
+        """以程式設定啟動 gunicorn，每個工作行程各自匯入應用程式"""
+
+        def __init__(self, module_name, attribute, options):
+            """
+            Args:
+                module_name: 應用程式模組名稱
+                attribute: WSGI 物件名稱
+                options: gunicorn 設定
+            """
+            self.module_name = module_name
+            self.attribute = attribute
+            self.options = options
+            super().__init__()
+
+        def load_config(self):
+            for key, value in self.options.items():
+                self.cfg.set(key, value)
+
+        def load(self):
+            module = importlib.import_module(self.module_name)
+            return getattr(module, self.attribute)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='台鐵列車即時動態資訊系統 (正式環境)')
+    parser.add_argument('app', nargs='?', choices=sorted(APPS), help='要啟動的版本')
+    parser.add_argument('--no-publisher', action='store_true',
+                        help='不啟動輪詢行程，只讀取其他主機寫入共用快取的快照')
+    parser.add_argument('--publisher', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('--bind', help='監聽位址 (例如 0.0.0.0:5000)')
+    parser.add_argument('--workers', type=int, default=CONFIG.get('server_workers', multiprocessing.cpu_count()),
+                        help='工作行程數')
+    parser.add_argument('--threads', type=int, default=CONFIG.get('server_threads', 32),
+                        help='每個工作行程的執行緒數 (gthread，每個 SSE 連線占用一個)')
+    parser.add_argument('--worker-class', choices=('gthread', 'gevent'),
+                        default=CONFIG.get('server_worker_class', 'gthread'),
+                        help='工作行程類型 (gevent 以協程處理連線，SSE 不占用執行緒)')
+    args = parser.parse_args()
+
+    configure_logging()
+    if args.publisher:
+        run_publisher()
+        return 0
+    if args.app is None:
+        parser.error('請指定要啟動的版本')
+
+    if BaseApplication is None:
+        print("✗ 找不到 gunicorn，請先執行: pip install gunicorn (僅支援 Linux / macOS)")
+        return 1
+
+    if args.worker_class == 'gevent' and gevent is None:
+        print("✗ 找不到 gevent，請先執行: pip install gevent")
+        return 1
+    if args.no_publisher and CONFIG.get('cache_backend', 'memory') != 'redis':
+        print("✗ --no-publisher 需要共用快取，請在 config.py 設定 cache_backend='redis'")
+        return 1
+
+    module_name, attribute, default_bind = APPS[args.app]
+
+    # 工作行程只讀取共用快照，不呼叫 TDX API
+    os.environ['TRA_SNAPSHOT_ROLE'] = 'reader'
+
+    # 各行程 (含輪詢行程) 把指標寫入同一目錄，任一工作行程的 /metrics 都是所有行程的彙總
+    metrics_dir = CONFIG.get('metrics_dir') or os.path.join(tempfile.gettempdir(), f"tra-metrics-{os.getpid()}")
+    reset_metrics_dir(metrics_dir)
+    os.environ['TRA_METRICS_DIR'] = metrics_dir
+
+    # gthread 的每個 SSE 連線占用一個執行緒直到關閉，保留部分執行緒給一般請求；
+    # 超過上限的 SSE 連線回傳 503，瀏覽器改為定時輪詢
+    options = {
+        'bind': args.bind or default_bind,
+        'workers': args.workers,
+        'worker_class': args.worker_class,
+    }
+    if args.worker_class == 'gevent':
+        options['worker_connections'] = CONFIG.get('server_worker_connections', 1000)
+        stream_limit = f"每行程連線: {options['worker_connections']}"
+    else:
+        options['threads'] = args.threads
+        max_streams = max(args.threads - CONFIG.get('sse_reserved_threads', 8), 0)
+        os.environ['TRA_SSE_MAX_CONNECTIONS'] = str(max_streams)
+        stream_limit = f"每行程執行緒: {args.threads} (SSE 連線上限 {max_streams})"
+
+    # 輪詢行程以獨立的子行程執行 (不使用 multiprocessing，避免 fork 出的工作行程結束時嘗試等待它)
+    publisher = None
+    if not args.no_publisher:
+        publisher = subprocess.Popen([sys.executable, os.path.abspath(__file__), '--publisher'])
+
+    print("=" * 60)
+    print("🚂 台鐵列車即時動態資訊系統 (正式環境)")
+    print("=" * 60)
+    print(f"版本: {args.app}，工作行程: {args.workers} ({args.worker_class})，{stream_limit}")
+    print(f"監聽位址: http://{args.bind or default_bind}")
+    print("=" * 60)
+
+    master_pid = os.getpid()
+    try:
+        ProductionServer(module_name, attribute, options).run()
+    finally:
+        # 工作行程由 gunicorn 以 fork 建立，結束時也會執行到這裡，只由主行程停止輪詢行程
+        if os.getpid() == master_pid:
+            if publisher is not None:
+                publisher.terminate()
+                publisher.wait(timeout=5)
+            if not CONFIG.get('metrics_dir'):
+                shutil.rmtree(metrics_dir, ignore_errors=True)
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
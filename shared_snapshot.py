@@ -0,0 +1,247 @@
+"""
+跨行程共用快照模組
+由單一輪詢行程將最新快照寫入記憶體對應檔 (同一主機) 或共用快取 (多台主機)，
+其他行程只讀取快照，不呼叫 TDX API
+"""
+
+import logging
+import mmap
+import os
+import struct
+import tempfile
+from datetime import datetime
+from json_codec import dumps, loads
+from train_batch import FIELDS, TrainBatchBuilder
+
+
+logger = logging.getLogger(__name__)
+
+
+# 檔頭: 識別碼、輪詢行程的啟動識別 (epoch)、快照版本、取得時間 (Unix 秒)、內容長度
+HEADER = struct.Struct('<8sQQdQ')
+MAGIC = b'TRASNAP2'
+
+
+def encode_snapshot(snapshot):
+    """
+    將快照編碼為檔案內容
+
+    Args:
+        snapshot: TrainSnapshot
+
+    Returns:
+        bytes: 檔頭 + 欄位式 JSON
+    """
+    batch = snapshot.batch
+    payload = dumps({field: list(batch.column(field)) for field in FIELDS})
+    header = HEADER.pack(
+        MAGIC, snapshot.epoch, snapshot.version, snapshot.fetched_at.timestamp(), len(payload)
+    )
+    return header + payload
+
+
+def decode_header(buffer):
+    """
+    只解析檔頭
+
+    Args:
+        buffer: 檔案內容 (bytes 或 mmap)
+
+    Returns:
+        tuple: (快照版本, 取得時間, 內容長度, epoch)
+    """
+    magic, epoch, version, fetched_at, length = HEADER.unpack_from(buffer, 0)
+    if magic != MAGIC:
+        raise ValueError("共用快照檔格式不正確")
+    return version, datetime.fromtimestamp(fetched_at), length, epoch
+
+
+def decode_snapshot(buffer):
+    """
+    由檔案內容還原快照內容
+
+    Args:
+        buffer: 檔案內容 (bytes 或 mmap)
+
+    Returns:
+        tuple: (TrainBatch, 取得時間, 快照版本, epoch)
+    """
+    version, fetched_at, length, epoch = decode_header(buffer)
+    columns = loads(buffer[HEADER.size:HEADER.size + length])
+    builder = TrainBatchBuilder()
+    for row in zip(*(columns[field] for field in FIELDS)):
+        builder.append(*row)
+    return builder.build(), fetched_at, version, epoch
+
+
+class SharedSnapshotWriter:
+    """
+    共用快照寫入端 (只在輪詢行程中使用)
+
+    每次輪詢寫入暫存檔後以 os.replace 整體替換，讀取端不會看到寫到一半的內容；
+    版本沒有改變時也會重寫，讓讀取端取得最新的取得時間。
+    """
+
+    def __init__(self, path):
+        """
+        Args:
+            path: 共用快照檔路徑
+        """
+        self.path = path
+
+    def publish(self, snapshot):
+        """
+        寫入快照
+
+        Args:
+            snapshot: TrainSnapshot
+        """
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.snapshot-')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(encode_snapshot(snapshot))
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def on_snapshot(self, snapshot, previous_tag):
+        """
+        輪詢器的通知 (以 every_refresh=True 註冊，於輪詢執行緒中執行)
+
+        Args:
+            snapshot: 新快照
+            previous_tag: 前一個版本標記
+        """
+        try:
+            self.publish(snapshot)
+        except OSError as e:
+            logger.error("共用快照寫入失敗: %s", e)
+
+
+class SharedSnapshotReader:
+    """
+    共用快照讀取端 (在工作行程中使用)
+
+    以檔案的 inode 與修改時間判斷檔案是否被替換，被替換時以 mmap 對應並讀取檔頭，
+    只有 epoch 或版本號改變時才解碼內容。
+    """
+
+    def __init__(self, path):
+        """
+        Args:
+            path: 共用快照檔路徑
+        """
+        self.path = path
+        self._stat_key = None
+        self._cached = None
+
+    def read(self):
+        """
+        讀取最新快照
+
+        Returns:
+            tuple: (TrainBatch, 取得時間, 快照版本, epoch)
+
+        Raises:
+            FileNotFoundError: 輪詢行程尚未寫入第一份快照
+        """
+        stat = os.stat(self.path)
+        stat_key = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        if stat_key == self._stat_key and self._cached is not None:
+            return self._cached
+
+        with open(self.path, 'rb') as f:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                version, fetched_at, _, epoch = decode_header(mapped)
+                if self._cached is not None and self._cached[2:] == (version, epoch):
+                    self._cached = (self._cached[0], fetched_at, version, epoch)
+                else:
+                    self._cached = decode_snapshot(mapped)
+        self._stat_key = stat_key
+        return self._cached
+
+
+# 共用快取中的鍵: epoch、版本與取得時間 (小)、完整快照 (大)
+META_KEY = 'snapshot:meta'
+DATA_KEY = 'snapshot:data'
+
+
+class CachedSnapshotWriter:
+    """
+    共用快取寫入端 (只在唯一的輪詢主機上使用)
+
+    每次輪詢都寫入完整快照與版本資訊，設定 TTL 時輪詢停止後快照會自動過期。
+    """
+
+    def __init__(self, cache, ttl=None):
+        """
+        Args:
+            cache: 快取後端 (RedisCache)
+            ttl: 有效秒數 (None 表示使用快取後端的預設值)
+        """
+        self.cache = cache
+        self.ttl = ttl
+
+    def on_snapshot(self, snapshot, previous_tag):
+        """
+        輪詢器的通知 (以 every_refresh=True 註冊，於輪詢執行緒中執行)
+
+        Args:
+            snapshot: 快照
+            previous_tag: 前一個版本標記
+        """
+        meta = f"{snapshot.epoch} {snapshot.version} {snapshot.fetched_at.timestamp()}".encode()
+        try:
+            # 先寫入完整快照再寫入版本資訊，讀取端看到新版本時內容必定已存在
+            self.cache.set(DATA_KEY, encode_snapshot(snapshot), self.ttl)
+            self.cache.set(META_KEY, meta, self.ttl)
+        except (OSError, RuntimeError) as e:
+            logger.error("共用快取寫入失敗: %s", e)
+
+
+class CachedSnapshotReader:
+    """
+    共用快取讀取端 (在其他主機或工作行程中使用)
+
+    每次只讀取版本資訊，epoch 或版本號改變時才取得並解碼完整快照。
+    """
+
+    def __init__(self, cache):
+        """
+        Args:
+            cache: 快取後端 (RedisCache)
+        """
+        self.cache = cache
+        self._cached = None
+
+    def read(self):
+        """
+        讀取最新快照
+
+        Returns:
+            tuple: (TrainBatch, 取得時間, 快照版本, epoch)
+
+        Raises:
+            LookupError: 共用快取中沒有快照 (輪詢主機尚未寫入或已過期)
+        """
+        meta = self.cache.get(META_KEY)
+        if meta is None:
+            raise LookupError("共用快取中沒有列車資料快照")
+
+        epoch, version, timestamp = meta.split()
+        epoch, version = int(epoch), int(version)
+        fetched_at = datetime.fromtimestamp(float(timestamp))
+        if self._cached is not None and self._cached[2:] == (version, epoch):
+            self._cached = (self._cached[0], fetched_at, version, epoch)
+            return self._cached
+
+        data = self.cache.get(DATA_KEY)
+        if data is None:
+            raise LookupError("共用快取中沒有列車資料快照")
+        self._cached = decode_snapshot(data)
+        return self._cached
@@ -0,0 +1,210 @@
+"""
+請求合併 (single-flight) 模組
+同一資源同時有多個呼叫端時，只執行一次取得動作，其餘呼叫端等待並共用結果
+"""
+
+import asyncio
+import threading
+
+
+class _Call:
+    """進行中的一次取得動作"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    執行緒版本的請求合併
+
+    第一個呼叫端 (leader) 執行取得函式，同一個 key 在執行期間的其他呼叫端等待同一個結果；
+    取得失敗時所有等待中的呼叫端收到同一個例外。結果不會保留，執行結束後的呼叫會重新執行。
+    """
+
+    def __init__(self, name):
+        """
+        Args:
+            name: 名稱 (顯示於統計資訊)
+        """
+        self.name = name
+        self._calls = {}
+        self._lock = threading.Lock()
+        self.calls = 0         # 所有呼叫次數
+        self.executions = 0    # 實際執行取得函式的次數
+        self.coalesced = 0     # 等待其他呼叫端結果的次數
+
+    def do(self, key, func, *args, **kwargs):
+        """
+        執行取得函式，同一個 key 同時只執行一次
+
+        Args:
+            key: 資源的鍵
+            func: 取得函式
+
+        Returns:
+            取得函式的回傳值 (同時呼叫的呼叫端共用同一個物件，請勿修改)
+        """
+        with self._lock:
+            self.calls += 1
+            call = self._calls.get(key)
+            if call is not None:
+                self.coalesced += 1
+                leader = False
+            else:
+                self.executions += 1
+                call = _Call()
+                self._calls[key] = call
+                leader = True
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = func(*args, **kwargs)
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result
+
+    def in_flight(self):
+        """
+        取得目前進行中的取得動作數
+
+        Returns:
+            int: 進行中的 key 數量
+        """
+        with self._lock:
+            return len(self._calls)
+
+    def get_stats(self):
+        """
+        取得合併統計
+
+        Returns:
+            dict: calls、executions、coalesced、in_flight
+        """
+        with self._lock:
+            return {
+                'calls': self.calls,
+                'executions': self.executions,
+                'coalesced': self.coalesced,
+                'in_flight': len(self._calls)
+            }
+
+
+class AsyncSingleFlight:
+    """
+    asyncio 版本的請求合併
+
+    行為與 SingleFlight 相同，等待中的協程以 Future 取得 leader 的結果。
+    進行中的動作依事件迴圈分開記錄，不同執行緒各自執行 asyncio.run() 時不會互相等待。
+    """
+
+    def __init__(self, name):
+        """
+        Args:
+            name: 名稱 (顯示於統計資訊)
+        """
+        self.name = name
+        self._calls = {}
+        self.calls = 0
+        self.executions = 0
+        self.coalesced = 0
+
+    async def do(self, key, func, *args, **kwargs):
+        """
+        執行取得協程，同一個 key 同時只執行一次
+
+        Args:
+            key: 資源的鍵
+            func: 回傳協程的函式
+
+        Returns:
+            協程的回傳值 (同時呼叫的呼叫端共用同一個物件，請勿修改)
+        """
+        loop = asyncio.get_running_loop()
+        key = (loop, key)
+        self.calls += 1
+        future = self._calls.get(key)
+        if future is not None:
+            self.coalesced += 1
+            # shield: 單一等待者被取消時不影響 leader 與其他等待者
+            return await asyncio.shield(future)
+
+        self.executions += 1
+        future = loop.create_future()
+        self._calls[key] = future
+        try:
+            result = await func(*args, **kwargs)
+        except BaseException as e:
+            if isinstance(e, asyncio.CancelledError):
+                future.cancel()
+            else:
+                future.set_exception(e)
+                # 沒有等待者時避免 "Future exception was never retrieved" 警告
+                future.exception()
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            del self._calls[key]
+
+    def get_stats(self):
+        """
+        取得合併統計
+
+        Returns:
+            dict: calls、executions、coalesced、in_flight
+        """
+        return {
+            'calls': self.calls,
+            'executions': self.executions,
+            'coalesced': self.coalesced,
+            'in_flight': len(self._calls)
+        }
+
+
+_flights = {}
+_flights_lock = threading.Lock()
+
+
+def get_single_flight(name, factory=SingleFlight):
+    """
+    取得具名的請求合併實例 (同一名稱共用同一個實例，統計會出現在 get_single_flight_stats)
+
+    Args:
+        name: 名稱
+        factory: SingleFlight 或 AsyncSingleFlight
+
+    Returns:
+        SingleFlight 或 AsyncSingleFlight: 請求合併實例
+    """
+    with _flights_lock:
+        flight = _flights.get(name)
+        if flight is None:
+            flight = factory(name)
+            _flights[name] = flight
+        return flight
+
+
+def get_single_flight_stats():
+    """
+    取得所有請求合併實例的統計
+
+    Returns:
+        dict: 名稱 -> 統計
+    """
+    with _flights_lock:
+        flights = list(_flights.values())
+    return {flight.name: flight.get_stats() for flight in flights}
@@ -0,0 +1,244 @@
+"""
+列車資料表格查詢模組
+為 Dash DataTable 的 custom 分頁、排序與篩選模式提供伺服器端查詢
+"""
+
+import threading
+import numpy as np
+import pandas as pd
+from dash import Patch
+from train_batch import LABELS
+
+
+# 預先建立排序索引的欄位
+INDEXED_COLUMNS = ('車次', '延遲時間', '即將到達')
+
+# 數值欄位 (其餘為文字欄位)
+NUMERIC_COLUMNS = ('序號', '延遲時間')
+
+# Dash 篩選語法的運算子 (依比對順序排列，較長的符號必須在前)
+FILTER_OPERATORS = (
+    ('ge', ('ge ', '>=')),
+    ('le', ('le ', '<=')),
+    ('lt', ('lt ', '<')),
+    ('gt', ('gt ', '>')),
+    ('ne', ('ne ', '!=')),
+    ('eq', ('eq ', '=')),
+    ('contains', ('contains ',)),
+    ('datestartswith', ('datestartswith ',)),
+)
+
+
+def get_table_columns():
+    """
+    取得 DataTable 的欄位設定
+
+    Returns:
+        list: columns 設定
+    """
+    return [
+        {'name': label, 'id': label, 'type': 'numeric' if label in NUMERIC_COLUMNS else 'text'}
+        for label in LABELS
+    ]
+
+
+def split_filter_part(filter_part):
+    """
+    解析單一篩選條件 (例如 "{延遲時間} > 5")
+
+    Args:
+        filter_part: 以 && 分隔後的單一條件
+
+    Returns:
+        tuple: (欄位名稱, 運算子, 值字串)，無法解析時回傳 (None, None, None)
+    """
+    for operator, symbols in FILTER_OPERATORS:
+        for symbol in symbols:
+            if symbol not in filter_part:
+                continue
+
+            name_part, value_part = filter_part.split(symbol, 1)
+            name = name_part[name_part.find('{') + 1:name_part.rfind('}')]
+            value = value_part.strip()
+            if len(value) >= 2 and value[0] == value[-1] and value[0] in ("'", '"', '`'):
+                value = value[1:-1].replace('\\' + value[0], value[0])
+            return name, operator, value
+    return None, None, None
+
+
+class TrainTableStore:
+    """
+    單一快照的表格查詢索引
+
+    建立時對常用欄位預先排序，每次查詢只回傳目前頁面的資料列。
+    """
+
+    def __init__(self, batch, tag):
+        """
+        Args:
+            batch: TrainBatch
+            tag: 快照的版本標記 (TrainSnapshot.tag)
+        """
+        self.tag = tag
+        self.df = pd.DataFrame(batch.to_columns(), columns=list(LABELS))
+        self.df['延遲時間'] = pd.to_numeric(self.df['延遲時間'], errors='coerce').fillna(0)
+
+        # 各欄位的遞增排序索引 (列位置)
+        self._sorted = {
+            column: np.argsort(self.df[column].to_numpy(), kind='stable')
+            for column in INDEXED_COLUMNS
+        }
+
+    def __len__(self):
+        return len(self.df)
+
+    def _filter_mask(self, filter_query):
+        """
+        依 Dash 篩選語法計算符合條件的資料列
+
+        Args:
+            filter_query: 篩選字串 (多個條件以 && 連接)
+
+        Returns:
+            np.ndarray: 布林遮罩，沒有篩選條件時回傳 None
+        """
+        if not filter_query:
+            return None
+
+        mask = np.ones(len(self.df), dtype=bool)
+        for part in filter_query.split(' && '):
+            name, operator, value = split_filter_part(part)
+            if name not in self.df.columns:
+                continue
+
+            column = self.df[name]
+            if name in NUMERIC_COLUMNS and operator not in ('contains', 'datestartswith'):
+                try:
+                    value = float(value)
+                except ValueError:
+                    continue
+            else:
+                column = column.astype(str)
+
+            if operator == 'eq':
+                mask &= (column == value).to_numpy()
+            elif operator == 'ne':
+                mask &= (column != value).to_numpy()
+            elif operator == 'lt':
+                mask &= (column < value).to_numpy()
+            elif operator == 'le':
+                mask &= (column <= value).to_numpy()
+            elif operator == 'gt':
+                mask &= (column > value).to_numpy()
+            elif operator == 'ge':
+                mask &= (column >= value).to_numpy()
+            elif operator == 'contains':
+                mask &= column.astype(str).str.contains(str(value), regex=False).to_numpy()
+            elif operator == 'datestartswith':
+                mask &= column.astype(str).str.startswith(str(value)).to_numpy()
+        return mask
+
+    def _sorted_rows(self, sort_by):
+        """
+        依排序設定取得列位置，單一欄位排序時直接使用預先建立的索引
+
+        Args:
+            sort_by: Dash 的 sort_by 設定
+
+        Returns:
+            np.ndarray: 排序後的列位置
+        """
+        if not sort_by:
+            return np.arange(len(self.df))
+
+        if len(sort_by) == 1 and sort_by[0]['column_id'] in self._sorted:
+            order = self._sorted[sort_by[0]['column_id']]
+            return order[::-1] if sort_by[0]['direction'] == 'desc' else order
+
+        columns = [item['column_id'] for item in sort_by if item['column_id'] in self.df.columns]
+        ascending = [item['direction'] == 'asc' for item in sort_by if item['column_id'] in self.df.columns]
+        if not columns:
+            return np.arange(len(self.df))
+        return self.df.sort_values(columns, ascending=ascending, kind='stable').index.to_numpy()
+
+    def query(self, page_current=0, page_size=20, sort_by=None, filter_query=''):
+        """
+        查詢單一頁面的資料
+
+        Args:
+            page_current: 目前頁碼 (從 0 開始)
+            page_size: 每頁筆數
+            sort_by: Dash 的 sort_by 設定
+            filter_query: Dash 的篩選字串
+
+        Returns:
+            tuple: (該頁資料列表, 總頁數, 符合條件的筆數)
+        """
+        rows = self._sorted_rows(sort_by)
+        mask = self._filter_mask(filter_query)
+        if mask is not None:
+            rows = rows[mask[rows]]
+
+        total = len(rows)
+        page_count = max((total + page_size - 1) // page_size, 1)
+        page_current = min(max(page_current or 0, 0), page_count - 1)
+
+        start = page_current * page_size
+        page_rows = rows[start:start + page_size]
+        return self.df.iloc[page_rows].to_dict('records'), page_count, total
+
+
+def patch_page_rows(rows, previous_train_nos=None, changed_train_nos=None, previous_row_numbers=None):
+    """
+    建立目前頁面的部分更新
+
+    頁面上的車次與順序都沒有改變時，只替換有變動的資料列 (包含因其他頁面的增減而改變序號的資料列)；
+    否則回傳整頁資料。
+
+    Args:
+        rows: 目前頁面的新資料列
+        previous_train_nos: 前一次頁面上的車次列表
+        changed_train_nos: 前一版本之後有變動的車次集合
+        previous_row_numbers: 前一次頁面上的序號列表
+
+    Returns:
+        Patch 或 list: DataTable 的 data
+    """
+    if (changed_train_nos is None or previous_row_numbers is None
+            or previous_train_nos != [row['車次'] for row in rows]):
+        return rows
+
+    patched = Patch()
+    for i, row in enumerate(rows):
+        # diff_batches 不比較序號，位置改變的資料列也需要替換
+        if row['車次'] in changed_train_nos or row['序號'] != previous_row_numbers[i]:
+            patched[i] = row
+    return patched
+
+
+_store_lock = threading.Lock()
+_current_store = None
+
+
+def get_table_store(snapshot):
+    """
+    取得快照對應的表格查詢索引 (同一版本只建立一次)
+
+    Args:
+        snapshot: TrainSnapshot
+
+    Returns:
+        TrainTableStore: 表格查詢索引
+    """
+    global _current_store
+
+    store = _current_store
+    if store is not None and store.tag == snapshot.tag:
+        return store
+
+    with _store_lock:
+        store = _current_store
+        if store is None or store.tag != snapshot.tag:
+            store = TrainTableStore(snapshot.batch, snapshot.tag)
+            _current_store = store
+        return store
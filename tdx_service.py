@@ -3,39 +3,445 @@ TDX API 服務模組
 處理 TDX API 認證和資料取得
 """
 
+import logging
+import os
+import threading
+import time
 import requests
-from datetime import datetime, timedelta
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from collections import deque, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from email.utils import parsedate_to_datetime
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
 from config import CONFIG
+from cache_backend import create_cache_backend
+from circuit_breaker import CircuitOpenError, get_breaker, get_breaker_status
+from history_store import HistoryStore
+from json_codec import LIVE_BOARD_FIELDS, ListResponseDecoder
+from metrics import counter, gauge, histogram
+from name_resolver import NameResolver
+from single_flight import get_single_flight, get_single_flight_stats
+from shared_snapshot import (
+    CachedSnapshotReader, CachedSnapshotWriter, SharedSnapshotReader, SharedSnapshotWriter
+)
+from token_store import TokenFileStore
+from train_batch import TrainBatchBuilder, diff_batches
+
+
+logger = logging.getLogger(__name__)
+
+# 視為暫時性錯誤並重試的 HTTP 狀態碼
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+# 快照角色 (由 serve.py 設定)：
+#   standalone - 單一行程，自行向 TDX 取得資料 (預設)
+#   publisher  - 輪詢行程，向 TDX 取得資料並寫入共用快照檔
+#   reader     - 工作行程，只讀取共用快照 (檔案或共用快取)，不呼叫 TDX API
+SNAPSHOT_ROLE = os.environ.get('TRA_SNAPSHOT_ROLE', 'standalone')
+
+# 熱路徑的監控指標 (/metrics)
+AUTH_LATENCY = histogram('tdx_auth_latency_seconds', 'TDX 認證請求耗時 (秒)')
+FETCH_LATENCY = histogram('tdx_fetch_latency_seconds', 'TDX API 單一請求耗時 (秒)', ['endpoint'])
+PARSE_SECONDS = histogram('tdx_json_parse_seconds', 'TDX 回應 JSON 解析耗時 (秒)')
+FORMAT_SECONDS = histogram('train_format_seconds', '列車資料轉換耗時 (秒)', ['stage'])
+REFRESH_SECONDS = histogram('snapshot_refresh_seconds', '背景輪詢一次的總耗時 (秒)')
+TOKEN_CACHE_HITS = counter('tdx_token_cache_hits_total', '使用快取 Access Token 的次數')
+TOKEN_CACHE_MISSES = counter('tdx_token_cache_misses_total', '需要重新取得 Access Token 的次數')
+UNAUTHORIZED_RETRIES = counter('tdx_unauthorized_retries_total', '收到 401 後重新取得 Token 並重試的次數')
+UPSTREAM_ERRORS = counter('tdx_upstream_errors_total', 'TDX 請求失敗次數', ['endpoint', 'reason'])
+CONDITIONAL_RESPONSES = counter(
+    'tdx_conditional_responses_total', '分頁回應的條件式請求結果 (not_modified / unchanged / modified)', ['result']
+)
 
 
 class TDXService:
     """TDX API 服務類別"""
     
-    def __init__(self):
-        self.client_id = CONFIG['client_id']
-        self.client_secret = CONFIG['client_secret']
-        self.auth_url = CONFIG['auth_url']
-        self.api_url = CONFIG['api_url']
+    def __init__(self, config=None):
+        """
+        Args:
+            config: 設定 dict，預設為 config.py 的 CONFIG
+                (例如連線至 mock_tdx_server.py 時傳入替身伺服器的網址)
+        """
+        config = CONFIG if config is None else config
+        
+        self.client_id = config['client_id']
+        self.client_secret = config['client_secret']
+        self.auth_url = config['auth_url']
+        self.api_url = config['api_url']
         
         # Token 快取
         self.access_token = None
         self.token_expires_at = None
+        # 過期前多少秒視為過期 (預設 5 分鐘，有效期很短的 Token 改為有效期的 1/4)
+        self._token_margin = 300
+        self._token_lock = threading.Lock()
+        self._renewal_timer = None
+        self.token_renew_ahead = config.get('token_renew_ahead', 600)
+        # 工作行程 (reader) 不輪詢 TDX，不排程主動更新 (否則每個工作行程都會各自呼叫認證端點)
+        self.auto_renew = SNAPSHOT_ROLE != 'reader'
+        
+        # 跨行程共用的 Token 檔案快取 (選用)
+        token_cache_path = config.get('token_cache_path')
+        self.token_store = TokenFileStore(token_cache_path) if token_cache_path else None
+        if self.token_store is not None:
+            # 啟動時若已有其他行程取得的有效 Token，直接沿用而不重新認證
+            self._adopt_stored_token()
+        
+        # 條件式請求快取 (分頁 URL -> 驗證資訊與已解析的資料)
+        self._page_cache = {}
+        self.conditional_stats = {
+            'not_modified': 0,   # 伺服器回傳 304
+            'unchanged': 0,      # UpdateTime 與上次相同
+            'modified': 0        # 取得新資料
+        }
+        # 平行取得分頁時多個執行緒會同時更新統計
+        self._stats_lock = threading.Lock()
+        
+        # 回應解碼器 (預設只保留 LIVE_BOARD_FIELDS 欄位)
+        self._live_board_decoder = ListResponseDecoder(
+            'TrainLiveBoards',
+            None if config.get('parse_all_fields', False) else LIVE_BOARD_FIELDS,
+            config.get('json_decoder', 'auto')
+        )
+        
+        # 分頁設定
+        self.page_size = config.get('page_size', 500)
+        self.parallel_pages = config.get('parallel_pages', 1)
+        self.max_pages = config.get('max_pages', 100)
+        
+        # 連線逾時設定 (連線逾時, 讀取逾時)
+        self.timeout = (
+            config.get('connect_timeout', 5),
+            config.get('read_timeout', 30)
+        )
+        
+        # 取得全部分頁的時間預算 (秒)，超過時放棄本次取得 (None 表示不限制)
+        self.fetch_budget = config.get('fetch_budget', 20)
+        
+        # 各端點的斷路器 (連續失敗時暫停呼叫並指數退避)
+        self.auth_breaker = get_breaker('auth')
+        self.live_board_breaker = get_breaker('train_live_board')
+        
+        # 重試設定 (分頁請求在時間預算內由 _send 自行重試)
+        self.max_retries = config.get('max_retries', 3)
+        self.retry_backoff = config.get('retry_backoff', 0.5)
+        
+        # 共用的 HTTP Session (連線池 + Keep-Alive)
+        self.session = self._create_session(
+            pool_size=config.get('pool_size', 10),
+            max_retries=self.max_retries,
+            backoff_factor=self.retry_backoff,
+            no_retry_prefixes=(urlunsplit(urlsplit(self.api_url)._replace(query='', fragment='')),)
+        )
+    
+    @staticmethod
+    def _create_session(pool_size, max_retries, backoff_factor, no_retry_prefixes=()):
+        """
+        建立具連線池與重試機制的 HTTP Session
+        
+        Args:
+            pool_size: 每個主機保留的連線數
+            max_retries: 最大重試次數
+            backoff_factor: 重試間隔的指數退避係數 (秒)
+            no_retry_prefixes: 不使用 urllib3 重試的 URL 前綴 (由呼叫端在時間預算內自行重試)
+            
+        Returns:
+            requests.Session: HTTP Session
+        """
+        retry = Retry(
+            total=max_retries,
+            connect=max_retries,
+            read=max_retries,
+            status=max_retries,
+            backoff_factor=backoff_factor,
+            status_forcelist=RETRY_STATUSES,
+            # Token 請求使用 client_credentials，重送不會有副作用
+            allowed_methods=frozenset(['GET', 'POST']),
+            respect_retry_after_header=True,
+            raise_on_status=False
+        )
+        adapter = HTTPAdapter(
+            pool_connections=pool_size,
+            pool_maxsize=pool_size,
+            max_retries=retry
+        )
+        
+        session = requests.Session()
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        for prefix in no_retry_prefixes:
+            # urllib3 的重試與退避都在單次 request() 內執行，無法依剩餘的時間預算中止
+            session.mount(prefix, HTTPAdapter(
+                pool_connections=pool_size,
+                pool_maxsize=pool_size,
+                max_retries=0
+            ))
+        return session
+    
+    def get_connection_stats(self):
+        """
+        取得連線池使用統計
+        
+        Returns:
+            dict: 包含請求數、建立的連線數與連線重用次數
+        """
+        requests_count = 0
+        connections_count = 0
+        
+        for adapter in set(self.session.adapters.values()):
+            pools = adapter.poolmanager.pools
+            for key in pools.keys():
+                pool = pools.get(key)
+                if pool is None:
+                    continue
+                requests_count += pool.num_requests
+                connections_count += pool.num_connections
+        
+        return {
+            'requests': requests_count,
+            'connections': connections_count,
+            'reused': max(requests_count - connections_count, 0)
+        }
+    
+    def _send(self, breaker, method, url, deadline=None, retries=0, **kwargs):
+        """
+        透過斷路器送出請求
+        
+        連線錯誤、逾時與 429 / 5xx 回應視為上游失敗；
+        其他狀態碼 (例如 401、304) 交由呼叫端處理，不影響斷路器。
+        retries 大於 0 時 (不使用 urllib3 重試的分頁請求) 在時間預算內自行重試，
+        退避或 Retry-After 的等待會超過剩餘預算時不再重試；所有嘗試只記錄一次斷路器結果。
+        
+        Args:
+            breaker: 端點的斷路器
+            method: HTTP 方法
+            url: 請求 URL
+            deadline: 時間預算的截止時間 (time.monotonic)，None 表示不限制
+            retries: 最多自行重試的次數
+            
+        Returns:
+            requests.Response: 回應
+        """
+        breaker.before_call()
+        try:
+            attempt = 0
+            while True:
+                try:
+                    response = self.session.request(
+                        method, url, timeout=self._request_timeout(deadline), **kwargs
+                    )
+                    if response.status_code == 429 or response.status_code >= 500:
+                        response.raise_for_status()
+                    break
+                except requests.exceptions.RequestException as e:
+                    delay = self._retry_delay(e, attempt)
+                    if attempt >= retries or delay is None:
+                        raise
+                    if deadline is not None and time.monotonic() + delay >= deadline:
+                        logger.debug("剩餘的時間預算不足以重試: %s", e)
+                        raise
+                attempt += 1
+                time.sleep(delay)
+        except requests.exceptions.RequestException:
+            breaker.record_failure()
+            raise
+        except BaseException:
+            # 其他例外 (例如中斷) 沒有上游的結果，只釋放試探呼叫
+            breaker.release()
+            raise
+        breaker.record_success()
+        return response
+    
+    def _retry_delay(self, error, attempt):
+        """
+        重試前的等待秒數
+        
+        Args:
+            error: 這次嘗試的例外
+            attempt: 已重試的次數
+            
+        Returns:
+            float: 等待秒數 (回應有 Retry-After 時依其指定，否則為指數退避)，不應重試時為 None
+        """
+        response = error.response
+        if response is None:
+            if not isinstance(error, (requests.exceptions.ConnectionError, requests.exceptions.Timeout)):
+                return None
+        elif response.status_code not in RETRY_STATUSES:
+            return None
+        else:
+            retry_after = response.headers.get('Retry-After')
+            if retry_after:
+                try:
+                    return max(float(retry_after), 0)
+                except ValueError:
+                    try:
+                        retry_at = parsedate_to_datetime(retry_after)
+                        return max((retry_at - datetime.now(timezone.utc)).total_seconds(), 0)
+                    except (TypeError, ValueError):
+                        pass
+        return self.retry_backoff * (2 ** attempt)
+    
+    def _request_timeout(self, deadline):
+        """
+        依剩餘的時間預算計算單次請求的逾時
+        
+        Args:
+            deadline: 時間預算的截止時間 (time.monotonic)，None 表示不限制
+            
+        Returns:
+            tuple: (連線逾時, 讀取逾時)
+        """
+        if deadline is None:
+            return self.timeout
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise TimeoutError(f"超過取得資料的時間預算 ({self.fetch_budget} 秒)")
+        return tuple(min(value, remaining) for value in self.timeout)
+    
+    def close(self):
+        """關閉 HTTP Session 並停止 Token 自動更新"""
+        self._cancel_token_renewal()
+        self.session.close()
+    
+    def _is_token_valid(self):
+        """檢查快取的 Token 是否仍有效 (提前 5 分鐘視為過期)"""
+        token = self.access_token
+        expires_at = self.token_expires_at
+        return bool(token and expires_at and
+                    datetime.now() < expires_at - timedelta(seconds=self._token_margin))
+    
+    def _renew_lead(self, lifetime):
+        """
+        過期前多少秒主動更新 Token
+        
+        有效期短於 token_renew_ahead 的 2 倍時改為有效期的一半，避免排程在 1 秒後立即再次更新。
+        
+        Args:
+            lifetime: Token 剩餘的有效秒數
+            
+        Returns:
+            float: 提前更新的秒數
+        """
+        return min(self.token_renew_ahead, lifetime / 2)
+    
+    def invalidate_token(self, token=None):
+        """
+        清除 Token 快取 (API 回傳 401 時使用)
+        
+        多個執行緒同時收到 401 時，只有第一個會清除快取，
+        其餘執行緒會直接取得已更新的 Token，不會重複向認證伺服器請求。
+        
+        Args:
+            token: 收到 401 時使用的 Token，若已不是目前的 Token 則不清除
+        """
+        with self._token_lock:
+            if token is not None and token != self.access_token:
+                return
+            self.access_token = None
+            self.token_expires_at = None
+            
+            if self.token_store is not None:
+                with self.token_store.lock():
+                    self.token_store.clear(token)
     
     def get_access_token(self):
         """
         取得 Access Token (實作快取機制)
         
+        同一時間只會有一個執行緒向認證伺服器請求新的 Token，
+        其餘執行緒會等待並共用該次的結果。
+        
         Returns:
             str: Access Token
         """
         # 檢查是否有快取的 Token 且未過期 (提前 5 分鐘更新)
-        if self.access_token and self.token_expires_at:
-            if datetime.now() < self.token_expires_at - timedelta(minutes=5):
-                print(f"使用快取的 Access Token (有效期至: {self.token_expires_at})")
+        if self._is_token_valid():
+            TOKEN_CACHE_HITS.inc()
+            return self.access_token
+        
+        with self._token_lock:
+            # 等待鎖的期間其他執行緒可能已取得新的 Token
+            if self._is_token_valid():
+                TOKEN_CACHE_HITS.inc()
                 return self.access_token
+            TOKEN_CACHE_MISSES.inc()
+            return self._refresh_token()
+    
+    def get_cached_token(self):
+        """
+        取得仍有效的快取 Token，不會向認證伺服器請求 (供非同步客戶端在事件迴圈中檢查)
         
-        # 取得新的 Token
-        print("正在取得新的 Access Token...")
+        Returns:
+            str: Access Token，沒有或即將過期時回傳 None (與 get_access_token() 相同的判斷)
+        """
+        token = self.access_token
+        if token and self._is_token_valid():
+            TOKEN_CACHE_HITS.inc()
+            return token
+        return None
+    
+    def _refresh_token(self, renewing=False):
+        """
+        更新 Token，若有設定檔案快取則先嘗試沿用其他行程取得的 Token
+        (呼叫端須持有 _token_lock)
+        
+        Args:
+            renewing: 是否為過期前的主動更新
+            
+        Returns:
+            str: Access Token
+        """
+        if self.token_store is None:
+            return self._request_token()
+        
+        # 以檔案鎖確保同一台主機只有一個行程向認證伺服器請求
+        with self.token_store.lock():
+            if self._adopt_stored_token(renewing):
+                return self.access_token
+            
+            token = self._request_token()
+            self.token_store.save(self.access_token, self.token_expires_at)
+            return token
+    
+    def _adopt_stored_token(self, renewing=False):
+        """
+        沿用檔案快取中仍有效的 Token
+        
+        Args:
+            renewing: 是否為過期前的主動更新 (此時 Token 須在更新時間點之後才過期)
+            
+        Returns:
+            bool: 是否成功沿用
+        """
+        stored = self.token_store.load()
+        if stored is None:
+            return False
+        
+        token, expires_at = stored
+        remaining = (expires_at - datetime.now()).total_seconds()
+        threshold = self.token_renew_ahead if renewing else 300
+        if remaining <= threshold:
+            return False
+        
+        self.token_expires_at = expires_at
+        self.access_token = token
+        self._token_margin = 300
+        logger.info("使用檔案快取的 Access Token (有效期至: %s)", expires_at)
+        self._schedule_token_renewal(remaining - self._renew_lead(remaining))
+        return True
+    
+    def _request_token(self):
+        """
+        向認證伺服器取得新的 Access Token (呼叫端須持有 _token_lock)
+        
+        Returns:
+            str: Access Token
+        """
+        logger.debug("正在取得新的 Access Token...")
         
         headers = {
             'Content-Type': 'application/x-www-form-urlencoded'
@@ -48,93 +454,786 @@ class TDXService:
         }
         
         try:
-            response = requests.post(self.auth_url, headers=headers, data=data)
+            with AUTH_LATENCY.time():
+                response = self._send(
+                    self.auth_breaker,
+                    'POST',
+                    self.auth_url,
+                    headers=headers,
+                    data=data
+                )
             response.raise_for_status()
             
             result = response.json()
-            self.access_token = result['access_token']
             expires_in = result.get('expires_in', 86400)  # 預設 1 天
             
             self.token_expires_at = datetime.now() + timedelta(seconds=expires_in)
+            self.access_token = result['access_token']
+            self._token_margin = min(300, expires_in / 4)
             
-            print(f"✓ Access Token 取得成功 (有效期: {expires_in} 秒)")
+            logger.info("Access Token 取得成功 (有效期: %s 秒)", expires_in)
+            self._schedule_token_renewal(expires_in - self._renew_lead(expires_in))
             return self.access_token
             
-        except requests.exceptions.RequestException as e:
-            print(f"✗ 取得 Access Token 失敗: {e}")
+        except (requests.exceptions.RequestException, CircuitOpenError) as e:
+            UPSTREAM_ERRORS.labels('auth', type(e).__name__).inc()
+            logger.error("取得 Access Token 失敗: %s", e)
             raise
     
-    def get_train_live_board(self):
+    def _schedule_token_renewal(self, delay):
+        """
+        排程在背景自動更新 Token
+        
+        Args:
+            delay: 距離更新的秒數
+        """
+        self._cancel_token_renewal()
+        if not self.auto_renew:
+            return
+        
+        timer = threading.Timer(max(delay, 1), self._renew_token)
+        timer.daemon = True
+        timer.start()
+        self._renewal_timer = timer
+    
+    def _cancel_token_renewal(self):
+        """取消尚未執行的 Token 自動更新"""
+        if self._renewal_timer is not None:
+            self._renewal_timer.cancel()
+            self._renewal_timer = None
+    
+    def _renew_token(self):
+        """在 Token 過期前主動更新，讓請求執行緒不必等待認證"""
+        try:
+            with self._token_lock:
+                self._refresh_token(renewing=True)
+        except (requests.exceptions.RequestException, CircuitOpenError, OSError):
+            # 更新失敗時稍後再試，Token 仍可使用到過期前 5 分鐘
+            self._schedule_token_renewal(60)
+    
+    def _build_page_url(self, skip, top):
         """
-        取得台鐵列車即時動態資料
+        建立分頁查詢的 URL (覆寫 api_url 中既有的 $top / $skip)
         
+        Args:
+            skip: 略過的筆數
+            top: 每頁筆數
+            
         Returns:
-            list: 列車動態資料列表
+            str: 分頁查詢 URL
+        """
+        parts = urlsplit(self.api_url)
+        query = [
+            (key, value)
+            for key, value in parse_qsl(parts.query, keep_blank_values=True)
+            if key not in ('$top', '$skip')
+        ]
+        query.append(('$top', str(top)))
+        query.append(('$skip', str(skip)))
+        return urlunsplit(parts._replace(query=urlencode(query, safe='$')))
+    
+    def _fetch_page(self, skip, top, deadline=None):
+        """
+        取得單一分頁的列車動態資料
+        
+        Args:
+            skip: 略過的筆數
+            top: 每頁筆數
+            deadline: 時間預算的截止時間 (time.monotonic)，None 表示不限制
+            
+        Returns:
+            list: 該分頁的列車動態資料
         """
+        url = self._build_page_url(skip, top)
+        cached = self._page_cache.get(url)
+        
         try:
             token = self.get_access_token()
             
-            headers = {
-                'Authorization': f'Bearer {token}'
-            }
+            headers = self._conditional_headers(cached)
+            headers['Authorization'] = f'Bearer {token}'
             
-            print("正在取得台鐵列車即時動態資料...")
-            response = requests.get(self.api_url, headers=headers)
+            with FETCH_LATENCY.labels('train_live_board').time():
+                response = self._send(
+                    self.live_board_breaker, 'GET', url,
+                    deadline=deadline, retries=self.max_retries, headers=headers
+                )
             
             # 如果是 401 錯誤，清除 Token 快取並重試
             if response.status_code == 401:
-                print("Token 已失效，重新取得...")
-                self.access_token = None
-                self.token_expires_at = None
+                logger.warning("Token 已失效，重新取得...")
+                UNAUTHORIZED_RETRIES.inc()
+                self.invalidate_token(token)
                 token = self.get_access_token()
                 headers['Authorization'] = f'Bearer {token}'
-                response = requests.get(self.api_url, headers=headers)
+                with FETCH_LATENCY.labels('train_live_board').time():
+                    response = self._send(
+                        self.live_board_breaker, 'GET', url,
+                        deadline=deadline, retries=self.max_retries, headers=headers
+                    )
+            
+            # 304: 資料未更新，直接使用上次解析的結果
+            if response.status_code == 304 and cached is not None:
+                self._count_conditional('not_modified')
+                return cached['trains']
             
             response.raise_for_status()
-            data = response.json()
             
-            trains = data.get('TrainLiveBoards', [])
-            print(f"✓ 成功取得 {len(trains)} 筆列車資料")
+            # 先只掃描回應開頭的 UpdateTime，與上次相同時不必解析整份回應
+            update_time = self._live_board_decoder.peek_update_time(response.content)
+            if not self._is_unchanged(cached, update_time):
+                with PARSE_SECONDS.time():
+                    update_time, trains = self._live_board_decoder.decode(response.content)
+            
+            if self._is_unchanged(cached, update_time):
+                # UpdateTime 相同，沿用上次的結果 (同一個列表物件)，避免下游重複處理
+                self._count_conditional('unchanged')
+                trains = cached['trains']
+            else:
+                self._count_conditional('modified')
+            
+            self._page_cache[url] = {
+                'etag': response.headers.get('ETag'),
+                'last_modified': response.headers.get('Last-Modified'),
+                'update_time': update_time,
+                'trains': trains
+            }
             
             return trains
             
-        except requests.exceptions.RequestException as e:
-            print(f"✗ 取得列車資料失敗: {e}")
+        except (requests.exceptions.RequestException, CircuitOpenError, TimeoutError, ValueError) as e:
+            # ValueError: 回應不是有效的 JSON
+            UPSTREAM_ERRORS.labels('train_live_board', type(e).__name__).inc()
+            logger.warning("取得列車資料失敗 ($skip=%s): %s", skip, e)
             raise
+    
+    def _count_conditional(self, result):
+        """記錄一次條件式請求的結果 (conditional_stats 與 /metrics)"""
+        with self._stats_lock:
+            self.conditional_stats[result] += 1
+        CONDITIONAL_RESPONSES.labels(result).inc()
+    
+    def get_conditional_stats(self):
+        """
+        取得條件式請求的命中統計
+        
+        Returns:
+            dict: not_modified (304)、unchanged (UpdateTime 未變)、modified (新資料) 的次數
+        """
+        with self._stats_lock:
+            return dict(self.conditional_stats)
+    
+    @staticmethod
+    def _is_unchanged(cached, update_time):
+        """UpdateTime 是否與上次的回應相同"""
+        return cached is not None and bool(update_time) and update_time == cached['update_time']
+    
+    @staticmethod
+    def _conditional_headers(cached):
+        """
+        根據上次回應的驗證資訊建立條件式請求標頭
+        
+        Args:
+            cached: 上次回應的快取資訊 (可為 None)
+            
+        Returns:
+            dict: 請求標頭
+        """
+        headers = {}
+        if cached is None:
+            return headers
+        
+        if cached['etag']:
+            headers['If-None-Match'] = cached['etag']
+        if cached['last_modified']:
+            headers['If-Modified-Since'] = cached['last_modified']
+        return headers
+    
+    def iter_train_live_board(self, page_size=None, parallel_pages=None):
+        """
+        以 $top / $skip 分頁逐筆產生台鐵列車即時動態資料
+        
+        Args:
+            page_size: 每頁筆數，預設為 CONFIG['page_size']
+            parallel_pages: 同時預先取得的頁數，預設為 CONFIG['parallel_pages']
+            
+        Yields:
+            dict: 單筆列車動態資料
+        """
+        for trains in self.iter_train_live_board_pages(page_size, parallel_pages):
+            yield from trains
+    
+    def iter_train_live_board_pages(self, page_size=None, parallel_pages=None):
+        """
+        以 $top / $skip 分頁逐頁產生台鐵列車即時動態資料
+        
+        每取得一頁就立即產生該頁資料，呼叫端不必等待最後一頁。
+        所有分頁共用 fetch_budget 的時間預算，超過時拋出 TimeoutError。
+        
+        Args:
+            page_size: 每頁筆數，預設為 CONFIG['page_size']
+            parallel_pages: 同時預先取得的頁數，預設為 CONFIG['parallel_pages']
+            
+        Yields:
+            list: 單一分頁的列車動態資料
+        """
+        page_size = page_size or self.page_size
+        parallel_pages = parallel_pages or self.parallel_pages
+        deadline = time.monotonic() + self.fetch_budget if self.fetch_budget else None
+        
+        if parallel_pages <= 1:
+            for page in range(self.max_pages):
+                trains = self._fetch_page(page * page_size, page_size, deadline)
+                yield trains
+                if len(trains) < page_size:
+                    return
+            return
+        
+        # 平行預先取得後續分頁，但仍依分頁順序產生資料
+        with ThreadPoolExecutor(max_workers=parallel_pages) as executor:
+            first_pages = min(parallel_pages, self.max_pages)
+            pending = deque(
+                executor.submit(self._fetch_page, page * page_size, page_size, deadline)
+                for page in range(first_pages)
+            )
+            next_page = first_pages
+            
+            try:
+                while pending:
+                    trains = pending.popleft().result()
+                    
+                    if len(trains) >= page_size and next_page < self.max_pages:
+                        pending.append(
+                            executor.submit(self._fetch_page, next_page * page_size, page_size, deadline)
+                        )
+                        next_page += 1
+                    
+                    yield trains
+                    if len(trains) < page_size:
+                        return
+            finally:
+                for future in pending:
+                    future.cancel()
+    
+    def get_train_live_board(self):
+        """
+        取得台鐵列車即時動態資料 (自動分頁取得全部資料)
+        
+        背景輪詢直接使用 iter_train_live_board_pages() 逐頁轉換 (由輪詢器的 refresh() 合併同時的呼叫)，
+        此函式供一次取得完整列表的呼叫端使用。
+        
+        Returns:
+            list: 列車動態資料列表
+        """
+        logger.debug("正在取得台鐵列車即時動態資料...")
+        trains = list(self.iter_train_live_board())
+        logger.debug("成功取得 %d 筆列車資料", len(trains))
+        
+        return trains
 
 
 # 全域服務實例
 tdx_service = TDXService()
 
 
+class TrainSnapshot(namedtuple('TrainSnapshot', ['batch', 'fetched_at', 'version', 'epoch'])):
+    """
+    不可變的列車資料快照
+
+    版本號在每次啟動時從 1 開始，epoch (發布端啟動時的毫秒時間) 區分不同次啟動的版本；
+    比較版本、計算差異或作為快取鍵時一律使用 tag。
+    """
+
+    __slots__ = ()
+
+    @property
+    def tag(self):
+        """
+        版本標記
+
+        Returns:
+            str: '<epoch>.<版本號>' (回傳給用戶端的版本，重新啟動後不會與舊版本相同)
+        """
+        return f"{self.epoch:x}.{self.version}"
+
+
+def new_epoch():
+    """
+    產生發布端的啟動識別
+
+    Returns:
+        int: 目前的毫秒時間
+    """
+    return time.time_ns() // 1_000_000
+
+
+class TrainDataPoller:
+    """
+    背景資料輪詢器
+
+    由單一背景執行緒依固定週期向 TDX 取得資料並發布不可變快照，
+    所有請求處理函式只讀取最新快照，不會直接呼叫 TDX API。
+    取得失敗時保留最後一份成功的快照 (stale-while-revalidate)，
+    並以 get_status() 提供資料的時間與是否過時。
+    """
+
+    def __init__(self, fetch_func, interval=30, history_size=20,
+                 wait_timeout=None, stale_after=None, min_revalidate_interval=5):
+        """
+        Args:
+            fetch_func: 取得列車資料並回傳 TrainBatch 的函式
+                (也可回傳 (TrainBatch, 取得時間, 版本號, epoch)，直接沿用其他行程發布的版本)
+            interval: 輪詢週期 (秒)
+            history_size: 保留多少個版本供計算差異
+            wait_timeout: 還沒有快照時請求最多等待的秒數 (None 表示持續等待)
+            stale_after: 快照超過多少秒視為過時 (預設為輪詢週期的 3 倍)
+            min_revalidate_interval: revalidate() 觸發重新取得的最短間隔 (秒)
+            
+        同時呼叫 refresh() (例如背景執行緒與手動重新整理) 時只執行一次 fetch_func。
+        """
+        self.fetch_func = fetch_func
+        self.interval = interval
+        self.wait_timeout = wait_timeout
+        self.stale_after = stale_after or interval * 3
+        self.min_revalidate_interval = min_revalidate_interval
+
+        self._snapshot = None
+        # 自行發布版本時使用的啟動識別
+        self.epoch = new_epoch()
+        # (版本標記, TrainBatch)
+        self._history = deque(maxlen=history_size)
+        self._delta_cache = (None, {})
+        self._listeners = []
+        self._last_error = None
+        self._last_attempt = None
+        self._ready = threading.Event()
+        self._stop_event = threading.Event()
+        self._wake_event = threading.Event()
+        self._start_lock = threading.Lock()
+        self._thread = None
+        self._refresh_flight = get_single_flight('poller_refresh')
+
+    def start(self):
+        """啟動背景輪詢執行緒 (重複呼叫不會建立多個執行緒)"""
+        with self._start_lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stop_event.clear()
+            self._thread = threading.Thread(
+                target=self._run,
+                name='tdx-poller',
+                daemon=True
+            )
+            self._thread.start()
+
+    def stop(self):
+        """停止背景輪詢執行緒"""
+        self._stop_event.set()
+        self._wake_event.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+
+    def refresh(self):
+        """
+        執行一次輪詢並發布新快照
+
+        Returns:
+            TrainSnapshot: 最新快照
+        """
+        return self._refresh_flight.do(id(self), self._refresh)
+
+    def _refresh(self):
+        """實際執行一次輪詢 (由 refresh() 合併同時的呼叫)"""
+        self._last_attempt = time.monotonic()
+        try:
+            with REFRESH_SECONDS.time():
+                result = self.fetch_func()
+        except Exception as e:
+            logger.error("背景輪詢失敗: %s", e)
+            self._last_error = e
+            self._ready.set()
+            raise
+
+        if isinstance(result, tuple):
+            self._publish(*result)
+        else:
+            self._publish(result)
+        self._last_error = None
+        self._ready.set()
+        return self._snapshot
+
+    def _publish(self, batch, fetched_at=None, version=None, epoch=None):
+        """
+        發布新快照，只有資料內容改變時才遞增版本號
+
+        Args:
+            batch: 新的 TrainBatch
+            fetched_at: 取得時間 (預設為現在)
+            version: 指定的版本號 (由共用快照讀取時沿用輪詢行程的版本)
+            epoch: 指定版本號所屬的啟動識別 (與 version 一起指定)
+        """
+        previous = self._snapshot
+        if version is not None:
+            if previous is not None and (epoch, version) == (previous.epoch, previous.version):
+                batch = previous.batch
+        elif previous is None:
+            version, epoch = 1, self.epoch
+        elif batch == previous.batch:
+            version, epoch = previous.version, previous.epoch
+        else:
+            version, epoch = previous.version + 1, previous.epoch
+
+        # TrainBatch 不可修改，整體替換參考即可，讀取端不需加鎖
+        self._snapshot = TrainSnapshot(batch, fetched_at or datetime.now(), version, epoch)
+
+        changed = previous is None or self._snapshot.tag != previous.tag
+        if changed:
+            # 輪詢行程重新啟動後版本號從頭開始，以版本標記區分，舊版本仍可計算差異
+            self._history.append((self._snapshot.tag, batch))
+            self._delta_cache = (self._snapshot.tag, {})
+
+        self._notify(self._snapshot, previous.tag if previous else None, changed)
+
+    def add_listener(self, callback, every_refresh=False):
+        """
+        註冊新版本快照的通知函式
+
+        Args:
+            callback: 以 (快照, 前一個版本標記) 呼叫的函式，於輪詢執行緒中執行
+            every_refresh: 每次輪詢成功都通知 (即使版本沒有改變，例如更新共用快照的取得時間)
+        """
+        self._listeners.append((callback, every_refresh))
+
+    def _notify(self, snapshot, previous_tag, changed):
+        """通知已註冊的函式 (版本沒有改變時只通知 every_refresh 的函式)"""
+        for callback, every_refresh in list(self._listeners):
+            if not (changed or every_refresh):
+                continue
+            try:
+                callback(snapshot, previous_tag)
+            except Exception:
+                logger.exception("快照通知失敗")
+
+    def get_delta(self, since, snapshot=None):
+        """
+        取得指定版本到最新版本之間的差異
+
+        Args:
+            since: 用戶端目前持有的版本標記 (TrainSnapshot.tag)
+            snapshot: 比較的目標快照，預設為最新快照
+
+        Returns:
+            dict: 差異 (added / removed / changed)，若版本已不在保留範圍內則回傳 None
+        """
+        if snapshot is None:
+            snapshot = self.get_snapshot()
+        if since == snapshot.tag:
+            return {'added': [], 'removed': [], 'changed': {}}
+
+        cache_tag, delta_cache = self._delta_cache
+        if cache_tag != snapshot.tag:
+            delta_cache = {}
+
+        delta = delta_cache.get(since)
+        if delta is not None:
+            return delta
+
+        for tag, batch in list(self._history):
+            if tag == since:
+                # 同一版本的差異只計算一次，供所有用戶端共用
+                delta = diff_batches(batch, snapshot.batch)
+                delta_cache[since] = delta
+                return delta
+        return None
+
+    def get_snapshot(self, timeout=None):
+        """
+        取得最新快照 (O(1)，不會觸發網路請求)
+
+        第一次呼叫時會啟動背景執行緒並等待第一份快照。
+
+        Args:
+            timeout: 等待第一份快照的秒數，預設為 wait_timeout
+
+        Returns:
+            TrainSnapshot: 最新快照
+        """
+        snapshot = self._snapshot
+        if snapshot is not None:
+            return snapshot
+
+        self.start()
+        self._ready.wait(self.wait_timeout if timeout is None else timeout)
+
+        snapshot = self._snapshot
+        if snapshot is None:
+            if self._last_error is not None:
+                raise self._last_error
+            raise TimeoutError("尚未取得列車資料快照")
+        return snapshot
+
+    def revalidate(self):
+        """
+        要求背景執行緒立即重新取得資料，不等待結果 (呼叫端繼續使用目前的快照)
+
+        Returns:
+            bool: 是否已觸發 (距離上次取得太近時不觸發)
+        """
+        last_attempt = self._last_attempt
+        if last_attempt is not None and time.monotonic() - last_attempt < self.min_revalidate_interval:
+            return False
+        self.start()
+        self._wake_event.set()
+        return True
+
+    def get_status(self):
+        """
+        取得快照的時間與狀態
+
+        Returns:
+            dict: version、tag (版本標記)、count (列車數)、fetched_at、age (秒)、stale、last_error
+        """
+        snapshot = self._snapshot
+        error = self._last_error
+        if snapshot is None:
+            return {
+                'version': None,
+                'tag': None,
+                'count': None,
+                'fetched_at': None,
+                'age': None,
+                'stale': True,
+                'last_error': str(error) if error else None
+            }
+
+        age = (datetime.now() - snapshot.fetched_at).total_seconds()
+        return {
+            'version': snapshot.version,
+            'tag': snapshot.tag,
+            'count': len(snapshot.batch),
+            'fetched_at': snapshot.fetched_at.isoformat(),
+            'age': round(age, 1),
+            'stale': age > self.stale_after,
+            'last_error': str(error) if error else None
+        }
+
+    def _run(self):
+        """背景執行緒主迴圈"""
+        while not self._stop_event.is_set():
+            try:
+                self.refresh()
+            except Exception:
+                pass
+            self._wake_event.wait(self.interval)
+            self._wake_event.clear()
+
+
+# 車站與車種名稱的正規化 (以代碼記住解析結果，跨輪詢共用)
+name_resolver = NameResolver(CONFIG.get('name_language', 'zh-tw'))
+
+
+def append_trains(builder, trains, resolver=None):
+    """
+    將 TDX 列車動態資料附加至 TrainBatchBuilder
+    
+    Args:
+        builder: TrainBatchBuilder
+        trains: 列車動態資料 (dict 的可迭代物件)
+        resolver: 名稱正規化使用的 NameResolver，預設為全域的 name_resolver
+    """
+    resolver = resolver or name_resolver
+    train_type_names = resolver.train_type_names
+    station_names = resolver.station_names
+    append = builder.append
+    
+    for train in trains:
+        # 已解析過的車種與車站只需一次字典查詢
+        train_type_id = train.get('TrainTypeID')
+        train_type = train_type_names.get(train_type_id)
+        if train_type is None:
+            train_type = resolver.train_type(train_type_id, train.get('TrainTypeName'))
+        
+        station_id = train.get('StationID')
+        station = station_names.get(station_id)
+        if station is None:
+            station = resolver.station(station_id, train.get('StationName'))
+        
+        append(
+            train.get('TrainNo', 'N/A'),
+            train_type,
+            station,
+            train.get('DelayTime', 0),
+            train.get('UpdateTime', 'N/A')
+        )
+
+
+def build_train_batch(trains, resolver=None):
+    """
+    將 TDX 列車動態資料轉換為欄位式的 TrainBatch
+    
+    Args:
+        trains: 列車動態資料 (dict 的可迭代物件)
+        resolver: 名稱正規化使用的 NameResolver，預設為全域的 name_resolver
+        
+    Returns:
+        TrainBatch: 列車資料
+    """
+    builder = TrainBatchBuilder()
+    append_trains(builder, trains, resolver)
+    return builder.build()
+
+
+def fetch_train_batch():
+    """
+    向 TDX 取得列車資料並建立欄位式的 TrainBatch (會發出網路請求)
+    
+    Returns:
+        TrainBatch: 列車資料
+    """
+    logger.debug("正在取得台鐵列車即時動態資料...")
+    
+    # 分頁為 304 或 UpdateTime 未變時，_fetch_page 回傳上次的同一個列表物件；
+    # 與上次相同的分頁先暫不轉換，所有分頁都相同時直接沿用上次的 TrainBatch
+    previous_pages = _last_batch['pages']
+    pages = []
+    builder = None
+    # 逐頁取得並立即轉換，不必等待全部分頁 (轉換耗時只計算轉換本身，不含等待分頁)
+    for trains in tdx_service.iter_train_live_board_pages():
+        index = len(pages)
+        pages.append(trains)
+        if builder is None:
+            if index < len(previous_pages) and trains is previous_pages[index]:
+                continue
+            # 第一個有變動的分頁：連同先前暫不轉換的分頁一起轉換
+            builder = TrainBatchBuilder()
+            pending = pages
+        else:
+            pending = (trains,)
+        with FORMAT_SECONDS.labels('batch').time():
+            for page in pending:
+                append_trains(builder, page)
+    
+    if builder is None:
+        if _last_batch['batch'] is not None and len(pages) == len(previous_pages):
+            logger.debug("列車資料未更新，沿用上次的資料")
+            return _last_batch['batch']
+        builder = TrainBatchBuilder()
+        with FORMAT_SECONDS.labels('batch').time():
+            for page in pages:
+                append_trains(builder, page)
+    batch = builder.build()
+    
+    _last_batch['pages'] = pages
+    _last_batch['batch'] = batch
+    
+    logger.debug("成功取得 %d 筆列車資料", len(batch))
+    return batch
+
+
+# 上次轉換的分頁與 TrainBatch (只由輪詢器的單一執行緒更新)
+_last_batch = {'pages': [], 'batch': None}
+
+
+SHARED_SNAPSHOT_PATH = CONFIG.get('shared_snapshot_path', '.cache/train_snapshot.bin')
+
+# 快照快取後端：cache_backend='redis' 時多台主機共用同一個輪詢主機的快照
+snapshot_cache = create_cache_backend()
+
+# 全域背景輪詢器
+if SNAPSHOT_ROLE == 'reader':
+    if snapshot_cache.shared:
+        snapshot_reader = CachedSnapshotReader(snapshot_cache)
+    else:
+        snapshot_reader = SharedSnapshotReader(SHARED_SNAPSHOT_PATH)
+    train_data_poller = TrainDataPoller(
+        snapshot_reader.read,
+        interval=CONFIG.get('shared_snapshot_interval', 1),
+        history_size=CONFIG.get('delta_history_size', 20),
+        wait_timeout=CONFIG.get('snapshot_wait_timeout', 5),
+        stale_after=CONFIG.get('stale_after', CONFIG.get('poll_interval', 30) * 3)
+    )
+else:
+    train_data_poller = TrainDataPoller(
+        fetch_train_batch,
+        interval=CONFIG.get('poll_interval', 30),
+        history_size=CONFIG.get('delta_history_size', 20),
+        wait_timeout=CONFIG.get('snapshot_wait_timeout', 5),
+        stale_after=CONFIG.get('stale_after', CONFIG.get('poll_interval', 30) * 3)
+    )
+    if SNAPSHOT_ROLE == 'publisher':
+        train_data_poller.add_listener(
+            SharedSnapshotWriter(SHARED_SNAPSHOT_PATH).on_snapshot, every_refresh=True
+        )
+    if snapshot_cache.shared:
+        train_data_poller.add_listener(
+            CachedSnapshotWriter(snapshot_cache, CONFIG.get('snapshot_cache_ttl', 600)).on_snapshot,
+            every_refresh=True
+        )
+
+# 歷史資料庫 (選用)：每個新版本的快照都會附加保存 (多行程時只由輪詢行程寫入)
+history_store = HistoryStore(CONFIG['history_dir']) if CONFIG.get('history_dir') else None
+if history_store is not None and SNAPSHOT_ROLE != 'reader':
+    train_data_poller.add_listener(history_store.on_snapshot)
+
+
+def get_train_batch():
+    """
+    取得最新的列車資料快照 (欄位式表示)
+    
+    資料由背景輪詢器定期更新，此函式只讀取記憶體中的快照。
+    
+    Returns:
+        TrainBatch: 列車資料
+    """
+    return train_data_poller.get_snapshot().batch
+
+
 def get_train_data():
     """
-    取得並格式化列車資料
+    取得最新的列車資料 (以顯示名稱為鍵的 dict 列表，相容舊介面)
     
     Returns:
         list: 格式化的列車資料
     """
-    trains = tdx_service.get_train_live_board()
-    
-    formatted_data = []
-    for idx, train in enumerate(trains, 1):
-        # 處理列車類型 - 可能是字串或字典
-        train_type_name = train.get('TrainTypeName', 'N/A')
-        if isinstance(train_type_name, dict):
-            train_type_name = train_type_name.get('zh-tw', train_type_name.get('Zh_tw', 'N/A'))
-        
-        # 處理站名 - 可能是字串或字典
-        station_name = train.get('StationName', 'N/A')
-        if isinstance(station_name, dict):
-            station_name = station_name.get('zh-tw', station_name.get('Zh_tw', 'N/A'))
-        
-        formatted_data.append({
-            '序號': idx,
-            '車次': train.get('TrainNo', 'N/A'),
-            '列車類型': train_type_name if train_type_name else 'N/A',
-            '即將到達': station_name if station_name else 'N/A',
-            '延遲時間': train.get('DelayTime', 0),
-            '更新時間': train.get('UpdateTime', 'N/A')
-        })
-    
-    return formatted_data
+    batch = get_train_batch()
+    with FORMAT_SECONDS.labels('records').time():
+        return batch.to_records()
+
+
+def _status_value(key):
+    """輸出指標時讀取輪詢器狀態的欄位 (沒有快照時不輸出)"""
+    return lambda: train_data_poller.get_status()[key]
+
+
+def _breaker_states():
+    return {
+        (name,): 0 if status['state'] == 'closed' else 1
+        for name, status in get_breaker_status().items()
+    }
+
+
+gauge('snapshot_age_seconds', '目前快照的資料時間 (距離取得的秒數)', func=_status_value('age'))
+gauge('snapshot_trains', '目前快照的列車數', func=_status_value('count'))
+gauge('snapshot_version', '目前快照的版本號', func=_status_value('version'))
+gauge('tdx_circuit_open', '上游端點斷路器是否開啟 (開啟或試探中為 1)', ['endpoint'], func=_breaker_states)
+gauge(
+    'tdx_connection_pool', 'TDX 連線池的累計請求數 (requests)、建立的連線數 (connections) 與重用次數 (reused)',
+    ['stat'], func=lambda: {(name,): value for name, value in tdx_service.get_connection_stats().items()}
+)
+
+
+def get_service_status():
+    """
+    取得資料服務的健康狀態 (快照時間、是否過時、各端點斷路器、請求合併與連線池統計)
+    
+    Returns:
+        dict: 服務狀態
+    """
+    status = train_data_poller.get_status()
+    status['role'] = SNAPSHOT_ROLE
+    status['breakers'] = get_breaker_status()
+    status['single_flight'] = get_single_flight_stats()
+    status['names'] = name_resolver.get_stats()
+    status['connections'] = tdx_service.get_connection_stats()
+    status['conditional'] = tdx_service.get_conditional_stats()
+    return status
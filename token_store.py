@@ -0,0 +1,139 @@
+"""
+Token 檔案快取模組
+讓同一台主機上的多個工作行程共用同一個 Access Token
+"""
+
+import json
+import os
+import tempfile
+import time
+from datetime import datetime
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+
+class FileLock:
+    """
+    跨行程的檔案鎖 (POSIX 使用 fcntl，Windows 使用 msvcrt)
+
+    以 with 陳述式使用，離開區塊時自動釋放。
+    """
+
+    def __init__(self, path):
+        """
+        Args:
+            path: 鎖定檔路徑
+        """
+        self.path = path
+        self._fd = None
+
+    def __enter__(self):
+        self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+        if fcntl is not None:
+            fcntl.flock(self._fd, fcntl.LOCK_EX)
+        else:
+            while True:
+                try:
+                    msvcrt.locking(self._fd, msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:
+                    # LK_LOCK 重試 10 次後仍失敗會拋出例外，繼續等待
+                    time.sleep(0.1)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            if fcntl is not None:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+            else:
+                os.lseek(self._fd, 0, os.SEEK_SET)
+                msvcrt.locking(self._fd, msvcrt.LK_UNLCK, 1)
+        finally:
+            os.close(self._fd)
+            self._fd = None
+
+
+class TokenFileStore:
+    """
+    以檔案儲存的 Token 快取
+
+    寫入時先寫入暫存檔再以 os.replace 原子替換，讀取端不會讀到寫到一半的內容；
+    取得新 Token 的流程則以檔案鎖保護，確保同一時間只有一個行程向認證伺服器請求。
+    """
+
+    def __init__(self, path):
+        """
+        Args:
+            path: Token 快取檔路徑
+        """
+        self.path = os.path.abspath(path)
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def lock(self):
+        """
+        取得跨行程的檔案鎖
+
+        Returns:
+            FileLock: 檔案鎖
+        """
+        return FileLock(self.path + '.lock')
+
+    def load(self):
+        """
+        讀取快取的 Token
+
+        Returns:
+            tuple: (Token, 過期時間)，檔案不存在或格式錯誤時回傳 None
+        """
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            return data['access_token'], datetime.fromtimestamp(data['expires_at'])
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
+
+    def save(self, token, expires_at):
+        """
+        以原子寫入的方式儲存 Token
+
+        Args:
+            token: Access Token
+            expires_at: 過期時間 (datetime)
+        """
+        directory = os.path.dirname(self.path)
+        fd, tmp_path = tempfile.mkstemp(prefix='.token-', dir=directory)
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump({
+                    'access_token': token,
+                    'expires_at': expires_at.timestamp()
+                }, f)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def clear(self, token=None):
+        """
+        刪除快取的 Token
+
+        Args:
+            token: 只有在檔案中的 Token 與此相同時才刪除，None 表示直接刪除
+        """
+        if token is not None:
+            stored = self.load()
+            if stored is None or stored[0] != token:
+                return
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
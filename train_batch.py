@@ -0,0 +1,196 @@
+"""
+列車資料的欄位式 (columnar) 表示
+以各欄位一個 tuple 儲存整批列車資料，只在輸出端轉換為 dict / JSON
+"""
+
+import sys
+
+
+# 欄位名稱與顯示名稱 (依表格欄位順序)
+COLUMNS = (
+    ('train_no', '車次'),
+    ('train_type', '列車類型'),
+    ('station', '即將到達'),
+    ('delay', '延遲時間'),
+    ('update_time', '更新時間'),
+)
+
+# 序號欄位的顯示名稱 (由列的位置產生，不另外儲存)
+INDEX_LABEL = '序號'
+
+FIELDS = tuple(field for field, _ in COLUMNS)
+LABELS = (INDEX_LABEL,) + tuple(label for _, label in COLUMNS)
+
+
+class TrainBatch:
+    """
+    一批列車資料 (struct-of-arrays)
+
+    每個欄位是一個 tuple，建立後不可修改；重複出現的站名、車種與時間字串會共用同一個物件。
+    """
+
+    __slots__ = FIELDS
+
+    def __init__(self, train_no=(), train_type=(), station=(), delay=(), update_time=()):
+        """
+        Args:
+            train_no: 車次
+            train_type: 列車類型名稱
+            station: 即將到達的站名
+            delay: 延遲分鐘數
+            update_time: 資料更新時間
+        """
+        self.train_no = tuple(train_no)
+        self.train_type = tuple(train_type)
+        self.station = tuple(station)
+        self.delay = tuple(delay)
+        self.update_time = tuple(update_time)
+
+    def __len__(self):
+        return len(self.train_no)
+
+    def __eq__(self, other):
+        if other is self:
+            return True
+        if not isinstance(other, TrainBatch):
+            return NotImplemented
+        return all(getattr(self, field) == getattr(other, field) for field in FIELDS)
+
+    def __repr__(self):
+        return f"TrainBatch({len(self)} 筆)"
+
+    def column(self, field):
+        """
+        取得單一欄位
+
+        Args:
+            field: 欄位名稱 (例如 'delay')
+
+        Returns:
+            tuple: 欄位資料
+        """
+        return getattr(self, field)
+
+    def row(self, index):
+        """
+        取得單列資料 (顯示名稱為鍵)
+
+        Args:
+            index: 列索引 (從 0 開始)
+
+        Returns:
+            dict: 單列資料
+        """
+        record = {INDEX_LABEL: index + 1}
+        for field, label in COLUMNS:
+            record[label] = getattr(self, field)[index]
+        return record
+
+    def to_columns(self):
+        """
+        轉換為以顯示名稱為鍵的欄位字典 (可直接建立 pandas DataFrame)
+
+        Returns:
+            dict: 顯示名稱 -> 欄位資料列表
+        """
+        columns = {INDEX_LABEL: list(range(1, len(self) + 1))}
+        for field, label in COLUMNS:
+            columns[label] = list(getattr(self, field))
+        return columns
+
+    def to_records(self):
+        """
+        轉換為以顯示名稱為鍵的 dict 列表 (API 輸出用)
+
+        Returns:
+            list: 列車資料列表
+        """
+        rows = zip(*(getattr(self, field) for field in FIELDS))
+        return [
+            dict(zip(LABELS, (index,) + values))
+            for index, values in enumerate(rows, 1)
+        ]
+
+
+class TrainBatchBuilder:
+    """逐筆累加列車資料並建立 TrainBatch"""
+
+    def __init__(self):
+        self._columns = {field: [] for field in FIELDS}
+
+    def __len__(self):
+        return len(self._columns['train_no'])
+
+    def append(self, train_no, train_type, station, delay, update_time):
+        """
+        加入一筆列車資料
+
+        Args:
+            train_no: 車次
+            train_type: 列車類型名稱
+            station: 即將到達的站名
+            delay: 延遲分鐘數
+            update_time: 資料更新時間
+        """
+        columns = self._columns
+        columns['train_no'].append(train_no)
+        columns['train_type'].append(_intern(train_type))
+        columns['station'].append(_intern(station))
+        columns['delay'].append(delay)
+        columns['update_time'].append(_intern(update_time))
+
+    def build(self):
+        """
+        建立不可修改的 TrainBatch
+
+        Returns:
+            TrainBatch: 列車資料
+        """
+        return TrainBatch(**self._columns)
+
+
+def _intern(value):
+    """字串交由 sys.intern 共用，其他型別原樣回傳"""
+    if isinstance(value, str):
+        return sys.intern(value)
+    return value
+
+
+def diff_batches(old, new):
+    """
+    以車次為鍵比較兩批列車資料的差異
+
+    Args:
+        old: 舊的 TrainBatch
+        new: 新的 TrainBatch
+
+    Returns:
+        dict: added (新增的列車資料)、removed (移除的車次)、
+              changed (車次 -> 變更的欄位與新值)
+    """
+    old_index = {train_no: i for i, train_no in enumerate(old.train_no)}
+    new_index = {train_no: i for i, train_no in enumerate(new.train_no)}
+
+    added = []
+    changed = {}
+    for train_no, i in new_index.items():
+        j = old_index.get(train_no)
+        if j is None:
+            added.append(new.row(i))
+            continue
+
+        fields = {}
+        for field, label in COLUMNS:
+            value = getattr(new, field)[i]
+            if value != getattr(old, field)[j]:
+                fields[label] = value
+        if fields:
+            changed[train_no] = fields
+
+    removed = [train_no for train_no in old_index if train_no not in new_index]
+
+    return {
+        'added': added,
+        'removed': removed,
+        'changed': changed
+    }